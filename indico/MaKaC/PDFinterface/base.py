@@ -15,12 +15,15 @@
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 
 import os
+import hashlib
 import math
 import cgi
 import shutil
 import xml.sax.saxutils as saxutils
 import uuid
 import re
+import time
+from datetime import date
 
 from HTMLParser import HTMLParser
 from reportlab.platypus import SimpleDocTemplate, PageTemplate, Table
@@ -42,12 +45,15 @@ from MaKaC.common.TemplateExec import render as tpl_render
 import subprocess
 import pkg_resources
 import tempfile
+from MaKaC.common.cache import GenericCache
 from MaKaC.common.logger import Logger
 
 from mako.template import Template
 
 from indico.core.config import Config
 from indico.util import mdx_latex
+from indico.util.date_time import format_date
+from indico.util.fs import silentremove
 from indico.util.string import render_markdown
 import markdown
 from PIL import Image as PILImage
@@ -719,7 +725,10 @@ class PDFLaTeXBase(object):
             return render_markdown(text, md=md.convert, escape_latex_math=_escape_latex_math)
 
         self._args = {
-            'md_convert': _convert_markdown
+            'md_convert': _convert_markdown,
+            # passed explicitly since LaTeX's \today is not part of the
+            # source, so a cached PDF would show the wrong date
+            'today': format_date(date.today(), format='long')
         }
 
     def generate(self):
@@ -727,6 +736,15 @@ class PDFLaTeXBase(object):
         pdffile = latex.run(self._tpl_filename, **self._args)
         return pdffile
 
+    def generate_async(self):
+        """Generates the PDF in a background task
+
+        :return: A tuple containing the key identifying the PDF and
+                 its path in case it is already available.
+        """
+        latex = LatexRunner(has_toc=self._table_of_contents)
+        return latex.run_async(self._tpl_filename, **self._args)
+
 
 class LaTeXRuntimeException(Exception):
     def __init__(self, source_file, log_file, report_id, params):
@@ -744,13 +762,86 @@ class LaTeXRuntimeException(Exception):
         return "Impossible to compile '{0}'. Read '{1}' for details".format(self.source_file, self.log_file)
 
 
+#: The state of PDFs which are being generated in the background
+_latex_jobs = GenericCache('latex-jobs')
+
+#: Images downloaded by :func:`mdx_latex.latex_render_image`
+_latex_image_re = re.compile(r'(\\includegraphics(?:\[[^\]]*\])?\{)([^}]*/indico-latex-[^/}]+)(\})')
+
+
+def _get_latex_cache_dir():
+    return os.path.join(Config.getInstance().getXMLCacheDir(), 'latex')
+
+
+def get_latex_cache_path(key):
+    """Returns the path where the PDF for a LaTeX source is cached
+
+    :param key: The key identifying the LaTeX source, as returned by
+                :meth:`LatexRunner.prepare`.
+    """
+    return os.path.join(_get_latex_cache_dir(), key[:2], key + '.pdf')
+
+
+def cleanup_latex_cache(max_age):
+    """Deletes cached PDFs which have not been used recently
+
+    Cached PDFs are touched whenever they are used, so only PDFs which
+    have not been requested for `max_age` are deleted (together with
+    any leftover temporary files).
+
+    :param max_age: A :class:`~datetime.timedelta` specifying how long
+                    unused PDFs are kept.
+    :return: The number of deleted files.
+    """
+    threshold = time.time() - max_age.total_seconds()
+    deleted = 0
+    for dirpath, dirnames, filenames in os.walk(_get_latex_cache_dir()):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.getmtime(path) < threshold:
+                silentremove(path)
+                deleted += 1
+    return deleted
+
+
+def get_latex_job_state(key):
+    """Returns the state of a PDF generated in the background.
+
+    :return: ``'ready'`` if the PDF is available, ``'running'`` if it
+             is still being generated and ``'failed'`` otherwise.
+    """
+    if os.path.exists(get_latex_cache_path(key)):
+        return 'ready'
+    return _latex_jobs.get(key) or 'failed'
+
+
+def _use_cached_pdf(path):
+    """Marks a cached PDF as used if it exists
+
+    :return: Whether the PDF exists in the cache.
+    """
+    try:
+        # keep PDFs which are still used from being cleaned up
+        os.utime(path, None)
+    except OSError:
+        return False
+    return True
+
+
 class LatexRunner(object):
     """
     Handles the PDF generation from a chosen LaTeX template
+
+    Generated PDFs are cached based on the rendered LaTeX source (and
+    any other files it uses), so a PDF is only compiled again if its
+    content changed.  PDFs which have not been used for some time are
+    removed by the `latex_cache_cleanup` task.
     """
 
     def __init__(self, has_toc=False):
         self.has_toc = has_toc
+        self.key = None
+        self._dir = None
 
     def run_latex(self, source_file, log_file=None):
         pdflatex_cmd = [Config.getInstance().getPDFLatexProgram(),
@@ -760,7 +851,7 @@ class LatexRunner(object):
                         source_file]
 
         try:
-            subprocess.check_call(pdflatex_cmd, stdout=log_file)
+            subprocess.check_call(pdflatex_cmd, stdout=log_file, cwd=self._dir)
             Logger.get('pdflatex').debug("PDF created successfully!")
 
         except subprocess.CalledProcessError:
@@ -789,19 +880,69 @@ class LatexRunner(object):
 
         return report_id
 
-    def run(self, template_name, **kwargs):
-        template_dir = os.path.join(Config.getInstance().getTPLDir(), 'latex')
-        template = tpl_render(os.path.join(template_dir, template_name), kwargs)
+    def prepare(self, template_name, **kwargs):
+        """Renders the LaTeX source of a template
 
-        self._dir = tempfile.mkdtemp(prefix="indico-texgen-", dir=Config.getInstance().getTempDir())
+        :return: The key identifying the rendered source, i.e. a hash
+                 of the source and all files used by it.
+        """
+        self._files = {}
+        if kwargs.get('logo_img'):
+            # the logo is usually stored in a temporary file, so we use a
+            # fixed name to avoid getting a different source every time
+            name = 'logo' + os.path.splitext(kwargs['logo_img'])[1]
+            self._files[name] = kwargs['logo_img']
+            kwargs['logo_img'] = name
+        template_dir = os.path.join(Config.getInstance().getTPLDir(), 'latex')
+        self._template_name = template_name
+        self._source = _latex_image_re.sub(self._add_image, tpl_render(os.path.join(template_dir, template_name),
+                                                                        kwargs))
+        self._kwargs = kwargs
+
+        checksum = hashlib.sha1(b'toc' if self.has_toc else b'no-toc')
+        checksum.update(self._source.encode('utf-8') if isinstance(self._source, unicode) else self._source)
+        for name, path in sorted(self._files.iteritems()):
+            checksum.update(name)
+            with open(path, 'rb') as f:
+                checksum.update(f.read())
+        self.key = checksum.hexdigest()
+        return self.key
+
+    def _add_image(self, match):
+        # images from markdown are downloaded to random temporary files;
+        # like the logo they are copied into the build directory, but
+        # named after their content since there may be many of them
+        path = match.group(2)
+        with open(path, 'rb') as f:
+            name = 'image-{}{}'.format(hashlib.sha1(f.read()).hexdigest(), os.path.splitext(path)[1])
+        self._files[name] = path
+        return match.group(1) + name + match.group(3)
+
+    def _write_source(self, base_dir):
+        self._dir = tempfile.mkdtemp(prefix="indico-texgen-", dir=base_dir)
+        with open(os.path.join(self._dir, self._template_name + '.tex'), 'w') as f:
+            f.write(self._source)
+        for name, path in self._files.iteritems():
+            shutil.copy(path, os.path.join(self._dir, name))
+
+    def compile(self, source_dir, template_name, key, params=None):
+        """Compiles a LaTeX source and stores the PDF in the cache
+
+        :param source_dir: The directory containing the source and
+                           all files it uses.
+        :param template_name: The name of the template, which is also
+                              the name of the source file.
+        :param key: The key identifying the source.
+        :param params: The template arguments; only used for the
+                       error report if compilation fails.
+        :return: The path of the generated PDF.
+        """
+        self._dir = source_dir
         source_filename = os.path.join(self._dir, template_name + '.tex')
         target_filename = os.path.join(self._dir, template_name + '.pdf')
         log_filename = os.path.join(self._dir, 'output.log')
         log_file = open(log_filename, 'a+')
 
-        with open(source_filename, 'w') as f:
-            f.write(template)
-
         try:
             self.run_latex(source_filename, log_file)
             if self.has_toc:
@@ -812,9 +953,68 @@ class LatexRunner(object):
             if not os.path.exists(target_filename):
                 report_no = self._save_error_report(source_filename, log_filename)
                 # something went terribly wrong, no LaTeX file was produced
-                raise LaTeXRuntimeException(source_filename, log_filename, report_no, kwargs)
+                raise LaTeXRuntimeException(source_filename, log_filename, report_no, params or {})
+
+        cache_path = get_latex_cache_path(key)
+        cache_dir = os.path.dirname(cache_path)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # move the file atomically so nobody gets a partially copied PDF
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=cache_dir)
+        os.close(fd)
+        shutil.copyfile(target_filename, tmp_path)
+        os.rename(tmp_path, cache_path)
+        return cache_path
+
+    def run(self, template_name, **kwargs):
+        key = self.prepare(template_name, **kwargs)
+        cache_path = get_latex_cache_path(key)
+        if _use_cached_pdf(cache_path):
+            return cache_path
+        self._write_source(Config.getInstance().getTempDir())
+        try:
+            return self.compile(self._dir, template_name, key, self._kwargs)
+        finally:
+            self.cleanup()
+
+    def run_async(self, template_name, **kwargs):
+        """Generates the PDF in a background task
 
-        return target_filename
+        :return: A tuple containing the key identifying the PDF and
+                 its path in case it is already available.  Use
+                 :func:`get_latex_job_state` to check whether the
+                 PDF is ready.
+        """
+        from indico.util.tasks import compile_latex
+        key = self.prepare(template_name, **kwargs)
+        cache_path = get_latex_cache_path(key)
+        if _use_cached_pdf(cache_path):
+            return key, cache_path
+        if _latex_jobs.get(key) != 'running':
+            _latex_jobs.set(key, 'running', 3600)
+            self._write_source(Config.getInstance().getSharedTempDir())
+            compile_latex.delay(self._dir, template_name, self.has_toc, key)
+        return key, None
 
     def cleanup(self):
-        shutil.rmtree(self._dir)
+        if self._dir:
+            shutil.rmtree(self._dir)
+            self._dir = None
+
+
+def run_latex_job(source_dir, template_name, has_toc, key):
+    """Compiles a LaTeX source prepared by :meth:`LatexRunner.run_async`
+
+    The state of the job is updated accordingly and the source
+    directory is deleted afterwards.
+    """
+    runner = LatexRunner(has_toc=has_toc)
+    try:
+        runner.compile(source_dir, template_name, key)
+    except Exception:
+        _latex_jobs.set(key, 'failed', 3600)
+        raise
+    else:
+        _latex_jobs.delete(key)
+    finally:
+        runner.cleanup()
@@ -23,6 +23,7 @@ from itertools import izip
 
 from indico.core.config import Config
 from indico.core.logger import Logger
+from indico.core.request_stats import count_request_stat
 from indico.util.fs import silentremove
 from indico.util.redis import redis
 from MaKaC.common.contextManager import ContextManager
@@ -376,10 +377,12 @@ class RedisCacheClient(CacheClient):
 
     def set_multi(self, mapping, ttl=0):
         try:
-            self._client.mset(dict((k, pickle.dumps(v)) for k, v in mapping.iteritems()))
-            if ttl:
-                for key in mapping:
-                    self._client.expire(key, ttl)
+            with self._client.pipeline() as pipe:
+                pipe.mset(dict((k, pickle.dumps(v)) for k, v in mapping.iteritems()))
+                if ttl:
+                    for key in mapping:
+                        pipe.expire(key, ttl)
+                pipe.execute()
         except redis.RedisError:
             Logger.get('redisCache').exception('set_multi failed')
 
@@ -388,6 +391,7 @@ class RedisCacheClient(CacheClient):
             return dict(zip(keys, map(self._unpickle, self._client.mget(keys))))
         except redis.RedisError:
             Logger.get('redisCache').exception('get_multi failed')
+            return {}
 
     def delete_multi(self, keys):
         try:
@@ -580,26 +584,32 @@ class GenericCache(object):
         self._connect()
         time = self._processTime(time)
         Logger.get('GenericCache/%s' % self._namespace).debug('SET %r (%d)' % (key, time))
+        count_request_stat('cache_sets')
         self._client.set(self._makeKey(key), _NoneValue.replace(val), time)
 
     def set_multi(self, mapping, time=0):
         self._connect()
         time = self._processTime(time)
         mapping = dict(((self._makeKey(key), _NoneValue.replace(val)) for key, val in mapping.iteritems()))
+        count_request_stat('cache_sets', len(mapping))
         self._client.set_multi(mapping, time)
 
     def get(self, key, default=None):
         self._connect()
         res = self._client.get(self._makeKey(key))
         Logger.get('GenericCache/%s' % self._namespace).debug('GET %r -> %r' % (key, res is not None))
+        count_request_stat('cache_gets')
         if res is None:
             return default
+        count_request_stat('cache_hits')
         return _NoneValue.restore(res)
 
     def get_multi(self, keys, default=None, asdict=True):
         self._connect()
         real_keys = map(self._makeKey, keys)
         data = self._client.get_multi(real_keys)
+        count_request_stat('cache_gets', len(real_keys))
+        count_request_stat('cache_hits', sum(1 for value in data.itervalues() if value is not None))
         # Add missing keys
         for real_key in real_keys:
             if real_key not in data:
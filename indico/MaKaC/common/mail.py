@@ -15,6 +15,10 @@
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 
 import smtplib
+import socket
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.mime.text import MIMEText
@@ -31,6 +35,111 @@ from MaKaC.common.contextManager import ContextManager
 # Prevent base64 encoding of utf-8 e-mails
 charset.add_charset('utf-8', charset.SHORTEST)
 
+#: Errors after which sending an email is retried on a new connection
+TRANSIENT_SMTP_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.error)
+
+
+def _is_transient_error(exc):
+    if isinstance(exc, TRANSIENT_SMTP_ERRORS):
+        return True
+    # 4xx replies indicate temporary failures (e.g. greylisting or rate limiting)
+    return isinstance(exc, smtplib.SMTPResponseException) and 400 <= exc.smtp_code < 500
+
+
+class SMTPConnectionPool(object):
+    """Keeps authenticated SMTP connections open for reuse.
+
+    Opening a connection to the SMTP server (including STARTTLS and
+    authentication) is much more expensive than sending a message, so
+    connections are returned to the pool after use and handed out
+    again as long as they have not been idle for too long.
+
+    :param max_size: The maximum number of idle connections to keep.
+    :param max_idle: The number of seconds after which an idle
+                     connection is closed instead of being reused.
+    """
+
+    def __init__(self, max_size=4, max_idle=30):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def _connect(self):
+        cfg = Config.getInstance()
+        server = smtplib.SMTP(*cfg.getSmtpServer())
+        try:
+            if cfg.getSmtpUseTLS():
+                server.ehlo()
+                (code, errormsg) = server.starttls()
+                if code != 220:
+                    raise MaKaCError(_("Can't start secure connection to SMTP server: %d, %s") % (code, errormsg))
+            if cfg.getSmtpLogin():
+                (code, errormsg) = server.login(cfg.getSmtpLogin(), cfg.getSmtpPassword())
+                if code != 235:
+                    raise MaKaCError(_("Can't login on SMTP server: %d, %s") % (code, errormsg))
+        except Exception:
+            self.discard(server)
+            raise
+        return server
+
+    def get(self):
+        """Gets an idle connection or opens a new one."""
+        with self._lock:
+            while self._idle:
+                server, last_used = self._idle.pop()
+                if time.time() - last_used <= self.max_idle:
+                    return server
+                self.discard(server)
+        return self._connect()
+
+    def put(self, server):
+        """Returns a connection to the pool after using it."""
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((server, time.time()))
+                return
+        self.discard(server)
+
+    def discard(self, server):
+        """Closes a connection that should not be reused."""
+        try:
+            server.quit()
+        except (smtplib.SMTPException, socket.error):
+            server.close()
+
+    def clear(self):
+        """Closes all idle connections."""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for server, __ in idle:
+            self.discard(server)
+
+    @contextmanager
+    def connection(self):
+        """Provides a connection and returns it to the pool afterwards.
+
+        If a transient error occurs while the connection is in use, it
+        is discarded instead of being reused.  This includes temporary
+        (4xx) rejections since the server may close the connection
+        afterwards (e.g. 421).
+        """
+        server = self.get()
+        try:
+            yield server
+        except Exception as e:
+            if _is_transient_error(e):
+                self.discard(server)
+            else:
+                self.put(server)
+            raise
+        else:
+            self.put(server)
+
+
+smtp_pool = SMTPConnectionPool()
+
 
 class GenericMailer:
 
@@ -57,11 +166,36 @@ class GenericMailer:
             return
         if send:
             # send all emails
-            for mail in queue:
-                cls._send(mail)
+            if Config.getInstance().getSmtpUseCelery():
+                from indico.util.tasks import send_emails
+                send_emails.delay(list(queue))
+            else:
+                cls.sendBatch(queue)
         # clear the queue no matter if emails were sent or not
         del queue[:]
 
+    @classmethod
+    def sendBulk(cls, notifications, batch_size=200, interval=30):
+        """Sends many emails in throttled batches.
+
+        The emails are prepared immediately and then sent by Celery in
+        batches of `batch_size` emails, each of them over a single SMTP
+        connection and `interval` seconds after the previous one, so a
+        large number of emails does not overload the mail server.
+        """
+        from indico.util.tasks import send_emails
+        from MaKaC.webinterface.mail import GenericNotification
+        mails = []
+        for notification in notifications:
+            if isinstance(notification, dict):
+                # Wrap a raw dictionary in a notification class
+                notification = GenericNotification(notification)
+            mailData = cls._prepare(notification)
+            if mailData:
+                mails.append(mailData)
+        for i in xrange(0, len(mails), batch_size):
+            send_emails.apply_async(args=[mails[i:i + batch_size]], countdown=interval * (i // batch_size))
+
     @staticmethod
     def _prepare(notification):
         fromAddr = notification.getFromAddr()
@@ -116,33 +250,50 @@ class GenericMailer:
         }
 
     @staticmethod
-    def _send(msgData):
-        server=smtplib.SMTP(*Config.getInstance().getSmtpServer())
-        if Config.getInstance().getSmtpUseTLS():
-            server.ehlo()
-            (code, errormsg) = server.starttls()
-            if code != 220:
-                raise MaKaCError( _("Can't start secure connection to SMTP server: %d, %s")%(code, errormsg))
-        if Config.getInstance().getSmtpLogin():
-            login = Config.getInstance().getSmtpLogin()
-            password = Config.getInstance().getSmtpPassword()
-            (code, errormsg) = server.login(login, password)
-            if code != 235:
-                raise MaKaCError( _("Can't login on SMTP server: %d, %s")%(code, errormsg))
-
+    def _deliver(server, msgData):
         to_addrs = msgData['toList'] | msgData['ccList'] | msgData['bccList']
+        Logger.get('mail').info('Sending email: To: {} / CC: {} / BCC: {}'.format(
+            ', '.join(msgData['toList']) or 'None',
+            ', '.join(msgData['ccList']) or 'None',
+            ', '.join(msgData['bccList']) or 'None'))
         try:
-            Logger.get('mail').info('Sending email: To: {} / CC: {} / BCC: {}'.format(
-                ', '.join(msgData['toList']) or 'None',
-                ', '.join(msgData['ccList']) or 'None',
-                ', '.join(msgData['bccList']) or 'None'))
             server.sendmail(msgData['fromAddr'], to_addrs, msgData['msg'])
         except smtplib.SMTPRecipientsRefused as e:
             raise MaKaCError('Email address is not valid: {}'.format(e.recipients))
-        finally:
-            server.quit()
         Logger.get('mail').info('Mail sent to {}'.format(', '.join(to_addrs)))
 
+    @classmethod
+    def _send(cls, msgData, retries=2, retry_delay=1):
+        """Sends an email using a pooled SMTP connection.
+
+        Transient errors such as a dropped connection or a temporary
+        (4xx) rejection are retried on a fresh connection.
+        """
+        for attempt in xrange(retries + 1):
+            try:
+                with smtp_pool.connection() as server:
+                    cls._deliver(server, msgData)
+                return
+            except (smtplib.SMTPException, socket.error) as e:
+                if attempt == retries or not _is_transient_error(e):
+                    raise
+                Logger.get('mail').warning('Sending email failed (%s); retrying', e)
+                time.sleep(retry_delay * (attempt + 1))
+
+    @classmethod
+    def sendBatch(cls, mails):
+        """Sends multiple emails over the same SMTP connection.
+
+        Failing to send one email does not prevent the remaining ones
+        from being sent; the errors are logged instead.
+        """
+        for msgData in mails:
+            try:
+                cls._send(msgData)
+            except Exception:
+                Logger.get('mail').exception('Could not send email to {}'.format(
+                    ', '.join(msgData['toList'] | msgData['ccList'] | msgData['bccList'])))
+
     @classmethod
     def sendAndLog(cls, notification, conference, module=None, user=None, skipQueue=False):
         from indico.modules.events.logs import EventLogRealm, EventLogKind
@@ -15,19 +15,21 @@
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 
 import errno
+import hashlib
 import inspect
 import itertools
 import os
 import posixpath
 import re
-import shutil
+from contextlib import closing
+from multiprocessing.pool import ThreadPool
+from tempfile import NamedTemporaryFile
 
 import requests
 from bs4 import BeautifulSoup
 from flask import request
 from werkzeug.utils import secure_filename
 
-from MaKaC.common.contribPacker import ZIPFileHandler
 from MaKaC.common import timezoneUtils, HelperMaKaCInfo
 from MaKaC.PDFinterface.conference import ProgrammeToPDF, AbstractBook, ContribToPDF, ContribsToPDF
 from MaKaC.webinterface import urlHandlers
@@ -54,7 +56,9 @@ from indico.modules.events.sessions.util import get_session_timetable_pdf, get_s
 from indico.modules.events.sessions.controllers.display import RHDisplaySession
 from indico.modules.events.timetable.controllers.display import RHTimetable
 from indico.modules.events.timetable.util import get_timetable_offline_pdf_generator
+from indico.util.fs import silentremove
 from indico.util.string import remove_tags
+from indico.util.zipstream import ZipFileWriter
 from indico.web.flask.util import url_for
 
 
@@ -81,6 +85,72 @@ def _fix_url_path(path):
     return path
 
 
+def _download(url):
+    return requests.get(url, verify=False).content
+
+
+def _iter_static_assets():
+    """Yields the static files which are included in every offline website.
+
+    :return: An iterator of ``(name, path)`` tuples where `name` is
+             the path relative to the static folder of the website.
+    """
+    config = Config.getInstance()
+    htdocs = config.getHtdocsDir()
+    # i18n js and mathjax plugins can't be discovered by parsing the HTML
+    for folder in (os.path.join('js', 'indico', 'i18n'), os.path.join('js', 'lib', 'mathjax')):
+        for root, subfolders, files in os.walk(os.path.join(htdocs, folder)):
+            subfolders.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, htdocs), path
+    # system icons are not referenced in HTML/CSS
+    for icon in sorted(config.getSystemIcons().itervalues()):
+        path = os.path.join(htdocs, 'images', icon)
+        if os.path.isfile(path):
+            yield os.path.join('images', icon), path
+
+
+def get_static_assets_bundle():
+    """Gets a ZIP archive containing the static files included in every offline website.
+
+    The archive is only built again if any of those files changed, so
+    offline websites can copy the already compressed files from it.
+
+    :return: The path of the archive.
+    """
+    assets = list(_iter_static_assets())
+    checksum = hashlib.sha1()
+    for name, path in assets:
+        st = os.stat(path)
+        checksum.update('{}:{}:{}\n'.format(name, st.st_size, st.st_mtime))
+    bundle_dir = os.path.join(Config.getInstance().getXMLCacheDir(), 'offline')
+    bundle_path = os.path.join(bundle_dir, '{}.zip'.format(checksum.hexdigest()))
+    if os.path.exists(bundle_path):
+        return bundle_path
+    try:
+        os.makedirs(bundle_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    with NamedTemporaryFile(dir=bundle_dir, suffix='.tmp', delete=False) as f:
+        try:
+            writer = ZipFileWriter(f)
+            for name, path in assets:
+                writer.add_path(name, path)
+            writer.close()
+        except Exception:
+            os.remove(f.name)
+            raise
+    # rename is atomic, so other builders never see an incomplete bundle
+    os.rename(f.name, bundle_path)
+    # remove bundles containing outdated files
+    for filename in os.listdir(bundle_dir):
+        if filename.endswith('.zip') and filename != os.path.basename(bundle_path):
+            silentremove(os.path.join(bundle_dir, filename))
+    return bundle_path
+
+
 class OfflineEvent:
 
     def __init__(self, rh, conf, eventType):
@@ -105,7 +175,7 @@ class OfflineEventCreator(object):
         self._display_tz = timezoneUtils.DisplayTZ(self._rh._aw, self._conf).getDisplayTZ()
         self.event = conf.as_event
         self._html = ""
-        self._fileHandler = None
+        self._zip = None
         self._mainPath = ""
         self._staticPath = ""
         self._eventType = event_type
@@ -114,27 +184,28 @@ class OfflineEventCreator(object):
         self._downloaded_files = {}
 
     def create(self, static_site_id):
-        config = Config.getInstance()
-        self._fileHandler = ZIPFileHandler()
+        file_path = self._get_file_path(static_site_id)
+        with NamedTemporaryFile(dir=os.path.dirname(file_path), suffix='.tmp', delete=False) as f:
+            try:
+                self._zip = ZipFileWriter(f)
+                self._create(self._zip)
+                self._zip.close()
+            except Exception:
+                os.remove(f.name)
+                raise
+        os.rename(f.name, file_path)
+        return file_path
 
+    def _create(self, zip_file):
         # create the home page html
         self._create_home()
 
         # Create main and static folders
         self._mainPath = self._normalize_path(u'OfflineWebsite-{}'.format(self._conf.getTitle().decode('utf-8')))
-        self._fileHandler.addDir(self._mainPath)
         self._staticPath = os.path.join(self._mainPath, "static")
-        self._fileHandler.addDir(self._staticPath)
-        # Add i18n js
-        self._addFolderFromSrc(os.path.join(self._staticPath, 'js', 'indico', 'i18n'),
-                               os.path.join(config.getHtdocsDir(), 'js', 'indico', 'i18n'))
-        # Add system icons (not referenced in HTML/CSS)
-        for icon in Config.getInstance().getSystemIcons().itervalues():
-            self._addFileFromSrc(os.path.join(self._staticPath, 'images', icon),
-                                 os.path.join(config.getHtdocsDir(), 'images', icon))
-        # Mathjax plugins can't be discovered by parsing the HTML
-        self._addFolderFromSrc(os.path.join(self._staticPath, 'js', 'lib', 'mathjax'),
-                               os.path.join(config.getHtdocsDir(), 'js', 'lib', 'mathjax'))
+        # Add the static files needed by every site (i18n js, mathjax, system icons)
+        with open(get_static_assets_bundle(), 'rb') as f:
+            zip_file.add_zip(f, self._staticPath)
 
         # Getting all materials, static files (css, images, js and vars.js.tpl)
         self._getAllMaterial()
@@ -155,14 +226,10 @@ class OfflineEventCreator(object):
 
         # Create overview.html file (main page for the event)
         conferenceDisplayPath = os.path.join(self._mainPath, 'overview.html')
-        self._fileHandler.addNewFile(conferenceDisplayPath, self._html)
+        zip_file.add_bytes(conferenceDisplayPath, self._html)
 
         # Creating index.html file
-        self._fileHandler.addNewFile('index.html',
-                                     '<meta http-equiv="Refresh" content="0; url=%s">' % conferenceDisplayPath)
-
-        self._fileHandler.close()
-        return self._save_file(self._fileHandler.getPath(), static_site_id)
+        zip_file.add_bytes('index.html', '<meta http-equiv="Refresh" content="0; url=%s">' % conferenceDisplayPath)
 
     def _get_static_files(self, html):
         config = Config.getInstance()
@@ -192,16 +259,22 @@ class OfflineEventCreator(object):
         This is the only clean way to deal with static files from plugins since otherwise
         we would have to emulate RHHtdocs.
         """
-        cfg = Config.getInstance()
         # If we have the embedded webserver prefer its base url since the iptables hack does
         # not work for connections from the same machine
-        base_url = cfg.getBaseURL()
-        for path in self._failed_paths:
+        base_url = Config.getInstance().getBaseURL()
+        paths = [path for path in self._failed_paths if os.path.join(self._staticPath, path) not in self._zip]
+        if not paths:
+            return
+        # fetch the files concurrently since each request has to go through the web server
+        pool = ThreadPool(min(len(paths), 8))
+        try:
+            contents = pool.map(_download, [os.path.join(base_url, path) for path in paths])
+        finally:
+            pool.close()
+        for path, content in zip(paths, contents):
             dst_path = os.path.join(self._staticPath, path)
-            if not self._fileHandler.hasFile(dst_path):
-                response = requests.get(os.path.join(base_url, path), verify=False)
-                self._downloaded_files[dst_path] = response.content
-                self._fileHandler.addNewFile(dst_path, response.content)
+            self._downloaded_files[dst_path] = content
+            self._zip.add_bytes(dst_path, content)
 
     def _get_css_refs(self):
         """Adds files referenced in stylesheets and rewrite the URLs inside those stylesheets"""
@@ -241,7 +314,7 @@ class OfflineEventCreator(object):
                 else:
                     self._addFileFromSrc(ref_dst_path, ref_src_path)
                 css = css.replace(orig_url, static_url)
-            self._fileHandler.addNewFile(dst_path, css)
+            self._zip.add_bytes(dst_path, css)
 
     def _create_home(self):
         # get default/selected view
@@ -273,40 +346,22 @@ class OfflineEventCreator(object):
                 if attachment.type == AttachmentType.file:
                     dst_path = posixpath.join(self._mainPath, "files", categoryPath,
                                               "{}-{}".format(attachment.id, attachment.file.filename))
-                    with attachment.file.get_local_path() as file_path:
-                        self._addFileFromSrc(dst_path, file_path)
+                    with closing(attachment.file.open()) as f:
+                        self._zip.add_file(dst_path, f, size=attachment.file.size)
 
     def _addFileFromSrc(self, dstPath, srcPath):
-        if not os.path.isfile(dstPath) and os.path.isfile(srcPath):
-            if not self._fileHandler.hasFile(dstPath):
-                newFile = open(srcPath, "rb")
-                self._fileHandler.addNewFile(dstPath, newFile.read())
-                newFile.close()
-
-    def _addFolderFromSrc(self, dstPath, srcPath):
-        for root, subfolders, files in os.walk(srcPath):
-            for filename in files:
-                src_filepath = os.path.join(root, filename)
-                if root.startswith(srcPath):
-                    dst_dirpath = os.path.join(dstPath, root[len(srcPath):].strip('/'))
-                else:
-                    dst_dirpath = dstPath
-                dst_filepath = os.path.join(dst_dirpath, filename)
-                self._fileHandler.addDir(dst_dirpath)
-                if not self._fileHandler.hasFile(dst_filepath):
-                    self._fileHandler.add(dst_filepath, src_filepath)
+        if os.path.isfile(srcPath):
+            self._zip.add_path(dstPath, srcPath)
 
-    def _save_file(self, srcPath, static_site_id):
+    def _get_file_path(self, static_site_id):
         volume = HelperMaKaCInfo.getMaKaCInfoInstance().getArchivingVolume()
         path = os.path.join(Config.getInstance().getOfflineStore(), volume, 'offline', self._conf.getId())
-        file_path = os.path.join(path, '{}.zip'.format(static_site_id))
         try:
             os.makedirs(path)
         except OSError as e:
             if e.errno != errno.EEXIST:
                 raise
-        shutil.copyfile(srcPath, file_path)
-        return file_path
+        return os.path.join(path, '{}.zip'.format(static_site_id))
 
 
 class ConferenceOfflineCreator(OfflineEventCreator):
@@ -392,7 +447,7 @@ class ConferenceOfflineCreator(OfflineEventCreator):
         url = self._getUrl(uh_or_endpoint, target, **params)
         fname = os.path.join(self._mainPath, url)
         html = self._get_static_files(html)
-        self._fileHandler.addNewFile(fname, html)
+        self._zip.add_bytes(fname, html)
 
     def _add_from_rh(self, rh_class, view_class, params, url_for_target):
         rh = rh_class()
@@ -448,14 +503,12 @@ class ConferenceOfflineCreator(OfflineEventCreator):
             # Got legacy reportlab PDF generator instead of the LaTex-based one
             self._add_file(pdf.getPDFBin(), uh_or_endpoint, target)
         else:
-            with open(pdf.generate()) as f:
+            with open(pdf.generate(), 'rb') as f:
                 self._add_file(f, uh_or_endpoint, target)
 
     def _add_file(self, file_like_or_str, uh_or_endpoint, target):
+        filename = os.path.join(self._mainPath, self._getUrl(uh_or_endpoint, target))
         if isinstance(file_like_or_str, str):
-            content = file_like_or_str
+            self._zip.add_bytes(filename, file_like_or_str)
         else:
-            # FIXME: the FileHandler should accept a file-like object
-            content = file_like_or_str.read()
-        filename = os.path.join(self._mainPath, self._getUrl(uh_or_endpoint, target))
-        self._fileHandler.addNewFile(filename, content)
+            self._zip.add_file(filename, file_like_or_str)
@@ -40,7 +40,6 @@ from MaKaC.accessControl import AccessWrapper
 from MaKaC.i18n import _
 from MaKaC.common.contextManager import ContextManager
 
-from indico.core.config import Config
 from indico.util.string import unicode_struct_to_utf8
 
 
@@ -223,20 +222,7 @@ class ServiceBase(RequestHandlerBase):
                 raise HTMLSecurityError('ERR-X0', 'HTML Security problem. {}'.format(e))
 
         if self._doProcess:
-            if Config.getInstance().getProfile():
-                import profile, pstats, random
-                proffilename = os.path.join(Config.getInstance().getTempDir(), "service%s.prof" % random.random())
-                result = [None]
-                profile.runctx("result[0] = self._getAnswer()", globals(), locals(), proffilename)
-                answer = result[0]
-                rep = Config.getInstance().getTempDir()
-                stats = pstats.Stats(proffilename)
-                stats.strip_dirs()
-                stats.sort_stats('cumulative', 'time', 'calls')
-                stats.dump_stats(os.path.join(rep, "IndicoServiceRequestProfile.log"))
-                os.remove(proffilename)
-            else:
-                answer = self._getAnswer()
+            answer = self._getAnswer()
             self._deleteTempFiles()
 
             return answer
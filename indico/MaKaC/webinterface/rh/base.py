@@ -18,11 +18,6 @@ import inspect
 import itertools
 import time
 import os
-import cProfile as profiler
-import pstats
-import sys
-import random
-import StringIO
 import warnings
 from datetime import datetime, timedelta
 from functools import wraps, partial
@@ -63,6 +58,7 @@ from indico.core import signals
 from indico.core.config import Config
 from indico.core.db import DBMgr
 from indico.core.db.sqlalchemy.core import handle_sqlalchemy_database_error
+from indico.core.db.sqlalchemy.nplusone import start_request_query_detection
 from indico.core.errors import get_error_description
 from indico.core.logger import Logger
 from indico.modules.auth.util import url_for_login, redirect_to_login
@@ -180,6 +176,7 @@ class RH(RequestHandlerBase):
     _isMobile = True  # this value means that the generated web page can be mobile
     CSRF_ENABLED = False  # require a csrf_token when accessing the RH with anything but GET
     EVENT_FEATURE = None  # require a certain event feature when accessing the RH. See `EventFeature` for details
+    USES_ZODB = True  # set to False for RHs using only SQL; the ZODB connection is then opened only when needed
 
     #: A dict specifying how the url should be normalized.
     #: `args` is a dictionary mapping view args keys to callables
@@ -572,6 +569,8 @@ class RH(RequestHandlerBase):
     def _process_retry_setup(self):
         # clear the fossile cache at the start of each request
         fossilize.clearCache()
+        # forget the queries of a previous attempt
+        start_request_query_detection()
         # clear after-commit queue
         flush_after_commit_queue(False)
         # delete all queued emails
@@ -592,8 +591,7 @@ class RH(RequestHandlerBase):
         self._checkCSRF()
         self._reqParams = copy.copy(params)
 
-    def _process_retry_do(self, profile):
-        profile_name, res = '', ''
+    def _process_retry_do(self):
         try:
             # old code gets parameters from call
             # new code utilizes of flask.request
@@ -603,20 +601,20 @@ class RH(RequestHandlerBase):
                 cp_result = self._checkParams(self._reqParams)
 
             if isinstance(cp_result, (current_app.response_class, Response)):
-                return '', cp_result
+                return cp_result
 
             func = getattr(self, '_checkParams_' + request.method, None)
             if func:
                 cp_result = func()
                 if isinstance(cp_result, (current_app.response_class, Response)):
-                    return '', cp_result
+                    return cp_result
 
         except NoResultFound:  # sqlalchemy .one() not finding anything
             raise NotFoundError(_('The specified item could not be found.'), title=_('Item not found'))
 
         rv = self.normalize_url()
         if rv is not None:
-            return '', rv
+            return rv
 
         self._checkProtection()
         func = getattr(self, '_checkProtection_' + request.method, None)
@@ -629,20 +627,14 @@ class RH(RequestHandlerBase):
                                                 self._doNotSanitizeFields)
 
         if self._doProcess:
-            if profile:
-                profile_name = os.path.join(Config.getInstance().getTempDir(), 'stone{}.prof'.format(random.random()))
-                result = [None]
-                profiler.runctx('result[0] = self._process()', globals(), locals(), profile_name)
-                res = result[0]
-            else:
-                res = self._process()
-        return profile_name, res
+            return self._process()
+        return ''
 
-    def _process_retry(self, params, retry, profile, forced_conflicts):
+    def _process_retry(self, params, retry, forced_conflicts):
         self._process_retry_setup()
         self._process_retry_auth_check(params)
         DBMgr.getInstance().sync()
-        return self._process_retry_do(profile)
+        return self._process_retry_do()
 
     def _process_success(self):
         Logger.get('requestHandler').info('Request successful')
@@ -666,8 +658,8 @@ class RH(RequestHandlerBase):
             raise BadRequest
 
         cfg = Config.getInstance()
-        forced_conflicts, max_retries, profile = cfg.getForceConflicts(), cfg.getMaxRetries(), cfg.getProfile()
-        profile_name, res, textLog = '', '', []
+        forced_conflicts, max_retries = cfg.getForceConflicts(), cfg.getMaxRetries()
+        res = ''
 
         self._startTime = datetime.now()
 
@@ -683,8 +675,7 @@ class RH(RequestHandlerBase):
         if self.EVENT_FEATURE is not None:
             self._check_event_feature()
 
-        DBMgr.getInstance().startRequest()
-        textLog.append("%s : Database request started" % (datetime.now() - self._startTime))
+        DBMgr.getInstance().startRequest(lazy=not self.USES_ZODB)
         Logger.get('requestHandler').info(u'Request started: %s %s [IP=%s] [PID=%s]',
                                           request.method, request.relative_url, request.remote_addr, os.getpid())
 
@@ -696,9 +687,11 @@ class RH(RequestHandlerBase):
                         signals.before_retry.send()
 
                     try:
-                        profile_name, res = self._process_retry(params, i, profile, forced_conflicts)
+                        res = self._process_retry(params, i, forced_conflicts)
                         signals.after_process.send()
-                        if i < forced_conflicts:  # raise conflict error if enabled to easily handle conflict error case
+                        # raise conflict error if enabled to easily handle conflict error case
+                        # (conflicts are impossible if the handler did not use the ZODB at all)
+                        if i < forced_conflicts and DBMgr.getInstance().isConnectionOpen():
                             raise ConflictError
                         if self.commit:
                             transaction.commit()
@@ -727,33 +720,6 @@ class RH(RequestHandlerBase):
                 res = e.response
             is_error_response = True
 
-        totalTime = (datetime.now() - self._startTime)
-        textLog.append('{} : Request ended'.format(totalTime))
-
-        # log request timing
-        if profile and os.path.isfile(profile_name):
-            rep = Config.getInstance().getTempDir()
-            stats = pstats.Stats(profile_name)
-            stats.strip_dirs()
-            stats.sort_stats('cumulative', 'time', 'calls')
-            stats.dump_stats(os.path.join(rep, 'IndicoRequestProfile.log'))
-            output = StringIO.StringIO()
-            sys.stdout = output
-            stats.print_stats(100)
-            sys.stdout = sys.__stdout__
-            s = output.getvalue()
-            f = file(os.path.join(rep, 'IndicoRequest.log'), 'a+')
-            f.write('--------------------------------\n')
-            f.write('URL     : {}\n'.format(request.url))
-            f.write('{} : start request\n'.format(self._startTime))
-            f.write('params:{}'.format(params))
-            f.write('\n'.join(textLog))
-            f.write(s)
-            f.write('--------------------------------\n\n')
-            f.close()
-        if profile and profile_name and os.path.exists(profile_name):
-            os.remove(profile_name)
-
         if self._responseUtil.call:
             return self._responseUtil.make_call()
 
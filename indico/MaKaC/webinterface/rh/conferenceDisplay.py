@@ -16,19 +16,23 @@
 
 import os
 import pytz
+import re
+import shutil
 from datetime import datetime
-from flask import Response, flash, request, session
-from werkzeug.exceptions import Forbidden
+from flask import Response, flash, make_response, request, session
+from werkzeug.exceptions import Forbidden, NotFound
 
 import MaKaC.webinterface.rh.base as base
 import MaKaC.webinterface.rh.conferenceBase as conferenceBase
 import MaKaC.webinterface.pages.conferences as conferences
 import MaKaC.webinterface.urlHandlers as urlHandlers
+from MaKaC.webinterface.pages.error import render_error
 from MaKaC.webinterface.pages.errors import WPError404
 from indico.core.config import Config
 from MaKaC.webinterface.rh.base import RHDisplayBaseProtected
 from MaKaC.webinterface.rh.conferenceBase import RHConferenceBase
 from MaKaC.errors import MaKaCError
+from MaKaC.PDFinterface.base import get_latex_cache_path, get_latex_job_state
 from MaKaC.PDFinterface.conference import AbstractBook
 import zipfile
 from cStringIO import StringIO
@@ -43,7 +47,7 @@ from indico.modules.events.layout.views import WPPage
 from indico.modules.events.legacy import XMLEventSerializer
 from indico.util.i18n import set_best_lang
 from indico.util.signals import values_from_signal
-from indico.web.flask.util import send_file
+from indico.web.flask.util import send_file, url_for
 
 
 class RHConferenceAccessKey( conferenceBase.RHConferenceBase ):
@@ -227,6 +231,22 @@ class RHAbstractBook(RHConferenceBaseDisplay):
             os.makedirs(dir)
         return os.path.join(dir, '%s.pdf' % self._conf.getId())
 
+    def _sendBook(self, fname):
+        pdfFilename = "%s - Book of abstracts.pdf" % cleanHTMLHeaderFilename(self._target.getTitle())
+        cacheFile = self._getCacheFileName()
+        shutil.copyfile(fname, cacheFile)
+        return send_file(pdfFilename, cacheFile, 'PDF')
+
+    def _sendPending(self, key):
+        # the browser keeps checking whether the PDF is ready
+        rv = make_response(render_error(_("The book of abstracts is being generated"),
+                                        _("This may take a few minutes. The download will start automatically once "
+                                          "it is ready."),
+                                        standalone=True))
+        rv.headers['Refresh'] = '5; url={}'.format(url_for('event.conferenceDisplay-abstractBookJob', self._conf,
+                                                            key=key))
+        return rv
+
     def _process(self):
         boaConfig = self._conf.getBOAConfig()
         pdfFilename = "%s - Book of abstracts.pdf" % cleanHTMLHeaderFilename(self._target.getTitle())
@@ -241,14 +261,30 @@ class RHAbstractBook(RHConferenceBaseDisplay):
         else:
             tz = timezoneUtils.DisplayTZ(self._aw, self._target).getDisplayTZ()
             pdf = AbstractBook(self._target, self.getAW(), tz=tz)
-            fname = pdf.generate()
+            # compiling a large book takes a long time, so it is done in
+            # the background unless it has been generated before
+            key, fname = pdf.generate_async()
+            if fname is None:
+                return self._sendPending(key)
+            return self._sendBook(fname)
 
-            with open(fname, 'rb') as f:
-                data = f.read()
-            with open(cacheFile, 'wb') as f:
-                f.write(data)
 
-            return send_file(pdfFilename, cacheFile, 'PDF')
+class RHAbstractBookJob(RHAbstractBook):
+    """Progress/download of a book of abstracts generated in the background"""
+
+    def _checkParams(self, params):
+        RHAbstractBook._checkParams(self, params)
+        self._key = request.view_args['key']
+        if not re.match(r'^[0-9a-f]{40}$', self._key):
+            raise NotFound
+
+    def _process(self):
+        state = get_latex_job_state(self._key)
+        if state == 'running':
+            return self._sendPending(self._key)
+        elif state == 'failed':
+            raise MaKaCError(_("The book of abstracts could not be generated"))
+        return self._sendBook(get_latex_cache_path(self._key))
 
 
 class RHConferenceToXML(RHConferenceBaseDisplay):
@@ -53,7 +53,7 @@
             <%include file="inc/contribution.tpl" args="contrib=item"/>
         % endif
 
-        \fancyfoot[L]{\small \rmfamily \color{gray} \today}
+        \fancyfoot[L]{\small \rmfamily \color{gray} ${latex_escape(today)}}
         \fancyfoot[C]{}
         \fancyfoot[R]{\small \rmfamily \color{gray} ${ latex_escape(_("Page {0}"), ignore_braces=True).format(r"\thepage") }}
     % endfor
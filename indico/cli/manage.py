@@ -27,6 +27,7 @@ from indico.cli.database import DatabaseManager, PluginDatabaseManager
 from indico.cli.server import IndicoDevServer
 from indico.cli.shell import IndicoShell
 from indico.cli.i18n import IndicoI18nManager
+from indico.cli.profile import IndicoProfileManager
 from indico.core import signals
 from indico.core.celery.cli import IndicoCeleryCommand
 from indico.core.db import db
@@ -46,6 +47,7 @@ def main():
     manager.add_command('runserver', IndicoDevServer())
     manager.add_command('i18n', IndicoI18nManager)
     manager.add_command('celery', IndicoCeleryCommand)
+    manager.add_command('profile', IndicoProfileManager)
     signals.plugin.cli.send(manager)
 
     try:
@@ -0,0 +1,51 @@
+from __future__ import print_function, division
+
+from flask_script import Manager
+
+from indico.core.request_stats import METRICS, get_stored_endpoint_stats
+from indico.util.console import cformat, error
+from indico.util.redis import client as redis_client
+
+IndicoProfileManager = Manager(usage="Shows the performance statistics recorded when profiling is enabled")
+
+_COLUMNS = (('count', 'Requests', '{:.0f}'),
+            ('duration', 'Time (ms)', '{:.1f}'),
+            ('sql_count', 'Queries', '{:.1f}'),
+            ('sql_time', 'SQL (ms)', '{:.1f}'),
+            ('template_time', 'Templates (ms)', '{:.1f}'),
+            ('fossilize_time', 'Fossilize (ms)', '{:.1f}'),
+            ('memoize_hits', 'Memoize hits', '{:.1f}'),
+            ('cache_gets', 'Cache gets', '{:.1f}'),
+            ('cache_hits', 'Cache hits', '{:.1f}'))
+
+
+@IndicoProfileManager.option('--hours', type=int, default=24, help="Number of past hours to include")
+@IndicoProfileManager.option('--sort', default='total', choices=('total', 'count') + METRICS,
+                             help="Sort by the average of this metric, the total time or the number of requests")
+@IndicoProfileManager.option('--limit', type=int, default=25, help="Number of endpoints to show")
+def report(hours, sort, limit):
+    """Shows per-endpoint averages of the recorded request statistics"""
+    if not redis_client:
+        error('Request statistics are only stored if RedisConnectionURL is set')
+        return
+    stats = get_stored_endpoint_stats(hours)
+    if not stats:
+        print('No requests have been recorded')
+        return
+    rows = []
+    for endpoint, data in stats.iteritems():
+        count = data['count'] or 1
+        row = {metric: data[metric] / count for metric in METRICS}
+        for metric in row:
+            if metric.endswith('_time') or metric == 'duration':
+                row[metric] *= 1000
+        row['count'] = data['count']
+        row['total'] = data['duration']
+        rows.append((endpoint, row))
+    rows.sort(key=lambda x: x[1][sort], reverse=True)
+    width = max(len(endpoint) for endpoint, __ in rows[:limit])
+    print(cformat('%{white!}{}  {}').format('Endpoint'.ljust(width),
+                                            '  '.join(title for __, title, __ in _COLUMNS)))
+    for endpoint, row in rows[:limit]:
+        print('{}  {}'.format(endpoint.ljust(width), '  '.join(fmt.format(row[key]).rjust(len(title))
+                                                                for key, title, fmt in _COLUMNS)))
@@ -308,10 +308,15 @@ class Config:
         'SmtpLogin'                 : '',
         'SmtpPassword'              : '',
         'SmtpUseTLS'                : 'no',
+        'SmtpUseCelery'             : 'no',
         'SupportEmail'              : 'root@localhost',
         'PublicSupportEmail'        : 'root@localhost',
         'NoReplyEmail'              : 'noreply-root@localhost',
         'Profile'                   : 'no',
+        'ProfileSampleRate'         : 1.0,
+        'ProfileSlowQueryThreshold' : 0.1,
+        'DetectNPlusOne'            : None,
+        'DetectNPlusOneThreshold'   : 5,
         'StaticFileMethod'          : None,
         'AuthenticatedEnforceSecure': 'no',
         'MaxUploadFilesTotalSize'   : 0,
@@ -481,6 +486,9 @@ class Config:
         if self.getStaticFileMethod() is not None and len(self.getStaticFileMethod()) != 2:
             raise MaKaCError('StaticFileMethod must be None, a string or a 2-tuple')
 
+        if self.getDetectNPlusOne() not in (None, 'log', 'raise'):
+            raise ValueError('Invalid DetectNPlusOne value: {}'.format(self.getDetectNPlusOne()))
+
         if self.getDefaultTimezone() not in pytz.all_timezones_set:
             raise ValueError('Invalid default timezone: {}'.format(self.getDefaultTimezone()))
 
@@ -526,6 +534,9 @@ class Config:
     def getSmtpUseTLS(self):
         return self._yesOrNoVariable('SmtpUseTLS')
 
+    def getSmtpUseCelery(self):
+        return self._yesOrNoVariable('SmtpUseCelery')
+
     def getProfile(self):
         return self._yesOrNoVariable('Profile')
 
@@ -78,7 +78,7 @@ class DBMgr:
             cls._instances[os.getpid()] = dbInstance
 
     def _getConnObject(self):
-        return self._conn.conn
+        return getattr(self._conn, 'conn', None)
 
     def _setConnObject(self, obj):
         self._conn.conn = obj
@@ -86,10 +86,15 @@ class DBMgr:
     def _delConnObject(self):
         self._conn.conn = None
 
-    def startRequest(self):
+    def startRequest(self, lazy=False):
         """Initialise the DB and starts a new transaction.
+
+        :param lazy: Only open the connection once it is actually used.
+                     Requests which only need the SQL database then
+                     never talk to the ZEO server.
         """
-        self._conn.conn = self._db.open()
+        self._conn.lazy = lazy
+        self._conn.conn = None if lazy else self._db.open()
 
     def endRequest(self, commit=True):
         """Closes the DB and commits changes.
@@ -99,17 +104,32 @@ class DBMgr:
         else:
             self.abort()
 
-        self._getConnObject().close()
+        conn = self._getConnObject()
+        if conn is not None:
+            conn.close()
         self._delConnObject()
+        self._conn.lazy = False
 
     def getDBConnection(self):
-        return self._getConnObject()
+        conn = self._getConnObject()
+        if conn is None and getattr(self._conn, 'lazy', False):
+            conn = self._conn.conn = self._db.open()
+        return conn
 
     def isConnected(self):
-        return hasattr(self._conn, 'conn') and self._conn.conn is not None
+        """Check whether the ZODB can be used in the current request.
+
+        This is also the case if the connection has not been opened yet
+        since it is opened automatically when first used.
+        """
+        return self.isConnectionOpen() or getattr(self._conn, 'lazy', False)
+
+    def isConnectionOpen(self):
+        """Check whether a connection has actually been opened."""
+        return self._getConnObject() is not None
 
     def getDBConnCache(self):
-        conn = self._getConnObject()
+        conn = self.getDBConnection()
         return conn._cache
 
     def getDBClassFactory(self):
@@ -128,7 +148,10 @@ class DBMgr:
         transaction.abort()
 
     def sync(self):
-        self._getConnObject().sync()
+        conn = self._getConnObject()
+        # nothing to synchronize if the connection has not been used yet
+        if conn is not None:
+            conn.sync()
 
     def pack(self, days=1):
         self._storage.pack(days=days)
@@ -42,11 +42,19 @@ def _interesting_tb_item(item, paths):
     return (item[0].endswith('.tpl.py') or any(item[0].startswith(p) for p in paths)) and 'sqlalchemy' not in item[0]
 
 
-def _get_sql_line():
+def get_sql_source(ignored_files=()):
+    """Get the location in the Indico code which is executing a query.
+
+    :param ignored_files: Source files which are never considered the
+                          location of the query, e.g. the module
+                          containing the SQLAlchemy event listener
+                          calling this function.
+    """
     indico_path = current_app.root_path
     makac_path = os.path.abspath(os.path.join(indico_path, '..', 'MaKaC'))
     paths = [indico_path, makac_path] + [p.root_path for p in plugin_engine.get_active_plugins().itervalues()]
-    stack = [item for item in reversed(traceback.extract_stack()) if _interesting_tb_item(item, paths)]
+    stack = [item for item in reversed(traceback.extract_stack())
+             if _interesting_tb_item(item, paths) and item[0] not in ignored_files]
     for i, item in enumerate(stack):
         return {'file': item[0],
                 'line': item[1],
@@ -79,7 +87,7 @@ def apply_db_loggers(app):
                                                    'req_url': request.url if has_request_context() else None})
 
         context._query_start_time = time.time()
-        source_line = _get_sql_line()
+        source_line = get_sql_source()
         if source_line:
             log_msg = 'Start Query:\n    {0[file]}:{0[line]} {0[function]}\n\n{1}\n{2}'.format(
                 source_line,
@@ -108,7 +116,7 @@ def apply_db_loggers(app):
     @listens_for(Engine, 'after_cursor_execute')
     def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
         total = time.time() - context._query_start_time
-        source_line = _get_sql_line()
+        source_line = get_sql_source()
         source = source_line['items'] if source_line else None
         logger.debug('Query complete; total time: %s', total, extra={'sql_log_type': 'end',
                                                                      'req_path': (request.path
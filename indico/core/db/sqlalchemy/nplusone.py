@@ -0,0 +1,145 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+"""Detection of N+1 query problems.
+
+An N+1 problem usually shows up as the same query (with different
+parameters) being executed over and over again from the same line of
+code, e.g. when a relationship is lazy-loaded inside a loop.  The
+:class:`QueryDetector` fingerprints each statement and reports such
+queries along with the stack which executed them.
+"""
+
+from __future__ import absolute_import
+
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+from sqlalchemy.engine import Engine
+from sqlalchemy.event import listen, remove
+
+from indico.core.config import Config
+from indico.core.db.sqlalchemy.logging import get_sql_source
+from indico.core.logger import Logger
+
+
+_fingerprint_res = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),  # string literals
+    (re.compile(r'%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b'), '?'),  # bind parameters and numbers
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),  # IN lists of any length
+    (re.compile(r'\s+'), ' ')
+]
+_applied = False
+
+
+class NPlusOneError(Exception):
+    """Raised when a query is repeated too often in strict mode."""
+
+
+def get_query_fingerprint(statement):
+    """Get the shape of an SQL statement, ignoring all values in it."""
+    for regex, replacement in _fingerprint_res:
+        statement = regex.sub(replacement, statement)
+    return statement.strip()
+
+
+class QueryDetector(object):
+    """Detects queries which are repeated from the same call site.
+
+    :param threshold: How often a query needs to be executed from the
+                      same place to be reported.
+    :param raise_error: Whether to raise :exc:`NPlusOneError` instead
+                        of logging a warning.
+    """
+
+    def __init__(self, threshold=5, raise_error=False):
+        self.threshold = threshold
+        self.raise_error = raise_error
+        self.count = 0
+        self.queries = Counter()
+        self.sources = {}
+
+    @property
+    def repeated_queries(self):
+        """The queries which were executed too often.
+
+        :return: A list of ``(fingerprint, source, count)`` tuples.
+        """
+        return [(key[0], self.sources[key], count) for key, count in self.queries.most_common()
+                if count >= self.threshold]
+
+    def record(self, statement):
+        """Record the execution of a statement."""
+        self.count += 1
+        source = get_sql_source() if has_app_context() else None
+        # UPDATEs from a flush cannot be traced back to the code which caused them
+        location = (source['file'], source['line']) if source else None
+        key = (get_query_fingerprint(statement), location)
+        self.queries[key] += 1
+        self.sources.setdefault(key, source)
+        if self.queries[key] == self.threshold and location is not None:
+            self._report(key[0], source)
+
+    def _report(self, fingerprint, source):
+        stack = '\n'.join('    {}:{} {}'.format(*item[:3]) for item in source['items'])
+        message = 'Query executed {} times from {}:{} {}\n{}\n\n    {}'.format(self.threshold, source['file'],
+                                                                            source['line'], source['function'],
+                                                                            stack, fingerprint)
+        if self.raise_error:
+            raise NPlusOneError(message)
+        Logger.get('db.nplusone').warning(message)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.record(statement)
+
+    @contextmanager
+    def watch(self):
+        """Record all queries executed inside the block."""
+        listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        try:
+            yield self
+        finally:
+            remove(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+
+def start_request_query_detection():
+    """Start detecting repeated queries in the current request.
+
+    This does nothing unless ``DetectNPlusOne`` is enabled in
+    indico.conf.  Calling it again discards the queries recorded
+    before, e.g. when a request is retried.
+    """
+    mode = Config.getInstance().getDetectNPlusOne()
+    if mode:
+        g.query_detector = QueryDetector(threshold=Config.getInstance().getDetectNPlusOneThreshold(),
+                                         raise_error=(mode == 'raise'))
+
+
+def apply_query_detection(app):
+    """Pass the queries executed in a request to its query detector."""
+    global _applied
+    if not Config.getInstance().getDetectNPlusOne() or _applied:
+        return
+    _applied = True
+
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        detector = g.get('query_detector') if has_app_context() else None
+        if detector is not None:
+            detector.record(statement)
+
+    listen(Engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,51 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from indico.core.db.sqlalchemy.nplusone import NPlusOneError, get_query_fingerprint
+
+
+@pytest.mark.parametrize(('statement', 'expected'), (
+    ('SELECT users.id FROM users WHERE users.id = %(id_1)s', 'SELECT users.id FROM users WHERE users.id = ?'),
+    ("SELECT 1 FROM foo WHERE name = 'it''s' LIMIT 10", 'SELECT ? FROM foo WHERE name = ? LIMIT ?'),
+    ('SELECT a FROM b WHERE b.id IN (%(id_1)s, %(id_2)s,\n  %(id_3)s)', 'SELECT a FROM b WHERE b.id IN (?)'),
+    ('SELECT anon_1.id_2 FROM t1 AS anon_1', 'SELECT anon_1.id_2 FROM t1 AS anon_1'),
+))
+def test_get_query_fingerprint(statement, expected):
+    assert get_query_fingerprint(statement) == expected
+
+
+def test_detect_nplusone(db, detect_nplusone):
+    with pytest.raises(NPlusOneError):
+        with detect_nplusone(threshold=3):
+            for i in range(3):
+                db.session.query(db.literal(i)).scalar()
+
+
+def test_detect_nplusone_different_lines(db, detect_nplusone):
+    with detect_nplusone(threshold=2) as detector:
+        db.session.query(db.literal(1)).scalar()
+        db.session.query(db.literal(2)).scalar()
+    assert detector.count == 2
+    assert not detector.repeated_queries
+
+
+def test_detect_nplusone_max_queries(db, detect_nplusone):
+    with pytest.raises(pytest.fail.Exception):
+        with detect_nplusone(max_queries=1):
+            db.session.query(db.literal(1)).scalar()
+            db.session.query(db.literal(2)).scalar()
@@ -22,6 +22,7 @@ from sqlalchemy import over, func, inspect
 from sqlalchemy.sql import update
 
 TS_REGEX = re.compile(r'([@<>!()&|:\'])')
+GLOB_REGEX_SPECIAL_CHARS = frozenset('.^$*+?()[]{}|\\')
 
 
 def limit_groups(query, model, partition_by, order_by, limit=None, offset=0):
@@ -67,6 +68,57 @@ def escape_like(value):
             .replace('_', escape_char + '_'))     # same for _ wildcards
 
 
+def glob_to_regex(pattern):
+    """Converts a shell-style wildcard pattern to a PostgreSQL regex.
+
+    The pattern is interpreted like :func:`fnmatch.fnmatch` does it,
+    i.e. ``*`` and ``?`` are wildcards and ``[seq]``/``[!seq]`` match
+    any character in/not in *seq*.  The regex matches the whole string.
+    """
+    i, n = 0, len(pattern)
+    res = []
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            res.append('.*')
+        elif c == '?':
+            res.append('.')
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                res.append('\\[')
+            else:
+                stuff = pattern[i:j].replace('\\', '\\\\')
+                i = j + 1
+                if stuff[0] == '!':
+                    stuff = '^' + stuff[1:]
+                elif stuff[0] == '^':
+                    stuff = '\\' + stuff
+                res.append('[{}]'.format(stuff))
+        elif c in GLOB_REGEX_SPECIAL_CHARS:
+            res.append('\\' + c)
+        else:
+            res.append(c)
+    return '^{}$'.format(''.join(res))
+
+
+def glob_matches(column, pattern, case_sensitive=False):
+    """Creates a filter matching a column against a wildcard pattern
+
+    :param column: The column (or any SQL expression) to match
+    :param pattern: A shell-style wildcard pattern, see :func:`glob_to_regex`
+    :param case_sensitive: Whether the match is case-sensitive
+    """
+    return column.op('~' if case_sensitive else '~*')(glob_to_regex(pattern))
+
+
 def preprocess_ts_string(text, prefix=True):
     atoms = [TS_REGEX.sub(r'\\\1', atom.strip()) for atom in text.split()]
     return ' & '.join('{}:*'.format(atom) if prefix else atom for atom in atoms)
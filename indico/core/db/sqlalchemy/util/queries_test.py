@@ -0,0 +1,49 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from indico.core.db.sqlalchemy.util.queries import glob_matches, glob_to_regex
+
+
+@pytest.mark.parametrize(('pattern', 'expected'), (
+    ('foo', '^foo$'),
+    ('foo*', '^foo.*$'),
+    ('f?o', '^f.o$'),
+    ('a.b', '^a\\.b$'),
+    ('[ab]c', '^[ab]c$'),
+    ('[!ab]c', '^[^ab]c$'),
+    ('[^a]', '^[\\^a]$'),
+    ('[ab', '^\\[ab$'),
+    ('(x|y)+', '^\\(x\\|y\\)\\+$'),
+))
+def test_glob_to_regex(pattern, expected):
+    assert glob_to_regex(pattern) == expected
+
+
+@pytest.mark.parametrize(('value', 'pattern', 'case_sensitive', 'expected'), (
+    ('Main Building', 'main*', False, True),
+    ('Main Building', 'main*', True, False),
+    ('Main Building', '*build*', False, True),
+    ('Main Building', 'main', False, False),
+    ('500-1-201', '500-?-201', False, True),
+    ('500-1-201', '500-[23]-201', False, False),
+    ('a.b', 'a?b', False, True),
+    ('axb', 'a.b', False, False),
+))
+def test_glob_matches(db, value, pattern, case_sensitive, expected):
+    criterion = glob_matches(db.literal(value), pattern, case_sensitive=case_sensitive)
+    assert db.session.query(criterion).scalar() == expected
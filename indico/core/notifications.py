@@ -54,6 +54,20 @@ def send_email(email, event=None, module='', user=None, skip_queue=False):
         GenericMailer.send(email, skipQueue=skip_queue)
 
 
+def send_emails_in_bulk(emails, batch_size=200, interval=30):
+    """Sends many emails created by :func:`make_email` in batches.
+
+    Use this instead of :func:`send_email` when sending hundreds of
+    emails at once, e.g. in a periodic task.  The emails are sent
+    asynchronously and throttled to avoid overloading the mail server.
+
+    :param emails: The email objects returned by :func:`make_email`
+    :param batch_size: The number of emails sent at once
+    :param interval: The number of seconds between two batches
+    """
+    GenericMailer.sendBulk(emails, batch_size=batch_size, interval=interval)
+
+
 def make_email(to_list=None, cc_list=None, bcc_list=None, from_address=None, reply_address=None, attachments=None,
                subject=None, body=None, template=None, html=False):
     """Creates an email.
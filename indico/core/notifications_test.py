@@ -0,0 +1,155 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+import smtplib
+import socket
+
+import pytest
+from mock import MagicMock, call
+
+from indico.core.notifications import send_emails_in_bulk
+
+from MaKaC.common.mail import GenericMailer, SMTPConnectionPool
+from MaKaC.errors import MaKaCError
+
+
+def _make_mail(email):
+    return {'msg': 'test', 'toList': {email}, 'ccList': set(), 'bccList': set(), 'fromAddr': 'noreply@example.com'}
+
+
+@pytest.fixture
+def smtp_pool(mocker):
+    """Provides an empty connection pool and mocks all SMTP connections"""
+    mocker.patch('smtplib.SMTP', side_effect=lambda *args: MagicMock())
+    mocker.patch('MaKaC.common.mail.time.sleep')
+    pool = SMTPConnectionPool(max_size=2, max_idle=30)
+    mocker.patch('MaKaC.common.mail.smtp_pool', pool)
+    return pool
+
+
+def test_send_emails_in_bulk(mocker):
+    # emails which cannot be prepared (e.g. no recipients) are skipped
+    mocker.patch.object(GenericMailer, '_prepare', side_effect=lambda email: email if email != 'skip' else None)
+    apply_async = mocker.patch('indico.util.tasks.send_emails.apply_async')
+    send_emails_in_bulk(['a', 'b', 'skip', 'c', 'd', 'e'], batch_size=2, interval=30)
+    assert apply_async.call_args_list == [call(args=[['a', 'b']], countdown=0),
+                                          call(args=[['c', 'd']], countdown=30),
+                                          call(args=[['e']], countdown=60)]
+
+
+def test_send_emails_in_bulk_empty(mocker):
+    apply_async = mocker.patch('indico.util.tasks.send_emails.apply_async')
+    send_emails_in_bulk([])
+    assert not apply_async.called
+
+
+def test_smtp_pool_reuse(smtp_pool):
+    server = smtp_pool.get()
+    smtp_pool.put(server)
+    assert smtp_pool.get() is server
+    assert smtplib.SMTP.call_count == 1
+
+
+def test_smtp_pool_max_idle(smtp_pool):
+    server = smtp_pool.get()
+    smtp_pool.put(server)
+    smtp_pool._idle[0] = (server, smtp_pool._idle[0][1] - 31)
+    assert smtp_pool.get() is not server
+    assert server.quit.called
+
+
+def test_smtp_pool_max_size(smtp_pool):
+    servers = [smtp_pool.get() for __ in xrange(3)]
+    for server in servers:
+        smtp_pool.put(server)
+    assert len(smtp_pool._idle) == 2
+    assert servers[-1].quit.called
+
+
+@pytest.mark.parametrize('error', (smtplib.SMTPServerDisconnected, socket.error))
+def test_smtp_pool_discard_after_disconnect(smtp_pool, error):
+    with pytest.raises(error):
+        with smtp_pool.connection() as server:
+            raise error
+    assert server.quit.called
+    assert smtp_pool.get() is not server
+
+
+@pytest.mark.parametrize(('code', 'retried'), (
+    (421, True),
+    (451, True),
+    (550, False),
+    (554, False),
+))
+def test_send_retry(smtp_pool, code, retried):
+    server = smtp_pool.get()
+    server.sendmail.side_effect = smtplib.SMTPResponseException(code, 'error')
+    smtp_pool.put(server)
+    if retried:
+        GenericMailer._send(_make_mail('test@example.com'))
+    else:
+        with pytest.raises(smtplib.SMTPResponseException):
+            GenericMailer._send(_make_mail('test@example.com'))
+    assert server.sendmail.call_count == 1
+    # the retry uses a new connection since the server may have closed the failed one
+    assert server.quit.called == retried
+    assert smtplib.SMTP.call_count == (2 if retried else 1)
+    new_server = smtp_pool.get()
+    assert (new_server is not server) == retried
+    if retried:
+        assert new_server.sendmail.call_count == 1
+
+
+def test_send_retry_new_connection(smtp_pool):
+    server = smtp_pool.get()
+    server.sendmail.side_effect = smtplib.SMTPServerDisconnected
+    smtp_pool.put(server)
+    GenericMailer._send(_make_mail('test@example.com'))
+    assert server.sendmail.call_count == 1
+    assert smtplib.SMTP.call_count == 2
+    new_server = smtp_pool.get()
+    assert new_server.sendmail.call_count == 1
+
+
+def test_send_retries_exhausted(smtp_pool):
+    smtplib.SMTP.side_effect = lambda *args: MagicMock(**{
+        'sendmail.side_effect': smtplib.SMTPResponseException(421, 'error')
+    })
+    with pytest.raises(smtplib.SMTPResponseException):
+        GenericMailer._send(_make_mail('test@example.com'), retries=2)
+    assert smtplib.SMTP.call_count == 3
+    assert not smtp_pool._idle
+
+
+def test_send_batch(smtp_pool):
+    server = smtp_pool.get()
+    server.sendmail.side_effect = [None, smtplib.SMTPRecipientsRefused({'invalid@example.com': (550, 'error')}),
+                                   None]
+    smtp_pool.put(server)
+    GenericMailer.sendBatch([_make_mail('a@example.com'), _make_mail('invalid@example.com'),
+                             _make_mail('b@example.com')])
+    # a failure does not prevent the other emails from being sent
+    assert [c[0][1] for c in server.sendmail.call_args_list] == [{'a@example.com'}, {'invalid@example.com'},
+                                                                 {'b@example.com'}]
+    # ... and they are all sent over the same connection
+    assert smtplib.SMTP.call_count == 1
+
+
+def test_deliver_invalid_recipient():
+    server = MagicMock()
+    server.sendmail.side_effect = smtplib.SMTPRecipientsRefused({'invalid@example.com': (550, 'error')})
+    with pytest.raises(MaKaCError):
+        GenericMailer._deliver(server, _make_mail('invalid@example.com'))
@@ -0,0 +1,258 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+"""Per-request performance statistics.
+
+When ``Profile`` is enabled in indico.conf, a sample of the requests
+(``ProfileSampleRate``) is instrumented: SQL statements, cache and
+``memoize_request`` usage as well as the time spent fossilizing and
+rendering templates are recorded.  The numbers are sent to the client
+in a ``Server-Timing`` header, kept in a rolling in-memory aggregate
+per endpoint and, if redis is available, in hourly aggregates which
+can be inspected using ``indico profile report``.
+"""
+
+from __future__ import absolute_import, division
+
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy.engine import Engine
+from sqlalchemy.event import listens_for
+
+from indico.core.config import Config
+
+#: The metrics which are aggregated per endpoint
+METRICS = ('duration', 'sql_count', 'sql_time', 'memoize_hits', 'memoize_misses', 'cache_gets', 'cache_hits',
+           'cache_sets', 'fossilize_time', 'template_time')
+#: How many requests are kept per endpoint in the in-memory aggregate
+ROLLING_WINDOW = 500
+#: How long the hourly aggregates are kept in redis
+REDIS_TTL = timedelta(days=7)
+
+_endpoint_stats = defaultdict(lambda: deque(maxlen=ROLLING_WINDOW))
+_applied = False
+
+
+class RequestStats(object):
+    """Performance statistics of a single request."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.end_time = None
+        self.template_start_time = None
+        self.slow_queries = []
+        self._nesting = defaultdict(int)
+        for metric in METRICS[1:]:
+            setattr(self, metric, 0)
+
+    @property
+    def duration(self):
+        return (self.end_time or time.time()) - self.start_time
+
+    def to_dict(self):
+        return {metric: getattr(self, metric) for metric in METRICS}
+
+    def get_server_timing(self):
+        """Get the value for a ``Server-Timing`` header."""
+        def _ms(seconds):
+            return '{:.1f}'.format(seconds * 1000)
+
+        return ', '.join([
+            'sql;dur={};desc="{} queries"'.format(_ms(self.sql_time), self.sql_count),
+            'fossilize;dur={}'.format(_ms(self.fossilize_time)),
+            'template;dur={}'.format(_ms(self.template_time)),
+            'memoize;desc="{} hits, {} misses"'.format(self.memoize_hits, self.memoize_misses),
+            'cache;desc="{} gets, {} hits, {} sets"'.format(self.cache_gets, self.cache_hits, self.cache_sets),
+            'total;dur={}'.format(_ms(self.duration))
+        ])
+
+
+def get_request_stats():
+    """Get the statistics of the current request.
+
+    :return: A :class:`RequestStats` object or ``None`` if the current
+             request is not instrumented.
+    """
+    if not has_request_context():
+        return None
+    return g.get('request_stats')
+
+
+def count_request_stat(metric, value=1):
+    """Increment a counter of the current request (if instrumented)."""
+    stats = get_request_stats()
+    if stats is not None:
+        setattr(stats, metric, getattr(stats, metric) + value)
+
+
+@contextmanager
+def measure_request_stat(metric):
+    """Add the time spent in the block to a metric of the current request.
+
+    Nested blocks measuring the same metric are only counted once.
+    """
+    stats = get_request_stats()
+    if stats is None:
+        yield
+        return
+    stats._nesting[metric] += 1
+    start = time.time()
+    try:
+        yield
+    finally:
+        stats._nesting[metric] -= 1
+        if not stats._nesting[metric]:
+            setattr(stats, metric, getattr(stats, metric) + time.time() - start)
+
+
+def get_endpoint_stats():
+    """Get the rolling aggregate of the requests handled by this process.
+
+    :return: A dict mapping endpoint names to dicts containing the
+             number of requests and the average of each metric.
+    """
+    rv = {}
+    for endpoint, samples in _endpoint_stats.items():
+        samples = list(samples)
+        if not samples:
+            continue
+        data = {metric: sum(sample[metric] for sample in samples) / len(samples) for metric in METRICS}
+        data['count'] = len(samples)
+        rv[endpoint] = data
+    return rv
+
+
+def _get_redis_key(dt):
+    return 'request-stats:{}'.format(dt.strftime('%Y%m%d%H'))
+
+
+def get_stored_endpoint_stats(hours=24):
+    """Get the aggregated statistics of all processes from redis.
+
+    :param hours: The number of past hours to include.
+    :return: A dict mapping endpoint names to dicts containing the
+             number of requests and the total of each metric.
+    """
+    from indico.util.redis import client as redis_client
+    now = datetime.now()
+    keys = [_get_redis_key(now - timedelta(hours=i)) for i in xrange(hours)]
+    with redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        results = pipe.execute()
+    rv = defaultdict(lambda: dict.fromkeys(('count',) + METRICS, 0))
+    for data in results:
+        for field, value in data.iteritems():
+            endpoint, metric = field.rsplit(':', 1)
+            rv[endpoint][metric] += float(value)
+    return dict(rv)
+
+
+def _store_request_stats(endpoint, stats):
+    data = stats.to_dict()
+    _endpoint_stats[endpoint].append(data)
+    from indico.util.redis import RedisError, client as redis_client
+    if not redis_client:
+        return
+    key = _get_redis_key(datetime.now())
+    try:
+        with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(key, '{}:count'.format(endpoint), 1)
+            for metric, value in data.iteritems():
+                pipe.hincrbyfloat(key, '{}:{}'.format(endpoint, metric), value)
+            pipe.expire(key, int(REDIS_TTL.total_seconds()))
+            pipe.execute()
+    except RedisError:
+        from indico.core.logger import Logger
+        Logger.get('profile').exception('Could not store request stats')
+
+
+def _log_slow_queries(stats):
+    from indico.core.logger import Logger
+    logger = Logger.get('profile')
+    for duration, statement, source in stats.slow_queries:
+        location = '{0[file]}:{0[line]} {0[function]}'.format(source) if source else 'unknown location'
+        logger.warning('Slow query (%.3fs) in %s %s at %s:\n%s', duration, request.method, request.relative_url,
+                       location, statement)
+
+
+def apply_request_stats(app):
+    """Set up the instrumentation of requests if profiling is enabled."""
+    global _applied
+    cfg = Config.getInstance()
+    if not cfg.getProfile() or _applied:
+        return
+    _applied = True
+    sample_rate = cfg.getProfileSampleRate()
+    slow_query_threshold = cfg.getProfileSlowQueryThreshold()
+    # avoid a circular import
+    from indico.core.db.sqlalchemy.logging import get_sql_source
+    # the listener below would otherwise be reported as the source of every query
+    ignored_files = {apply_request_stats.__code__.co_filename}
+
+    @listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if get_request_stats() is not None:
+            context._request_stats_start_time = time.time()
+
+    @listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = get_request_stats()
+        start_time = getattr(context, '_request_stats_start_time', None)
+        if stats is None or start_time is None:
+            return
+        duration = time.time() - start_time
+        stats.sql_count += 1
+        stats.sql_time += duration
+        if duration >= slow_query_threshold:
+            stats.slow_queries.append((duration, statement, get_sql_source(ignored_files)))
+
+    @before_render_template.connect_via(app)
+    def _before_render_template(sender, **kwargs):
+        stats = get_request_stats()
+        if stats is not None:
+            stats._nesting['template_time'] += 1
+            if stats._nesting['template_time'] == 1:
+                stats.template_start_time = time.time()
+
+    @template_rendered.connect_via(app)
+    def _template_rendered(sender, **kwargs):
+        stats = get_request_stats()
+        if stats is not None and stats._nesting['template_time']:
+            stats._nesting['template_time'] -= 1
+            if not stats._nesting['template_time']:
+                stats.template_time += time.time() - stats.template_start_time
+
+    @app.before_request
+    def _start_request_stats():
+        if random.random() < sample_rate:
+            g.request_stats = RequestStats()
+
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = get_request_stats()
+        if stats is None:
+            return response
+        stats.end_time = time.time()
+        response.headers['Server-Timing'] = stats.get_server_timing()
+        _store_request_stats(request.endpoint or 'unknown', stats)
+        _log_slow_queries(stats)
+        return response
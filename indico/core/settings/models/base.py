@@ -16,15 +16,29 @@
 
 from __future__ import unicode_literals
 
+import uuid
 from collections import defaultdict
+from copy import deepcopy
 
 from enum import Enum
-from flask import has_request_context, g
+from flask import current_app, g, has_app_context, has_request_context
 from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.event import listens_for
+from sqlalchemy.orm import Session
 
 from indico.core.db import db
 from indico.core.db.sqlalchemy.principals import PrincipalMixin, PrincipalType
+from indico.util.caching import LRUCache
 from indico.util.decorators import strict_classproperty
+from MaKaC.common.cache import GenericCache
+
+
+#: The settings loaded by this process, shared by all requests.  Each
+#: entry contains the settings of all modules in a settings table for
+#: some extra key values (e.g. an event) and the version of the
+#: settings they were loaded for.
+_process_cache = LRUCache(1000)
+_version_cache = GenericCache('settings')
 
 
 def _coerce_value(value):
@@ -33,6 +47,66 @@ def _coerce_value(value):
     return value
 
 
+def _get_settings_version():
+    """Get the current version of the settings.
+
+    The version is stored in the shared cache and replaced whenever
+    settings are changed, which invalidates the settings cached by all
+    processes.
+
+    :return: The version or ``None`` if there is no cache backend to
+             store it in, in which case settings are only cached
+             within a request.
+    """
+    if has_app_context() and current_app.config['TESTING']:
+        return None
+    if has_request_context() and 'settings_version' in g:
+        return g.settings_version
+    version = _version_cache.get('version')
+    if version is None:
+        # no version yet or it has been evicted from the cache
+        _bump_settings_version()
+        version = _version_cache.get('version')
+    if has_request_context():
+        g.settings_version = version
+    return version
+
+
+def _bump_settings_version():
+    _version_cache.set('version', uuid.uuid4().hex)
+    if has_request_context():
+        g.pop('settings_version', None)
+
+
+def _has_uncommitted_changes():
+    return db.session().info.get('settings_changed', False)
+
+
+def _settings_changed():
+    # The version is only bumped after the commit; otherwise another
+    # process could cache the old settings with the new version.
+    db.session().info['settings_changed'] = True
+
+
+@listens_for(Session, 'after_commit')
+def _settings_committed(session):
+    # This is triggered by the actual commit of the session, no matter
+    # if it's committed by the zope transaction (in a request) or
+    # directly (e.g. in a celery task).  Savepoints are not relevant
+    # since their changes are not visible to other processes yet.
+    if session.transaction.nested:
+        return
+    if session.info.pop('settings_changed', False):
+        _bump_settings_version()
+
+
+@listens_for(Session, 'after_transaction_end')
+def _settings_transaction_ended(session, transaction):
+    # Changes which have been rolled back do not need a new version
+    if transaction.parent is None:
+        session.info.pop('settings_changed', None)
+
+
 class SettingsBase(object):
     """Base class for any kind of setting tables"""
 
@@ -88,10 +162,37 @@ class SettingsBase(object):
             # no cache for this settings class / kwargs
             return g.global_settings_cache.setdefault(key, defaultdict(dict)), False
 
+    @classmethod
+    def _load_all(cls, kwargs):
+        """Load the settings of all modules.
+
+        The settings are taken from the process-wide cache if they have
+        been loaded there for the current version of the settings.  They
+        may be shared with other requests, so they must never be
+        modified.
+
+        :return: A dict mapping module names to dicts containing the
+                 settings of the module.
+        """
+        # uncommitted changes must neither be cached nor hidden by the cache
+        version = None if _has_uncommitted_changes() else _get_settings_version()
+        key = (cls, frozenset(kwargs.viewitems()))
+        entry = _process_cache.get(key) if version is not None else None
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        settings = defaultdict(dict)
+        for s in cls.find(**kwargs):
+            settings[s.module][s.name] = s.value
+        settings = dict(settings)
+        if version is not None:
+            _process_cache.set(key, (version, settings))
+        return settings
+
     @staticmethod
     def _clear_cache():
         if has_request_context():
             g.pop('global_settings_cache', None)
+        _settings_changed()
 
 
 class JSONSettingsBase(SettingsBase):
@@ -115,12 +216,10 @@ class JSONSettingsBase(SettingsBase):
     @classmethod
     def get_all(cls, module, **kwargs):
         cache, hit = cls._get_cache(kwargs)
-        if hit:
-            return cache[module]
-        else:
-            for s in cls.find(**kwargs):
-                cache[s.module][s.name] = s.value
-            return cache[module]
+        if not hit:
+            cache.update(cls._load_all(kwargs))
+        # the cached settings may be shared with other requests
+        return deepcopy(cache[module])
 
     @classmethod
     def get(cls, module, name, default=None, **kwargs):
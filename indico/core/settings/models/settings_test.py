@@ -17,7 +17,9 @@
 import pytest
 from enum import Enum
 
+from indico.core.settings.models import base
 from indico.core.settings.models.settings import Setting
+from indico.util.caching import LRUCache
 
 
 @pytest.mark.usefixtures('db')
@@ -32,3 +34,74 @@ def test_set_enum():
         assert value == Useless.thing
         assert value == Useless.thing.value
         assert not isinstance(value, Useless)  # we store it as a plain value!
+
+
+@pytest.fixture
+def process_cache(app, monkeypatch):
+    versions = {}
+
+    class MockVersionCache(object):
+        def get(self, key):
+            return versions.get(key)
+
+        def set(self, key, value):
+            versions[key] = value
+
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    monkeypatch.setattr(base, '_version_cache', MockVersionCache())
+    monkeypatch.setattr(base, '_process_cache', LRUCache(10))
+    return base._process_cache
+
+
+@pytest.mark.usefixtures('process_cache')
+def test_process_cache(db, count_queries):
+    db.session.add(Setting(module='foo', name='bar', value=['a']))
+    db.session.flush()
+    with count_queries() as cnt:
+        assert Setting.get_all('foo') == {'bar': ['a']}
+    assert cnt() == 1
+    with count_queries() as cnt:
+        settings = Setting.get_all('foo')
+        assert settings == {'bar': ['a']}
+    assert cnt() == 0
+    # modifying the returned settings must not affect the cache
+    settings['bar'].append('b')
+    assert Setting.get_all('foo') == {'bar': ['a']}
+    # a new version invalidates the cache
+    base._bump_settings_version()
+    with count_queries() as cnt:
+        assert Setting.get_all('foo') == {'bar': ['a']}
+    assert cnt() == 1
+    # uncommitted changes are never cached
+    Setting.set('foo', 'bar', ['c'])
+    with count_queries() as cnt:
+        assert Setting.get_all('foo') == {'bar': ['c']}
+        assert Setting.get_all('foo') == {'bar': ['c']}
+    assert cnt() == 2
+
+
+@pytest.mark.usefixtures('process_cache')
+def test_settings_version_commit(db):
+    version = base._get_settings_version()
+    Setting.set('foo', 'bar', 'test')
+    assert base._has_uncommitted_changes()
+    assert base._get_settings_version() == version
+    # the db fixture replaces `db.session.commit`, so we need to commit
+    # the actual session (as done outside a request, e.g. in a task)
+    db.session().commit()
+    try:
+        assert not base._has_uncommitted_changes()
+        assert base._get_settings_version() != version
+    finally:
+        Setting.delete('foo', 'bar')
+        db.session().commit()
+
+
+@pytest.mark.usefixtures('process_cache')
+def test_settings_version_rollback(db):
+    version = base._get_settings_version()
+    Setting.set('foo', 'bar', 'test')
+    assert base._has_uncommitted_changes()
+    db.session.rollback()
+    assert not base._has_uncommitted_changes()
+    assert base._get_settings_version() == version
@@ -79,5 +79,8 @@ def get_setting_acl(cls, proxy, name, cache, **kwargs):
     try:
         return cache[cache_key]
     except KeyError:
-        cache[cache_key] = acl = cls.get_acl(proxy.module, name, **kwargs)
-        return acl
+        # load all acls of the module at once since it's likely that more than one is needed
+        acls = cls.get_all_acls(proxy.module, **kwargs)
+        for acl_name in proxy.acl_names:
+            cache[_get_cache_key(proxy, acl_name, kwargs)] = acls.get(acl_name, set())
+        return cache[cache_key]
@@ -16,6 +16,8 @@
 
 from __future__ import unicode_literals
 
+import errno
+import hashlib
 import os
 import sys
 from contextlib import contextmanager
@@ -29,7 +31,7 @@ from indico.core import signals
 from indico.core.config import Config
 from indico.util.signals import named_objects_from_signal
 from indico.util.string import return_ascii
-from indico.web.flask.util import send_file
+from indico.web.flask.util import send_file, XAccelMiddleware
 
 
 def get_storage(backend_name):
@@ -157,6 +159,25 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def copy(self, file_id, name, content_type, filename):
+        """Creates a copy of a file in the storage.
+
+        The default implementation simply saves the content of the
+        file again, but backends may override it with a cheaper way to
+        copy files.
+
+        :param file_id: The ID of the file within the storage backend.
+        :param name: A unique name for the new file.  See :meth:`save`
+                     for details.
+        :param content_type: The content-type of the file (may or may
+                             not be used depending on the backend).
+        :param filename: The original filename of the file (may or may
+                         not be used depending on the backend).
+        :return: unicode -- A unique identifier for the new file.
+        """
+        with self.open(file_id) as fd:
+            return self.save(name, content_type, filename, fd)
+
     def delete(self, file_id):  # pragma: no cover
         """Deletes a file from the storage.
 
@@ -171,7 +192,7 @@ class Storage(object):
         """
         raise NotImplementedError
 
-    def send_file(self, file_id, content_type, filename, inline=True):  # pragma: no cover
+    def send_file(self, file_id, content_type, filename, inline=True, etag=None, last_modified=None):
         """Sends the file to the client.
 
         This returns a flask response that will eventually result in
@@ -179,6 +200,12 @@ class Storage(object):
         browser).  Depending on the storage backend it may actually
         send a redirect to an external URL where the file is available.
 
+        The default implementation streams the file returned by
+        :meth:`open` in chunks.  Backends storing files on the local
+        file system should send the path of the file instead so the
+        transfer can be offloaded to the web server if X-Sendfile or
+        X-Accel-Redirect is enabled.
+
         :param file_id: The ID of the file within the storage backend.
         :param content_type: The content-type of the file (may or may
                              not be used depending on the backend)
@@ -189,8 +216,16 @@ class Storage(object):
                        downloaded. Typically this will set the
                        Content-Disposition header. Depending on the
                        backend, this argument could be ignored.
+        :param etag: A strong ETag for the file which is used to
+                     answer conditional and range requests.
+        :param last_modified: The datetime when the file was last
+                              modified, used like `etag`.
         """
-        raise NotImplementedError
+        try:
+            return send_file(filename, self.open(file_id), content_type, inline=inline, etag=etag,
+                             last_modified=last_modified)
+        except Exception as e:
+            raise StorageError('Could not send "{}": {}'.format(file_id, e)), None, sys.exc_info()[2]
 
     def __repr__(self):
         return '<{}()>'.format(type(self).__name__)
@@ -202,6 +237,9 @@ class ReadOnlyStorageMixin(object):
     def save(self, name, content_type, filename, fileobj):
         raise StorageError('Cannot write to read-only storage')
 
+    def copy(self, file_id, name, content_type, filename):
+        raise StorageError('Cannot write to read-only storage')
+
     def delete(self, file_id):
         raise StorageError('Cannot delete from read-only storage')
 
@@ -256,9 +294,10 @@ class FileSystemStorage(Storage):
         except Exception as e:
             raise StorageError('Could not get size of "{}": {}'.format(file_id, e)), None, sys.exc_info()[2]
 
-    def send_file(self, file_id, content_type, filename, inline=True):
+    def send_file(self, file_id, content_type, filename, inline=True, etag=None, last_modified=None):
         try:
-            return send_file(filename, self._resolve_path(file_id).encode('utf-8'), content_type, inline=inline)
+            return send_file(filename, self._resolve_path(file_id).encode('utf-8'), content_type, inline=inline,
+                             etag=etag, last_modified=last_modified)
         except Exception as e:
             raise StorageError('Could not send "{}": {}'.format(file_id, e)), None, sys.exc_info()[2]
 
@@ -267,6 +306,130 @@ class FileSystemStorage(Storage):
         return '<FileSystemStorage: {}>'.format(self.path)
 
 
+class HashedFileSystemStorage(FileSystemStorage):
+    """File system storage which stores identical files only once.
+
+    The content of each file is stored in a blob named after its
+    SHA-256 hash and the path of the file is a hard link to that blob.
+    Saving a file whose content is already in the storage or copying
+    a file thus only creates a new link, and the link count of the
+    blob serves as its reference count.
+    """
+
+    name = 'fs-hashed'
+    simple_data = True
+    #: The folder (relative to the storage root) containing the blobs
+    blob_dir = '.blobs'
+
+    def _get_blob_path(self, checksum):
+        return os.path.join(self.path, self.blob_dir, checksum[:2], checksum[2:4], checksum)
+
+    def _makedirs(self, path):
+        try:
+            os.makedirs(path)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+    def _prepare_path(self, name):
+        filepath = self._resolve_path(name)
+        if os.path.exists(filepath):
+            raise ValueError('A file with this name already exists')
+        self._makedirs(os.path.dirname(filepath))
+        return filepath
+
+    def _write_temp_file(self, fileobj):
+        """Write the data to a temporary file and calculate its checksum"""
+        tmpdir = os.path.join(self.path, self.blob_dir)
+        self._makedirs(tmpdir)
+        checksum = hashlib.sha256()
+        with NamedTemporaryFile(dir=tmpdir, prefix='tmp', delete=False) as f:
+            for chunk in iter(lambda: fileobj.read(1024 * 1024), b''):
+                checksum.update(chunk)
+                f.write(chunk)
+        os.chmod(f.name, 0o644)
+        return f.name, checksum.hexdigest()
+
+    def _link_blob(self, tmp_path, blob_path, filepath):
+        while True:
+            try:
+                os.link(blob_path, filepath)
+                return
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    raise
+            # there is no blob with this content yet (or it has just been
+            # removed), so the new file becomes the blob.  if another process
+            # has stored the same content in the meantime we simply use it
+            self._makedirs(os.path.dirname(blob_path))
+            try:
+                os.link(tmp_path, blob_path)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+
+    def _get_checksum(self, filepath):
+        checksum = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
+    def save(self, name, content_type, filename, fileobj):
+        try:
+            fileobj = self._ensure_fileobj(fileobj)
+            filepath = self._prepare_path(name)
+            tmp_path, checksum = self._write_temp_file(fileobj)
+            try:
+                self._link_blob(tmp_path, self._get_blob_path(checksum), filepath)
+            finally:
+                os.remove(tmp_path)
+            return name
+        except Exception as e:
+            raise StorageError('Could not save "{}": {}'.format(name, e)), None, sys.exc_info()[2]
+
+    def copy(self, file_id, name, content_type, filename):
+        try:
+            os.link(self._resolve_path(file_id), self._prepare_path(name))
+            return name
+        except Exception as e:
+            raise StorageError('Could not copy "{}" to "{}": {}'.format(file_id, name, e)), None, sys.exc_info()[2]
+
+    def delete(self, file_id):
+        try:
+            filepath = self._resolve_path(file_id)
+            stat = os.stat(filepath)
+            # if only the blob is left after deleting the file, it is
+            # not needed anymore
+            checksum = self._get_checksum(filepath) if stat.st_nlink == 2 else None
+            os.remove(filepath)
+            if checksum is None:
+                return
+            blob_path = self._get_blob_path(checksum)
+            blob_stat = os.stat(blob_path)
+            if blob_stat.st_ino == stat.st_ino and blob_stat.st_nlink == 1:
+                os.remove(blob_path)
+        except Exception as e:
+            raise StorageError('Could not delete "{}": {}'.format(file_id, e)), None, sys.exc_info()[2]
+
+    def verify(self, file_id):
+        """Checks whether a file's content still matches its blob.
+
+        :param file_id: The ID of the file within the storage backend.
+        :return: bool -- ``True`` if the file is intact.
+        """
+        try:
+            filepath = self._resolve_path(file_id)
+            blob_path = self._get_blob_path(self._get_checksum(filepath))
+            return os.path.exists(blob_path) and os.path.samefile(filepath, blob_path)
+        except Exception as e:
+            raise StorageError('Could not verify "{}": {}'.format(file_id, e)), None, sys.exc_info()[2]
+
+    @return_ascii
+    def __repr__(self):
+        return '<HashedFileSystemStorage: {}>'.format(self.path)
+
+
 class ReadOnlyFileSystemStorage(ReadOnlyStorageMixin, FileSystemStorage):
     name = 'fs-readonly'
 
@@ -278,6 +441,7 @@ class ReadOnlyFileSystemStorage(ReadOnlyStorageMixin, FileSystemStorage):
 @signals.get_storage_backends.connect
 def _get_storage_backends(sender, **kwargs):
     yield FileSystemStorage
+    yield HashedFileSystemStorage
     yield ReadOnlyFileSystemStorage
 
 
@@ -285,3 +449,19 @@ def _get_storage_backends(sender, **kwargs):
 def _check_storage_backends(app, **kwargs):
     # This will raise RuntimeError if the backend names are not unique
     get_storage_backends()
+    _check_x_accel_mapping(app)
+
+
+def _check_x_accel_mapping(app):
+    # Files from file system storages are sent using X-Accel-Redirect, so
+    # a storage whose files are not mapped to an internal nginx location
+    # would only fail once someone tries to download a file from it
+    mapping = app.config.get('X_ACCEL_MAPPING')
+    if not mapping:
+        return
+    middleware = XAccelMiddleware(None, mapping)
+    for backend_name in Config.getInstance().getStorageBackends():
+        storage = get_storage(backend_name)
+        if isinstance(storage, FileSystemStorage) and not middleware.make_x_accel_header(os.path.join(storage.path, '')):
+            raise ValueError('StaticFileMethod contains no mapping for storage backend {} ({})'
+                             .format(backend_name, storage.path))
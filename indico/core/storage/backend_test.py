@@ -16,12 +16,16 @@
 
 from __future__ import unicode_literals
 
+from datetime import datetime
 from io import BytesIO
 import os
 
 import pytest
+import pytz
 
-from indico.core.storage import Storage, FileSystemStorage, StorageError, ReadOnlyFileSystemStorage
+from indico.core.storage import (Storage, FileSystemStorage, StorageError, HashedFileSystemStorage,
+                                 ReadOnlyFileSystemStorage, StoredFileMixin)
+from indico.web.flask.util import send_file
 
 
 @pytest.fixture
@@ -166,3 +170,157 @@ def test_storage_get_local_path(fs_storage):
         with open(path, 'rb') as fd:
             assert fd.read() == b'hello world'
     assert not os.path.exists(path)
+
+
+@pytest.fixture
+def hashed_fs_storage(tmpdir):
+    return HashedFileSystemStorage(tmpdir.strpath)
+
+
+def _get_blobs(storage):
+    blob_dir = os.path.join(storage.path, storage.blob_dir)
+    return [os.path.join(path, name)
+            for path, dirs, files in os.walk(blob_dir)
+            for name in files]
+
+
+def test_hashed_fs_dedup(hashed_fs_storage):
+    f1 = hashed_fs_storage.save('foo/test.txt', 'unused/unused', 'unused', b'hello world')
+    f2 = hashed_fs_storage.save('bar/test.txt', 'unused/unused', 'unused', BytesIO(b'hello world'))
+    f3 = hashed_fs_storage.save('test.txt', 'unused/unused', 'unused', b'hello test')
+    assert f1 == 'foo/test.txt'
+    assert hashed_fs_storage.open(f1).read() == b'hello world'
+    assert hashed_fs_storage.open(f2).read() == b'hello world'
+    assert hashed_fs_storage.open(f3).read() == b'hello test'
+    assert os.path.samefile(hashed_fs_storage._resolve_path(f1), hashed_fs_storage._resolve_path(f2))
+    assert len(_get_blobs(hashed_fs_storage)) == 2
+    assert hashed_fs_storage.verify(f1)
+    assert hashed_fs_storage.verify(f3)
+
+
+def test_hashed_fs_copy(hashed_fs_storage):
+    f1 = hashed_fs_storage.save('test.txt', 'unused/unused', 'unused', b'hello world')
+    f2 = hashed_fs_storage.copy(f1, 'copy/test.txt', 'unused/unused', 'unused')
+    assert f2 == 'copy/test.txt'
+    assert hashed_fs_storage.open(f2).read() == b'hello world'
+    assert os.path.samefile(hashed_fs_storage._resolve_path(f1), hashed_fs_storage._resolve_path(f2))
+    with pytest.raises(StorageError) as exc_info:
+        hashed_fs_storage.copy(f1, f2, 'unused/unused', 'unused')
+    assert 'already exists' in unicode(exc_info.value)
+
+
+def test_hashed_fs_delete(hashed_fs_storage):
+    f1 = hashed_fs_storage.save('test.txt', 'unused/unused', 'unused', b'hello world')
+    f2 = hashed_fs_storage.save('test2.txt', 'unused/unused', 'unused', b'hello world')
+    hashed_fs_storage.delete(f1)
+    with pytest.raises(StorageError):
+        hashed_fs_storage.open(f1)
+    # the content is still referenced by the other file
+    assert hashed_fs_storage.open(f2).read() == b'hello world'
+    assert len(_get_blobs(hashed_fs_storage)) == 1
+    hashed_fs_storage.delete(f2)
+    assert not _get_blobs(hashed_fs_storage)
+    # the content can be stored again after its blob has been removed
+    f3 = hashed_fs_storage.save('test3.txt', 'unused/unused', 'unused', b'hello world')
+    assert hashed_fs_storage.open(f3).read() == b'hello world'
+    assert hashed_fs_storage.verify(f3)
+
+
+def test_storage_copy(fs_storage):
+    f1 = fs_storage.save('test.txt', 'unused/unused', 'unused', b'hello world')
+    f2 = fs_storage.copy(f1, 'copy.txt', 'unused/unused', 'unused')
+    assert fs_storage.open(f2).read() == b'hello world'
+    assert not os.path.samefile(fs_storage._resolve_path(f1), fs_storage._resolve_path(f2))
+
+
+@pytest.mark.usefixtures('request_context')
+def test_storage_send_file(fs_storage):
+    class CustomStorage(FileSystemStorage):
+        def open(self, file_id):
+            return BytesIO(FileSystemStorage.open(self, file_id).read())
+
+        def send_file(self, file_id, content_type, filename, inline=True):
+            return Storage.send_file(self, file_id, content_type, filename, inline=inline)
+
+    storage = CustomStorage(fs_storage.path)
+    f = storage.save('test.txt', 'unused/unused', 'unused', b'hello world')
+    response = storage.send_file(f, 'text/plain', 'filename.txt')
+    assert 'text/plain' in response.headers['Content-type']
+    assert 'filename.txt' in response.headers['Content-disposition']
+    assert ''.join(response.response) == 'hello world'
+    with pytest.raises(StorageError) as exc_info:
+        storage.send_file('xxx', 'text/plain', 'filename.txt')
+    assert 'Could not send' in unicode(exc_info.value)
+
+
+@pytest.mark.parametrize(('headers', 'status', 'body', 'content_range'), (
+    ({}, 200, b'hello world', None),
+    ({'Range': 'bytes=6-'}, 206, b'world', 'bytes 6-10/11'),
+    ({'Range': 'bytes=0-4'}, 206, b'hello', 'bytes 0-4/11'),
+    ({'Range': 'bytes=-3'}, 206, b'rld', 'bytes 8-10/11'),
+    ({'Range': 'bytes=20-'}, 416, b'', 'bytes */11'),
+    ({'Range': 'bytes=0-1,3-4'}, 200, b'hello world', None),
+    ({'Range': 'bytes=6-', 'If-Range': '"foo"'}, 206, b'world', 'bytes 6-10/11'),
+    ({'Range': 'bytes=6-', 'If-Range': '"bar"'}, 200, b'hello world', None),
+    ({'If-None-Match': '"foo"'}, 304, b'', None),
+    ({'If-None-Match': '"bar"'}, 200, b'hello world', None),
+))
+def test_fs_send_file_range(app, fs_storage, headers, status, body, content_range):
+    f = fs_storage.save('test.txt', 'unused/unused', 'unused', b'hello world')
+    with app.test_request_context(headers=headers):
+        response = fs_storage.send_file(f, 'text/plain', 'filename.txt', etag='foo')
+        assert response.status_code == status
+        assert response.headers.get('Content-Range') == content_range
+        assert response.headers['ETag'] == '"foo"'
+        if status != 304:
+            assert response.headers['Accept-Ranges'] == 'bytes'
+        assert b''.join(response.response) == body
+
+
+@pytest.mark.parametrize(('headers', 'status'), (
+    ({'Range': 'bytes=6-'}, 206),
+    ({'Range': 'bytes=20-'}, 416),
+    ({'If-None-Match': '"foo"'}, 304),
+))
+def test_send_file_closed(app, tmpdir, headers, status):
+    path = tmpdir.join('test.txt')
+    path.write(b'hello world')
+    fd = path.open('rb')
+    with app.test_request_context(headers=headers):
+        response = send_file('test.txt', fd, 'text/plain', etag='foo')
+        assert response.status_code == status
+        response.close()
+    assert fd.closed
+
+
+@pytest.mark.parametrize('last_modified', (
+    datetime(2016, 1, 1, 12, tzinfo=pytz.utc),
+    datetime(2016, 1, 1, 12),
+))
+def test_send_file_last_modified(app, tmpdir, last_modified):
+    path = tmpdir.join('test.txt')
+    path.write(b'hello world')
+    with app.test_request_context():
+        response = send_file('test.txt', path.strpath, 'text/plain', last_modified=last_modified, etag='foo')
+        assert response.status_code == 200
+        if last_modified.tzinfo is not None:
+            assert response.headers['Last-Modified'] == 'Fri, 01 Jan 2016 12:00:00 GMT'
+    with app.test_request_context(headers={'If-None-Match': '"foo"'}):
+        response = send_file('test.txt', path.strpath, 'text/plain', last_modified=last_modified, etag='foo')
+        assert response.status_code == 304
+
+
+def test_stored_file_send(app, fs_storage):
+    class DummyFile(object):
+        storage = fs_storage
+        storage_file_id = fs_storage.save('test.txt', 'unused/unused', 'unused', b'hello world')
+        content_type = 'text/plain'
+        filename = 'filename.txt'
+        etag = 'foo'
+        created_dt = datetime(2016, 1, 1, 12, tzinfo=pytz.utc)
+
+    with app.test_request_context():
+        response = StoredFileMixin.send.__func__(DummyFile())
+        assert response.status_code == 200
+        assert response.headers['ETag'] == '"foo"'
+        assert response.headers['Last-Modified'] == 'Fri, 01 Jan 2016 12:00:00 GMT'
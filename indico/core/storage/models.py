@@ -28,6 +28,8 @@ specifying, among others, which storage backend to use.
 
 from __future__ import unicode_literals
 
+import hashlib
+
 from sqlalchemy.event import listen
 from sqlalchemy.ext.declarative import declared_attr
 
@@ -167,6 +169,17 @@ class StoredFileMixin(object):
             raise RuntimeError('No storage backend set')
         return get_storage(self.storage_backend)
 
+    @property
+    def etag(self):
+        """A strong ETag identifying the content of the stored file.
+
+        Since a stored file is never modified, the storage location,
+        size and upload time are enough to identify its content.
+        """
+        data = '{}:{}:{}:{}'.format(self.storage_backend, self.storage_file_id, self.size,
+                                    self.created_dt.isoformat() if self.created_dt else '')
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
     def get_local_path(self):
         """Return context manager that will yield physical path.
            This should be avoided in favour of using the actual file contents"""
@@ -195,6 +208,26 @@ class StoredFileMixin(object):
         self.storage_file_id = self.storage.save(path, self.content_type, self.filename, data)
         self.size = self.storage.getsize(self.storage_file_id)
 
+    def copy_from(self, other):
+        """Saves a copy of another stored file in the file storage.
+
+        Unlike saving the content of the other file, this lets the
+        storage backend copy the file without reading it, e.g. by
+        only adding a reference to the same content.
+
+        :param other: An object using :class:`StoredFileMixin`
+        """
+        assert self.storage_backend is None and self.storage_file_id is None and self.size is None
+        if self.version_of:
+            assert getattr(self, self.version_of) is not None
+        self.storage_backend, path = self._build_storage_path()
+        if other.storage_backend == self.storage_backend:
+            self.storage_file_id = self.storage.copy(other.storage_file_id, path, self.content_type, self.filename)
+        else:
+            with other.open() as fd:
+                self.storage_file_id = self.storage.save(path, self.content_type, self.filename, fd)
+        self.size = other.size
+
     def open(self):
         """Returns the stored file as a file-like object"""
         if self.storage_file_id is None:
@@ -205,4 +238,5 @@ class StoredFileMixin(object):
         """Sends the file to the user"""
         if self.storage_file_id is None:
             raise Exception('There is no file to send')
-        return self.storage.send_file(self.storage_file_id, self.content_type, self.filename, inline=inline)
+        return self.storage.send_file(self.storage_file_id, self.content_type, self.filename, inline=inline,
+                                      etag=self.etag, last_modified=self.created_dt)
@@ -90,5 +90,4 @@ class AttachmentCloner(EventCloner):
                 old_file = old_attachment.file
                 attachment.file = AttachmentFile(attachment=attachment, user=old_file.user, filename=old_file.filename,
                                                  content_type=old_file.content_type)
-                with old_file.open() as fd:
-                    attachment.file.save(fd)
+                attachment.file.copy_from(old_file)
@@ -19,21 +19,17 @@ from __future__ import unicode_literals
 import os
 from collections import OrderedDict
 from datetime import timedelta
-from tempfile import NamedTemporaryFile
-from zipfile import ZipFile
 
 from flask import session, flash
 from markupsafe import escape
 from sqlalchemy import cast, Date
 
-from indico.core.config import Config
 from indico.core.db.sqlalchemy.links import LinkType
 from indico.util.date_time import format_date, format_time
 from indico.util.i18n import _
 from indico.util.fs import secure_filename
 from indico.util.string import natural_sort_key
-from indico.util.tasks import delete_file
-from indico.web.flask.util import send_file
+from indico.util.zipstream import get_stored_file_entry, send_zip
 from indico.web.forms.base import FormDefaults
 from indico.modules.attachments.forms import AttachmentPackageForm
 from indico.modules.attachments.models.attachments import Attachment, AttachmentFile, AttachmentType
@@ -157,21 +153,15 @@ class AttachmentPackageGeneratorMixin:
         return filter(_check_date, self._build_base_query())
 
     def _generate_zip_file(self, attachments):
-        temp_file = NamedTemporaryFile(suffix='indico.tmp', dir=Config.getInstance().getTempDir())
-        with ZipFile(temp_file.name, 'w', allowZip64=True) as zip_handler:
-            self.used = set()
-            for attachment in attachments:
-                name = self._prepare_folder_structure(attachment)
-                self.used.add(name)
-                with attachment.file.storage.get_local_path(attachment.file.storage_file_id) as filepath:
-                    zip_handler.write(filepath, name)
-
-        # Delete the temporary file after some time.  Even for a large file we don't
-        # need a higher delay since the webserver will keep it open anyway until it's
-        # done sending it to the client.
-        delete_file.apply_async(args=[temp_file.name], countdown=3600)
-        temp_file.delete = False
-        return send_file('material-{}.zip'.format(self.event_new.id), temp_file.name, 'application/zip', inline=False)
+        # the names are generated upfront so no database queries are needed
+        # while the archive is generated and sent to the client
+        self.used = set()
+        files = []
+        for attachment in attachments:
+            name = self._prepare_folder_structure(attachment)
+            self.used.add(name)
+            files.append(get_stored_file_entry(name, attachment.file))
+        return send_zip('material-{}.zip'.format(self.event_new.id), files)
 
     def _prepare_folder_structure(self, attachment):
         event_dir = secure_filename(self.event_new.title, None)
@@ -22,6 +22,7 @@ from indico.core.roles import check_roles, ManagementRole
 from indico.core.settings import SettingsProxy
 from indico.modules.categories.models.categories import Category
 from indico.modules.categories.models.legacy_mapping import LegacyCategoryMapping
+from indico.modules.categories.models.stats import CategoryStats
 from indico.util.i18n import _
 from indico.web.flask.util import url_for
 from indico.web.menu import SideMenuItem
@@ -46,6 +47,75 @@ def _merge_users(target, source, **kwargs):
     CategoryPrincipal.merge_users(target, source, 'category')
 
 
+@signals.event.created.connect
+@signals.event.deleted.connect
+@signals.event.data_changed.connect
+def _event_changed(event, **kwargs):
+    # `deleted` and `data_changed` are still sent with the legacy event
+    category = getattr(event, 'as_event', event).category
+    _invalidate_stats(category)
+    _invalidate_feeds(category)
+
+
+@signals.event.moved.connect
+def _event_moved(event, old_parent, **kwargs):
+    _invalidate_stats(old_parent)
+    _invalidate_stats(event.category)
+    _invalidate_feeds(old_parent)
+    _invalidate_feeds(event.category)
+
+
+@signals.event.timetable_entry_created.connect
+@signals.event.timetable_entry_deleted.connect
+@signals.event.contribution_deleted.connect
+@signals.event.subcontribution_deleted.connect
+@signals.event.session_deleted.connect
+@signals.attachments.folder_deleted.connect
+@signals.attachments.attachment_created.connect
+@signals.attachments.attachment_deleted.connect
+def _event_content_stats_changed(obj, **kwargs):
+    from indico.modules.attachments import Attachment
+    if isinstance(obj, Attachment):
+        obj = obj.folder
+    event = obj.event_new
+    if event is not None:
+        _invalidate_stats(event.category)
+
+
+@signals.event.times_changed.connect
+def _times_changed(sender, obj, entry=None, **kwargs):
+    # breaks have no direct link to their event, so we use their timetable entry
+    event = entry.event_new if entry is not None else obj
+    _invalidate_stats(event.category)
+
+
+@signals.category.moved.connect
+def _category_moved(category, old_parent, **kwargs):
+    _invalidate_stats(old_parent, own=False)
+    _invalidate_stats(category.parent, own=False)
+
+
+@signals.acl.protection_changed.connect
+@signals.acl.entry_changed.connect
+def _protection_changed(sender, obj, **kwargs):
+    from indico.modules.categories.util import invalidate_category_feeds
+    from indico.modules.events import Event
+    if isinstance(obj, Event):
+        invalidate_category_feeds(obj.category)
+    elif isinstance(obj, Category):
+        # the access to events anywhere inside the category may change
+        invalidate_category_feeds()
+
+
+def _invalidate_stats(category, own=True):
+    CategoryStats.invalidate(category, own=own)
+
+
+def _invalidate_feeds(category):
+    from indico.modules.categories.util import invalidate_category_feeds
+    invalidate_category_feeds(category)
+
+
 @signals.menu.items.connect_via('category-management-sidemenu')
 def _sidemenu_items(sender, category, **kwargs):
     yield SideMenuItem('content', _('Content'), url_for('categories.manage_content', category),
@@ -26,6 +26,7 @@ from MaKaC.webinterface.rh.base import RH
 
 class RHCategoryBase(RH):
     CSRF_ENABLED = True
+    USES_ZODB = False
 
     _category_query_options = ()
 
@@ -18,6 +18,7 @@ from __future__ import unicode_literals
 
 from datetime import datetime, timedelta, date
 from functools import partial
+from hashlib import sha1
 from io import BytesIO
 from itertools import chain, groupby, imap
 from math import ceil
@@ -26,10 +27,11 @@ from time import mktime
 
 import dateutil
 from dateutil.relativedelta import relativedelta
-from flask import jsonify, request, session, Response
+from flask import jsonify, request, session, stream_with_context, Response
 from pytz import utc
 from sqlalchemy.orm import joinedload, load_only, subqueryload, undefer, undefer_group
 from werkzeug.exceptions import BadRequest, NotFound
+from werkzeug.http import is_resource_modified
 
 from indico.core.db import db
 from indico.core.db.sqlalchemy.colors import ColorTuple
@@ -38,7 +40,7 @@ from indico.modules.categories.legacy import XMLCategorySerializer
 from indico.modules.categories.models.categories import Category
 from indico.modules.categories.serialize import (serialize_category_atom, serialize_category_ical,
                                                  serialize_category_chain, serialize_category)
-from indico.modules.categories.util import get_category_stats, get_upcoming_events
+from indico.modules.categories.util import get_category_feed_stamp, get_category_stats, get_upcoming_events
 from indico.modules.categories.views import WPCategory, WPCategoryStatistics
 from indico.modules.events.models.events import Event
 from indico.modules.events.timetable.util import get_category_timetable
@@ -170,6 +172,8 @@ class RHCategoryInfo(RHDisplayCategoryBase):
 
 
 class RHReachableCategoriesInfo(RH):
+    USES_ZODB = False
+
     def _get_reachable_categories(self, id_, excluded_ids):
         cat = Category.query.filter_by(id=id_).options(joinedload('children').load_only('id')).one()
         ids = {c.id for c in cat.children} | {c.id for c in cat.parent_chain_query}
@@ -185,6 +189,8 @@ class RHReachableCategoriesInfo(RH):
 
 
 class RHCategorySearch(RH):
+    USES_ZODB = False
+
     def _process(self):
         q = request.args['q'].lower()
         query = (Category.query
@@ -393,21 +399,57 @@ class RHShowPastEventsInCategory(RHDisplayCategoryBase):
         self._show_past_events(True)
 
 
-class RHExportCategoryICAL(RHDisplayCategoryBase):
+class RHCategoryFeedBase(RHDisplayCategoryBase):
+    """Base class for feeds which are polled regularly by clients.
+
+    The feeds support conditional requests based on the time when the
+    events of the category last changed, so unmodified feeds can be
+    answered without loading any events.  The time window of the feeds
+    only moves once per hour, so it is taken into account as well.
+    """
+
+    def _checkParams(self):
+        RHDisplayCategoryBase._checkParams(self)
+        now = now_utc()
+        self.window_start_dt = now.replace(minute=0, second=0, microsecond=0)
+        self.last_modified = max(get_category_feed_stamp(self.category), self.window_start_dt)
+        user_id = session.user.id if session.user else None
+        self.etag = sha1('{}-{}-{}'.format(self.category.id, user_id, self.last_modified.isoformat())).hexdigest()
+
+    def _send_feed(self, filename, mimetype, chunks):
+        # werkzeug compares it with the naive datetime from the request headers
+        last_modified = self.last_modified.replace(tzinfo=None)
+        if not is_resource_modified(request.environ, self.etag, last_modified=last_modified):
+            response = Response(status=304)
+        else:
+            response = Response(stream_with_context(chunks), mimetype=mimetype)
+            response.headers.add('Content-Disposition', 'inline', filename=filename)
+        response.set_etag(self.etag)
+        response.last_modified = last_modified
+        # clients need to check whether the feed changed on every request
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+
+class RHExportCategoryICAL(RHCategoryFeedBase):
     def _process(self):
         filename = '{}-category.ics'.format(secure_filename(self.category.title, str(self.category.id)))
-        buf = serialize_category_ical(self.category, session.user, Event.end_dt >= (now_utc() - timedelta(weeks=4)))
-        return send_file(filename, buf, 'text/calendar')
+        chunks = serialize_category_ical(self.category, session.user,
+                                         Event.end_dt >= (self.window_start_dt - timedelta(weeks=4)),
+                                         dtstamp=self.last_modified)
+        return self._send_feed(filename, 'text/calendar', chunks)
 
 
-class RHExportCategoryAtom(RHDisplayCategoryBase):
+class RHExportCategoryAtom(RHCategoryFeedBase):
     def _process(self):
         filename = '{}-category.atom'.format(secure_filename(self.category.title, str(self.category.id)))
-        buf = serialize_category_atom(self.category,
-                                      url_for(request.endpoint, self.category, _external=True),
-                                      session.user,
-                                      Event.end_dt >= now_utc())
-        return send_file(filename, buf, 'application/atom+xml')
+        chunks = serialize_category_atom(self.category,
+                                         url_for(request.endpoint, self.category, _external=True),
+                                         session.user,
+                                         Event.end_dt >= self.window_start_dt,
+                                         updated=self.last_modified)
+        return self._send_feed(filename, 'application/atom+xml', chunks)
 
 
 class RHXMLExportCategoryInfo(RH):
@@ -117,3 +117,18 @@ def _create_check_cycles(sender, connection, **kwargs):
         LANGUAGE plpgsql
     """)
     DDL(sql).execute(connection)
+
+
+@signals.db_schema_created.connect_via('categories')
+def _create_create_category_stats(sender, connection, **kwargs):
+    sql = textwrap.dedent("""
+        CREATE FUNCTION categories.create_category_stats() RETURNS trigger AS
+        $BODY$
+        BEGIN
+            INSERT INTO categories.category_stats (category_id, version) VALUES (NEW.id, 0);
+            RETURN NULL;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    """)
+    DDL(sql).execute(connection)
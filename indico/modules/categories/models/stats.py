@@ -0,0 +1,128 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+
+from sqlalchemy import DDL
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.event import listens_for
+
+from indico.core.db import db
+from indico.core.db.sqlalchemy import UTCDateTime
+from indico.core.db.util import run_after_commit
+from indico.util.string import return_ascii
+
+
+class CategoryStats(db.Model):
+    """Precalculated statistics of a category.
+
+    The statistics are calculated lazily and stored until something
+    affecting them changes.  Whenever that happens, the statistics of
+    the category and all its parents are invalidated by incrementing
+    their `version`, so the totals never need to be recalculated from
+    scratch: only the events directly inside an invalidated category
+    are counted again and the totals are summed up from the stored
+    statistics of the subcategories.
+
+    A row is created by a database trigger for every new category.
+    """
+
+    __tablename__ = 'category_stats'
+    __table_args__ = {'schema': 'categories'}
+
+    category_id = db.Column(
+        db.Integer,
+        db.ForeignKey('categories.categories.id', ondelete='CASCADE'),
+        primary_key=True,
+        autoincrement=False
+    )
+    #: Incremented whenever the statistics are invalidated
+    version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0
+    )
+    #: The statistics of the events directly inside the category
+    own_stats = db.Column(
+        JSON,
+        nullable=True
+    )
+    #: The statistics of the category including all subcategories
+    stats = db.Column(
+        JSON,
+        nullable=True
+    )
+    #: The date/time when `stats` were calculated
+    updated_dt = db.Column(
+        UTCDateTime,
+        nullable=True
+    )
+
+    @return_ascii
+    def __repr__(self):
+        return '<CategoryStats({}, {})>'.format(self.category_id, self.version)
+
+    @classmethod
+    def invalidate(cls, category, own=True):
+        """Invalidate the statistics of a category and its parents.
+
+        The statistics are only invalidated after the current
+        transaction has been committed, so the rows of the parent
+        categories (especially the root category, which is affected by
+        every change) are not locked for the whole transaction.
+
+        :param category: The :class:`.Category` whose statistics
+                         changed.
+        :param own: Whether something directly inside the category
+                    changed.  If not, only the totals are invalidated,
+                    e.g. when a subcategory is moved into it.
+        """
+        from indico.modules.categories.models.categories import Category
+        chain_ids = [id_ for id_, in category.chain_query.with_entities(Category.id)]
+        _invalidate_stats(chain_ids, category.id if own else None)
+
+
+@run_after_commit
+def _invalidate_stats(category_ids, own_category_id=None):
+    values = {CategoryStats.version: CategoryStats.version + 1,
+              CategoryStats.stats: None,
+              CategoryStats.updated_dt: None}
+    if own_category_id is not None:
+        values[CategoryStats.own_stats] = db.case({own_category_id: None}, value=CategoryStats.category_id,
+                                                  else_=CategoryStats.own_stats)
+    with db.tmp_session() as sess:
+        # lock the rows in a consistent order to avoid deadlocks with
+        # concurrent transactions invalidating overlapping chains
+        (sess.query(CategoryStats.category_id)
+         .filter(CategoryStats.category_id.in_(category_ids))
+         .order_by(CategoryStats.category_id)
+         .with_for_update()
+         .all())
+        (sess.query(CategoryStats)
+         .filter(CategoryStats.category_id.in_(category_ids))
+         .update(values, synchronize_session=False))
+        sess.commit()
+
+@listens_for(CategoryStats.__table__, 'after_create')
+def _add_category_stats_trigger(target, conn, **kw):
+    sql = """
+        CREATE TRIGGER create_stats
+        AFTER INSERT
+        ON categories.categories
+        FOR EACH ROW
+        EXECUTE PROCEDURE categories.create_category_stats();
+    """
+    DDL(sql).execute(conn)
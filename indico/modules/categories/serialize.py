@@ -16,29 +16,55 @@
 
 from __future__ import unicode_literals
 
-from io import BytesIO
-
 from lxml import html
 from lxml.etree import ParserError
 
 import icalendar as ical
 from flask import session
-from pyatom import AtomFeed
-from sqlalchemy.orm import joinedload, load_only, subqueryload, undefer
+from pyatom import AtomFeed, FeedEntry
+from sqlalchemy.orm import joinedload, load_only, undefer
 
 from indico.modules.events import Event
 from indico.util.date_time import now_utc
 from indico.web.flask.util import url_for
 
 
-def serialize_category_ical(category, user, event_filter):
+def _iter_accessible_events(query, user, options, chunk_size=100):
+    """Iterate over the events of a query which a user can access.
+
+    Only the ids of the events are loaded upfront.  The events are
+    loaded and checked for access in chunks, so the memory usage does
+    not depend on the number of events.
+
+    :param query: The query retrieving the events.
+    :param user: The user who needs to be able to access the events.
+    :param options: The loader options to use for the events.
+    :param chunk_size: The number of events to load at once.
+    """
+    ids = [id_ for id_, in query.with_entities(Event.id)]
+    for i in xrange(0, len(ids), chunk_size):
+        chunk = ids[i:i + chunk_size]
+        events = {e.id: e for e in Event.query.filter(Event.id.in_(chunk)).options(*options)}
+        accessible = Event.get_accessible_ids(events.viewvalues(), user)
+        for id_ in chunk:
+            if id_ in accessible:
+                yield events[id_]
+
+
+def serialize_category_ical(category, user, event_filter, dtstamp=None):
     """Export the events in a category to iCal
 
+    The calendar is generated incrementally while loading the events
+    in small chunks.
+
     :param category: The category to export
     :param user: The user who needs to be able to access the events
     :param event_filter: A SQLalchemy criterion to restrict which
                          events will be returned.  Usually something
                          involving the start/end date of the event.
+    :param dtstamp: The `DTSTAMP` of the calendar entries.  Defaults
+                    to the current time.
+    :return: An iterator yielding chunks of the iCal data.
     """
     own_room_strategy = joinedload('own_room')
     own_room_strategy.load_only('building', 'floor', 'number', 'name')
@@ -48,20 +74,22 @@ def serialize_category_ical(category, user, event_filter):
              .filter(Event.category_chain_overlaps(category.id),
                      ~Event.is_deleted,
                      event_filter)
-             .options(load_only('id', 'category_id', 'start_dt', 'end_dt', 'title', 'description', 'own_venue_name',
-                                'own_room_name', 'protection_mode', 'access_key'),
-                      subqueryload('acl_entries'),
-                      joinedload('person_links'),
-                      own_room_strategy,
-                      own_venue_strategy)
              .order_by(Event.start_dt))
-    events = [e for e in query if e.can_access(user)]
+    options = (load_only('id', 'category_id', 'start_dt', 'end_dt', 'title', 'description', 'own_venue_name',
+                         'own_room_name', 'protection_mode', 'access_key'),
+               joinedload('person_links'),
+               own_room_strategy,
+               own_venue_strategy)
     cal = ical.Calendar()
     cal.add('version', '2.0')
     cal.add('prodid', '-//CERN//INDICO//EN')
+    # The calendar is written without its closing line first, followed
+    # by the entries of the events which are serialized one by one
+    footer = b'END:VCALENDAR\r\n'
+    yield cal.to_ical()[:-len(footer)]
 
-    now = now_utc(False)
-    for event in events:
+    now = dtstamp or now_utc(False)
+    for event in _iter_accessible_events(query, user, options):
         url = url_for('event.conferenceDisplay', confId=event.id, _external=True)
         location = ('{} ({})'.format(event.room_name, event.venue_name)
                     if event.venue_name and event.room_name
@@ -89,37 +117,46 @@ def serialize_category_ical(category, user, event_filter):
                 pass
         description.append(url)
         cal_event.add('description', u'\n'.join(description))
-        cal.add_component(cal_event)
-    return BytesIO(cal.to_ical())
+        yield cal_event.to_ical()
+    yield footer
 
 
-def serialize_category_atom(category, url, user, event_filter):
+def serialize_category_atom(category, url, user, event_filter, updated=None):
     """Export the events in a category to Atom
 
+    The feed is generated incrementally while loading the events in
+    small chunks.
+
     :param category: The category to export
     :param url: The URL of the feed
     :param user: The user who needs to be able to access the events
     :param event_filter: A SQLalchemy criterion to restrict which
                          events will be returned.  Usually something
                          involving the start/end date of the event.
+    :param updated: The time when the feed was last updated.  Defaults
+                    to the current time.
+    :return: An iterator yielding chunks of the Atom data.
     """
     query = (Event.query
              .filter(Event.category_chain_overlaps(category.id),
                      ~Event.is_deleted,
                      event_filter)
-             .options(load_only('id', 'category_id', 'start_dt', 'title', 'description', 'protection_mode',
-                                'access_key'),
-                      subqueryload('acl_entries'))
              .order_by(Event.start_dt))
-    events = [e for e in query if e.can_access(user)]
-
-    feed = AtomFeed(feed_url=url, title='Indico Feed [{}]'.format(category.title))
-    for event in events:
-        feed.add(title=event.title,
-                 summary=unicode(event.description),  # get rid of RichMarkup
-                 url=url_for('event.conferenceDisplay', confId=event.id, _external=True),
-                 updated=event.start_dt)
-    return BytesIO(feed.to_string().encode('utf-8'))
+    options = (load_only('id', 'category_id', 'start_dt', 'title', 'description', 'protection_mode', 'access_key'),)
+    # The entries are streamed one by one, so the feed can neither use
+    # their dates nor check whether they have an author
+    feed = AtomFeed(feed_url=url, title='Indico Feed [{}]'.format(category.title), author='Unknown author',
+                    updated=updated or now_utc(False))
+    footer = '</feed>\n'
+    feed_xml = feed.to_string()
+    yield feed_xml[:feed_xml.rindex(footer)].encode('utf-8')
+    for event in _iter_accessible_events(query, user, options):
+        entry = FeedEntry(title=event.title,
+                          summary=unicode(event.description),  # get rid of RichMarkup
+                          url=url_for('event.conferenceDisplay', confId=event.id, _external=True),
+                          updated=event.start_dt)
+        yield entry.to_string().encode('utf-8')
+    yield footer.encode('utf-8')
 
 
 def serialize_category(category, with_favorite=False, with_path=False, parent_path=None, child_path=None):
@@ -0,0 +1,47 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+import icalendar as ical
+import pytest
+
+from indico.core.db.sqlalchemy.protection import ProtectionMode
+from indico.modules.categories.serialize import serialize_category_ical
+from indico.modules.events import Event
+
+
+@pytest.mark.usefixtures('request_context')
+@pytest.mark.parametrize('with_access', (False, True))
+def test_serialize_category_ical(db, dummy_category, dummy_user, create_event, with_access):
+    events = [create_event(title=u'event#{}'.format(i)) for i in xrange(5)]
+    protected = create_event(title=u'protected', protection_mode=ProtectionMode.protected)
+    if with_access:
+        protected.update_principal(dummy_user, read_access=True)
+    db.session.flush()
+    data = b''.join(serialize_category_ical(dummy_category, dummy_user, True))
+    cal = ical.Calendar.from_ical(data)
+    titles = {unicode(e['summary']) for e in cal.walk('vevent')}
+    expected = {e.title for e in events}
+    if with_access:
+        expected.add(protected.title)
+    assert titles == expected
+    assert data.endswith(b'END:VCALENDAR\r\n')
+
+
+@pytest.mark.usefixtures('request_context')
+def test_serialize_category_ical_empty(db, dummy_category, dummy_user):
+    data = b''.join(serialize_category_ical(dummy_category, dummy_user, Event.id.is_(None)))
+    cal = ical.Calendar.from_ical(data)
+    assert not cal.walk('vevent')
@@ -16,6 +16,7 @@
 
 from __future__ import unicode_literals
 
+from collections import defaultdict
 from datetime import timedelta
 
 from celery.schedules import crontab
@@ -23,38 +24,103 @@ from celery.schedules import crontab
 from indico.core.celery import celery
 from indico.core.config import Config
 from indico.core.db import DBMgr, db
+from indico.core.db.sqlalchemy.principals import PrincipalType
 from indico.modules.categories import logger, Category
+from indico.modules.categories.models.principals import CategoryPrincipal
 from indico.modules.users import User, UserSetting
+from indico.modules.users.models.favorites import favorite_category_table
 from indico.modules.users.models.suggestions import SuggestedCategory
-from indico.modules.users.util import get_related_categories
 from indico.util.date_time import now_utc
-from indico.util.suggestions import get_category_scores
+from indico.util.struct.iterables import grouper
+from indico.util.suggestions import get_attended_events, get_category_scores
 
 
 # Minimum score for a category to be suggested
 SUGGESTION_MIN_SCORE = 0.25
+# Number of users whose suggestions are updated together
+SUGGESTION_BATCH_SIZE = 500
+
+
+def _get_excluded_category_ids():
+    """Get the IDs of all categories which must not be suggested.
+
+    This includes deleted categories and categories where suggestions
+    are disabled either in the category itself or in any of its parent
+    categories.
+    """
+    cte = Category.get_tree_cte(lambda cat: cat.suggestions_disabled)
+    query = db.session.query(cte.c.id).filter(cte.c.is_deleted | cte.c.path.any(True))
+    return {category_id for category_id, in query}
+
+
+def _get_favorite_category_ids(user_ids):
+    """Get the IDs of the favorite categories of users.
+
+    :return: A dict mapping user IDs to sets of category IDs.
+    """
+    query = (db.session
+             .query(favorite_category_table.c.user_id, favorite_category_table.c.target_id)
+             .filter(favorite_category_table.c.user_id.in_(user_ids)))
+    favorites = defaultdict(set)
+    for user_id, category_id in query:
+        favorites[user_id].add(category_id)
+    return favorites
+
+
+def _get_managed_category_ids(user_ids):
+    """Get the IDs of the categories managed by users.
+
+    :return: A dict mapping user IDs to sets of category IDs.
+    """
+    query = (db.session
+             .query(CategoryPrincipal.user_id, CategoryPrincipal.category_id)
+             .filter(CategoryPrincipal.type == PrincipalType.user,
+                     CategoryPrincipal.user_id.in_(user_ids),
+                     CategoryPrincipal.has_management_role()))
+    managed = defaultdict(set)
+    for user_id, category_id in query:
+        managed[user_id].add(category_id)
+    return managed
 
 
 @celery.periodic_task(name='category_suggestions', run_every=crontab(minute='0', hour='7'))
 def category_suggestions():
-    users = (User.query
-             .filter(~User.is_deleted,
-                     User._all_settings.any(db.and_(UserSetting.module == 'users',
-                                                    UserSetting.name == 'suggest_categories',
-                                                    db.cast(UserSetting.value, db.String) == 'true'))))
-    for user in users:
-        existing = {x.category: x for x in user.suggested_categories}
-        related = set(get_related_categories(user, detailed=False))
-        for category, score in get_category_scores(user).iteritems():
-            if score < SUGGESTION_MIN_SCORE:
-                continue
-            if (category in related or category.is_deleted or category.suggestions_disabled or
-                    any(p.suggestions_disabled for p in category.parent_chain_query)):
-                continue
-            logger.debug('Suggesting %s with score %.03f for %s', category, score, user)
-            suggestion = existing.get(category) or SuggestedCategory(category=category, user=user)
-            suggestion.score = score
-        user.settings.set('suggest_categories', False)
+    user_ids = [user_id for user_id, in (db.session
+                                         .query(User.id)
+                                         .filter(~User.is_deleted,
+                                                 User._all_settings.any(db.and_(
+                                                     UserSetting.module == 'users',
+                                                     UserSetting.name == 'suggest_categories',
+                                                     db.cast(UserSetting.value, db.String) == 'true'))))]
+    excluded = _get_excluded_category_ids()
+    # the events of each category are only loaded once and then used for all users
+    category_events = {}
+    for chunk in grouper(user_ids, SUGGESTION_BATCH_SIZE, skip_missing=True):
+        users = User.query.filter(User.id.in_(chunk)).all()
+        favorites = _get_favorite_category_ids(chunk)
+        managed = _get_managed_category_ids(chunk)
+        attended = get_attended_events(chunk)
+        existing = {(x.user_id, x.category_id): x
+                    for x in SuggestedCategory.find(SuggestedCategory.user_id.in_(chunk))}
+        for user in users:
+            related = favorites[user.id] | managed[user.id]
+            scores = get_category_scores(user, category_events=category_events,
+                                         favorite_category_ids=favorites[user.id],
+                                         attended_events=attended[user.id])
+            for category, score in scores.iteritems():
+                if score < SUGGESTION_MIN_SCORE or category.id in related or category.id in excluded:
+                    continue
+                logger.debug('Suggesting %s with score %.03f for %s', category, score, user)
+                suggestion = (existing.get((user.id, category.id)) or
+                              SuggestedCategory(category=category, user=user))
+                suggestion.score = score
+        (UserSetting.query
+         .filter(UserSetting.user_id.in_(chunk),
+                 UserSetting.module == 'users',
+                 UserSetting.name == 'suggest_categories')
+         .update({UserSetting.value: False}, synchronize_session=False))
+        # the bulk update bypasses the settings api which usually takes care of this
+        UserSetting._clear_cache()
         db.session.commit()
 
 
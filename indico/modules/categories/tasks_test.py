@@ -0,0 +1,77 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from indico.core.settings.models.base import _has_uncommitted_changes
+from indico.modules.categories import Category
+from indico.modules.categories.tasks import _get_excluded_category_ids, category_suggestions
+from indico.modules.events.registration.models.forms import RegistrationForm
+from indico.modules.events.registration.models.registrations import Registration, RegistrationState
+from indico.modules.users import UserSetting
+from indico.util.date_time import as_utc
+from indico.util.suggestions import get_attended_events
+
+
+def test_get_excluded_category_ids(db, create_category):
+    root = Category.get_root()
+    cat = create_category(1, parent=root)
+    disabled = create_category(2, parent=root, suggestions_disabled=True)
+    disabled_child = create_category(3, parent=disabled)
+    deleted = create_category(4, parent=root, is_deleted=True)
+    deleted_child = create_category(5, parent=deleted, is_deleted=True)
+    create_category(6, parent=cat)
+    db.session.flush()
+    assert _get_excluded_category_ids() == {disabled.id, disabled_child.id, deleted.id, deleted_child.id}
+
+
+def test_category_suggestions_settings_cache(db, dummy_user):
+    # not using the settings api to avoid having uncommitted settings already
+    db.session.add(UserSetting(user=dummy_user, module='users', name='suggest_categories', value=True))
+    db.session.flush()
+    assert not _has_uncommitted_changes()
+    category_suggestions.run()
+    # the settings version is bumped once the session is committed
+    assert _has_uncommitted_changes()
+    db.session.expire_all()
+    assert not dummy_user.settings.get('suggest_categories')
+
+
+def test_get_attended_events(db, mocker, count_queries, create_user, create_event):
+    user = create_user(1)
+    other_user = create_user(2)
+    events = []
+    for day in (3, 1, 2):
+        start_dt = as_utc(datetime(2016, 6, day, 10))
+        event = create_event(start_dt=start_dt, end_dt=start_dt + timedelta(hours=1))
+        regform = RegistrationForm(event_new=event, title='Registration Form', currency='USD')
+        for u in (user, other_user):
+            Registration(registration_form=regform, user=u, email=u.email, first_name=u.first_name,
+                         last_name=u.last_name, currency='USD', state=RegistrationState.complete)
+        events.append(event)
+    submitted = create_event(start_dt=as_utc(datetime(2016, 5, 1, 10)), end_dt=as_utc(datetime(2016, 5, 1, 11)))
+    db.session.flush()
+    mocker.patch('indico.util.suggestions.avatar_links.get_links_multi',
+                 return_value={user.id: OrderedDict([(unicode(submitted.id), {'abstract_submitter'})]),
+                               other_user.id: OrderedDict()})
+    with count_queries() as cnt:
+        attended = get_attended_events([user.id, other_user.id])
+        assert attended[user.id] == [submitted, events[1], events[2], events[0]]
+        assert attended[other_user.id] == [events[1], events[2], events[0]]
+        assert attended[user.id][0].category
+    # the number of queries does not depend on the number of users
+    assert cnt() == 4
@@ -16,7 +16,7 @@
 
 from __future__ import unicode_literals
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from datetime import timedelta
 
 from pytz import timezone
@@ -25,11 +25,13 @@ from sqlalchemy.orm.attributes import set_committed_value
 
 from indico.core.config import Config
 from indico.core.db import db
+from indico.core.db.util import run_after_commit
 from indico.core.db.sqlalchemy.links import LinkType
 from indico.core.db.sqlalchemy.protection import ProtectionMode
 from indico.modules.attachments import Attachment
 from indico.modules.attachments.models.folders import AttachmentFolder
-from indico.modules.categories import upcoming_events_settings
+from indico.modules.categories import Category, upcoming_events_settings
+from indico.modules.categories.models.stats import CategoryStats
 from indico.modules.events import Event
 from indico.modules.events.contributions import Contribution
 from indico.modules.events.contributions.models.subcontributions import SubContribution
@@ -39,59 +41,70 @@ from indico.util.caching import memoize_redis
 from indico.util.date_time import now_utc
 from indico.util.i18n import _, ngettext
 from indico.util.struct.iterables import materialize_iterable
+from MaKaC.common.cache import GenericCache
 
 
-def get_events_by_year(category_id=None):
+_feed_stamp_cache = GenericCache('category-feed-stamps')
+_FEED_PROTECTION_KEY = 'protection'
+
+
+def get_events_by_year(category_ids):
     """Get the number of events for each year.
 
-    :param category_id: The category ID to get statistics for. Events
-                        from subcategories are also included.
-    :return: An `OrderedDict` mapping years to event counts.
+    :param category_ids: The IDs of the categories to get statistics
+                         for.  Events from subcategories are not
+                         included.
+    :return: A dict mapping category IDs to dicts mapping years to
+             event counts.
     """
-    category_filter = Event.category_chain_overlaps(category_id) if category_id else True
     query = (db.session
-             .query(db.cast(db.extract('year', Event.start_dt), db.Integer).label('year'),
+             .query(Event.category_id,
+                    db.cast(db.extract('year', Event.start_dt), db.Integer).label('year'),
                     db.func.count())
              .filter(~Event.is_deleted,
-                     category_filter)
-             .order_by('year')
-             .group_by('year'))
-    return OrderedDict(query)
+                     Event.category_id.in_(category_ids))
+             .group_by(Event.category_id, 'year'))
+    result = defaultdict(dict)
+    for category_id, year, count in query:
+        result[category_id][year] = count
+    return result
 
 
-def get_contribs_by_year(category_id=None):
+def get_contribs_by_year(category_ids):
     """Get the number of contributions for each year.
 
-    :param category_id: The category ID to get statistics for.
-                        Contributions from subcategories are also
-                        included.
-    :return: An `OrderedDict` mapping years to contribution counts.
+    :param category_ids: The IDs of the categories to get statistics
+                         for.  Contributions from subcategories are
+                         not included.
+    :return: A dict mapping category IDs to dicts mapping years to
+             contribution counts.
     """
-    category_filter = Event.category_chain_overlaps(category_id) if category_id else True
     query = (db.session
-             .query(db.cast(db.extract('year', TimetableEntry.start_dt), db.Integer).label('year'),
+             .query(Event.category_id,
+                    db.cast(db.extract('year', TimetableEntry.start_dt), db.Integer).label('year'),
                     db.func.count())
              .join(TimetableEntry.event_new)
              .filter(TimetableEntry.type == TimetableEntryType.CONTRIBUTION,
                      ~Event.is_deleted,
-                     category_filter)
-             .order_by('year')
-             .group_by('year'))
-    return OrderedDict(query)
+                     Event.category_id.in_(category_ids))
+             .group_by(Event.category_id, 'year'))
+    result = defaultdict(dict)
+    for category_id, year, count in query:
+        result[category_id][year] = count
+    return result
 
 
-def get_attachment_count(category_id=None):
+def get_attachment_count(category_ids):
     """Get the number of attachments in events in a category.
 
-    :param category_id: The category ID to get statistics for.
-                        Attachments from subcategories are also
-                        included.
-    :return: The number of attachments
+    :param category_ids: The IDs of the categories to get statistics
+                         for.  Attachments from subcategories are not
+                         included.
+    :return: A dict mapping category IDs to attachment counts.
     """
-    category_filter = Event.category_chain_overlaps(category_id) if category_id else True
     subcontrib_contrib = db.aliased(Contribution)
     query = (db.session
-             .query(db.func.count(Attachment.id))
+             .query(Event.category_id, db.func.count(Attachment.id))
              .join(Attachment.folder)
              .join(AttachmentFolder.event_new)
              .outerjoin(AttachmentFolder.session)
@@ -106,24 +119,133 @@ def get_attachment_count(category_id=None):
                      ~db.func.coalesce(Session.is_deleted, Contribution.is_deleted, SubContribution.is_deleted, False),
                      # in case of a subcontribution we also need to check that the contrib is not deleted
                      (subcontrib_contrib.is_deleted.is_(None) | ~subcontrib_contrib.is_deleted),
-                     category_filter))
-    return query.one()[0]
+                     Event.category_id.in_(category_ids))
+             .group_by(Event.category_id))
+    return dict(query)
+
+
+def _get_own_stats(category_ids):
+    events = get_events_by_year(category_ids)
+    contribs = get_contribs_by_year(category_ids)
+    attachments = get_attachment_count(category_ids)
+    return {category_id: {'events_by_year': events.get(category_id, {}),
+                          'contribs_by_year': contribs.get(category_id, {}),
+                          'attachments': attachments.get(category_id, 0)}
+            for category_id in category_ids}
+
+
+def _sum_stats(stats):
+    events_by_year = defaultdict(int)
+    contribs_by_year = defaultdict(int)
+    attachments = 0
+    for data in stats:
+        # the years are strings when the stats come from the json column
+        for year, count in data['events_by_year'].iteritems():
+            events_by_year[int(year)] += count
+        for year, count in data['contribs_by_year'].iteritems():
+            contribs_by_year[int(year)] += count
+        attachments += data['attachments']
+    return {'events_by_year': dict(events_by_year),
+            'contribs_by_year': dict(contribs_by_year),
+            'attachments': attachments}
+
+
+def _calculate_category_stats(category_id):
+    cte = Category.get_tree_cte()
+    query = (db.session
+             .query(cte.c.id, CategoryStats.version, CategoryStats.own_stats)
+             .outerjoin(CategoryStats, CategoryStats.category_id == cte.c.id)
+             .filter(cte.c.path.contains([category_id]),
+                     ~cte.c.is_deleted))
+    rows = query.all()
+    missing = {id_ for id_, version, own_stats in rows if own_stats is None}
+    own_stats = _get_own_stats(missing) if missing else {}
+    for id_, version, data in rows:
+        if data is not None:
+            own_stats[id_] = data
+        elif version is not None:
+            # if the version changed in the meantime the stats we just
+            # calculated may already be outdated, so we don't store them
+            (CategoryStats.query
+             .filter_by(category_id=id_, version=version)
+             .update({CategoryStats.own_stats: own_stats[id_]}, synchronize_session=False))
+    stats = _sum_stats(own_stats.itervalues())
+    updated_dt = now_utc()
+    version = next((version for id_, version, __ in rows if id_ == category_id), None)
+    if version is not None:
+        (CategoryStats.query
+         .filter_by(category_id=category_id, version=version)
+         .update({CategoryStats.stats: stats, CategoryStats.updated_dt: updated_dt}, synchronize_session=False))
+    return stats, updated_dt
 
 
-@memoize_redis(86400)
 def get_category_stats(category_id=None):
     """Get category statistics.
 
-    This function is mainly a helper so we can get and cache
-    all values at once and keep a last-update timestamp.
+    The statistics are stored in :class:`.CategoryStats` and only need
+    to be recalculated after they have been invalidated by a change
+    inside the category.  In that case only the events directly inside
+    the modified categories are counted again while the statistics of
+    all other subcategories are reused.
 
     :param category_id: The category ID to get statistics for.
-                        Subcategories are also included.
+                        Subcategories are also included.  If omitted,
+                        the statistics for the root category are
+                        returned.
     """
-    return {'events_by_year': get_events_by_year(category_id),
-            'contribs_by_year': get_contribs_by_year(category_id),
-            'attachments': get_attachment_count(category_id),
-            'updated': now_utc()}
+    if category_id is None:
+        category_id = Category.get_root().id
+    stats, updated_dt = (db.session.query(CategoryStats.stats, CategoryStats.updated_dt)
+                         .filter_by(category_id=category_id)
+                         .first()) or (None, None)
+    if stats is None:
+        stats, updated_dt = _calculate_category_stats(category_id)
+    return {'events_by_year': OrderedDict(sorted((int(year), count)
+                                                 for year, count in stats['events_by_year'].iteritems())),
+            'contribs_by_year': OrderedDict(sorted((int(year), count)
+                                                   for year, count in stats['contribs_by_year'].iteritems())),
+            'attachments': stats['attachments'],
+            'updated': updated_dt}
+
+
+def get_category_feed_stamp(category):
+    """Get the time when the events in a category feed last changed.
+
+    This is a cheap replacement for checking the events themselves
+    which is used to answer conditional requests for the feeds of a
+    category.  Categories which do not have a stamp yet (or whose stamp
+    has been evicted from the cache) get the current time.
+
+    :param category: The category of the feed.
+    :return: A UTC datetime.
+    """
+    keys = [category.id, _FEED_PROTECTION_KEY]
+    stamps = _feed_stamp_cache.get_multi(keys)
+    missing = {key: now_utc() for key, stamp in stamps.iteritems() if stamp is None}
+    if missing:
+        _feed_stamp_cache.set_multi(missing)
+        stamps.update(missing)
+    return max(stamps.itervalues())
+
+
+def invalidate_category_feeds(category=None):
+    """Mark the feeds of a category and its parents as modified.
+
+    :param category: The category containing the modified events.  If
+                     omitted, the feeds of all categories are marked as
+                     modified, e.g. because category protection changed.
+    """
+    if category is None:
+        keys = [_FEED_PROTECTION_KEY]
+    else:
+        keys = [id_ for id_, in category.chain_query.with_entities(Category.id)]
+    _touch_feed_stamps(keys)
+
+
+@run_after_commit
+def _touch_feed_stamps(keys):
+    now = now_utc()
+    _feed_stamp_cache.set_multi({key: now for key in keys})
 
 
 @memoize_redis(3600)
@@ -0,0 +1,109 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timedelta
+
+from indico.core import signals
+from indico.core.db.util import flush_after_commit_queue
+from indico.modules.categories import Category
+from indico.modules.categories.models.stats import CategoryStats
+from indico.modules.categories.util import get_category_stats
+from indico.modules.events.timetable.models.breaks import Break
+from indico.modules.events.timetable.models.entries import TimetableEntry
+from indico.modules.events.util import track_time_changes
+from indico.util.contextManager import ContextManager
+from indico.util.date_time import as_utc
+
+
+def _create_event(create_event, category, year):
+    start_dt = as_utc(datetime(year, 6, 1, 10))
+    return create_event(category=category, start_dt=start_dt, end_dt=start_dt + timedelta(hours=1))
+
+
+def test_get_category_stats(db, create_category, create_event):
+    root = Category.get_root()
+    cat = create_category(1, parent=root)
+    subcat = create_category(2, parent=cat)
+    other = create_category(3, parent=root)
+    _create_event(create_event, subcat, 2015)
+    _create_event(create_event, cat, 2016)
+    _create_event(create_event, other, 2016)
+    deleted = _create_event(create_event, cat, 2016)
+    deleted.is_deleted = True
+    db.session.flush()
+
+    stats = get_category_stats(cat.id)
+    assert stats['events_by_year'] == {2015: 1, 2016: 1}
+    assert stats['events_by_year'].keys() == [2015, 2016]
+    assert stats['attachments'] == 0
+    assert get_category_stats(subcat.id)['events_by_year'] == {2015: 1}
+    assert get_category_stats()['events_by_year'] == {2015: 1, 2016: 2}
+    # everything is stored now
+    assert not CategoryStats.query.filter(CategoryStats.own_stats.is_(None)).count()
+
+    signals.event.created.send(_create_event(create_event, subcat, 2016))
+    assert CategoryStats.query.get(subcat.id).own_stats is None
+    assert CategoryStats.query.get(root.id).stats is None
+    # categories outside the chain and parents' own stats are not affected
+    assert CategoryStats.query.get(other.id).stats is not None
+    assert CategoryStats.query.get(cat.id).own_stats is not None
+    assert get_category_stats(cat.id)['events_by_year'] == {2015: 1, 2016: 2}
+    assert get_category_stats(root.id)['events_by_year'] == {2015: 1, 2016: 3}
+
+
+def test_get_category_stats_moved(db, create_category, create_event):
+    root = Category.get_root()
+    cat = create_category(1, parent=root)
+    subcat = create_category(2, parent=cat)
+    other = create_category(3, parent=root)
+    _create_event(create_event, subcat, 2015)
+    db.session.flush()
+    assert get_category_stats(cat.id)['events_by_year'] == {2015: 1}
+    assert get_category_stats(other.id)['events_by_year'] == {}
+    subcat.move(other)
+    assert get_category_stats(cat.id)['events_by_year'] == {}
+    assert get_category_stats(other.id)['events_by_year'] == {2015: 1}
+
+
+def test_get_category_stats_break_moved(db, create_category, create_event):
+    cat = create_category(1, parent=Category.get_root())
+    event = _create_event(create_event, cat, 2016)
+    entry = TimetableEntry(event_new=event, start_dt=event.start_dt,
+                           break_=Break(title='Coffee', duration=timedelta(minutes=30)))
+    db.session.add(entry)
+    db.session.flush()
+    get_category_stats(cat.id)
+    assert CategoryStats.query.get(cat.id).own_stats is not None
+    with track_time_changes():
+        entry.start_dt += timedelta(minutes=15)
+    assert CategoryStats.query.get(cat.id).own_stats is None
+
+
+def test_get_category_stats_invalidated_after_commit(db, create_category, create_event):
+    cat = create_category(1, parent=Category.get_root())
+    _create_event(create_event, cat, 2016)
+    db.session.flush()
+    get_category_stats(cat.id)
+    ContextManager.set('currentRH', object())
+    try:
+        signals.event.created.send(_create_event(create_event, cat, 2016))
+        # inside a request the parent rows are only locked after the commit
+        assert CategoryStats.query.get(cat.id).own_stats is not None
+        flush_after_commit_queue(True)
+    finally:
+        ContextManager.delete('currentRH')
+    assert CategoryStats.query.get(cat.id).own_stats is None
+    assert get_category_stats(cat.id)['events_by_year'] == {2016: 2}
@@ -149,6 +149,58 @@ def _log_acl_changes(sender, obj, principal, entry, is_new, old_data, quiet, **k
                 data=data)
 
 
+def _invalidate_api_data(event):
+    from indico.modules.events.api import invalidate_event_api_data
+    if event is not None:
+        invalidate_event_api_data(event)
+
+
+@signals.event.data_changed.connect
+def _event_data_changed(event, **kwargs):
+    _invalidate_api_data(event.as_event)
+
+
+@signals.event.type_changed.connect
+@signals.event.moved.connect
+def _event_type_or_category_changed(event, **kwargs):
+    _invalidate_api_data(event)
+
+
+@signals.event.contribution_created.connect
+@signals.event.contribution_updated.connect
+@signals.event.contribution_deleted.connect
+@signals.event.subcontribution_created.connect
+@signals.event.subcontribution_updated.connect
+@signals.event.subcontribution_deleted.connect
+@signals.event.session_deleted.connect
+@signals.event.session_block_deleted.connect
+@signals.event.timetable_entry_created.connect
+@signals.event.timetable_entry_updated.connect
+@signals.event.timetable_entry_deleted.connect
+@signals.event.notes.note_added.connect
+@signals.event.notes.note_modified.connect
+@signals.event.notes.note_deleted.connect
+@signals.attachments.folder_created.connect
+@signals.attachments.folder_deleted.connect
+@signals.attachments.folder_updated.connect
+def _event_object_changed(obj, **kwargs):
+    _invalidate_api_data(obj.event_new)
+
+
+@signals.attachments.attachment_created.connect
+@signals.attachments.attachment_deleted.connect
+@signals.attachments.attachment_updated.connect
+def _event_attachment_changed(attachment, **kwargs):
+    _invalidate_api_data(attachment.folder.event_new)
+
+
+@signals.acl.protection_changed.connect
+@signals.acl.entry_changed.connect
+def _event_protection_changed(sender, obj, **kwargs):
+    if isinstance(obj, Event):
+        _invalidate_api_data(obj)
+
+
 @signals.app_created.connect
 def _handle_legacy_ids(app, **kwargs):
     """
@@ -14,44 +14,85 @@
 # You should have received a copy of the GNU General Public License
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 
-import fnmatch
 import re
 import pytz
 from datetime import datetime
 from hashlib import md5
 from operator import attrgetter
+from uuid import uuid4
 
 from flask import request
 from sqlalchemy import Date, cast
 from sqlalchemy.orm import joinedload, subqueryload, undefer
 from werkzeug.exceptions import ServiceUnavailable
 
+from indico.core import signals
 from indico.core.db import db
+from indico.core.db.util import run_after_commit
 from indico.core.db.sqlalchemy.principals import PrincipalType
 from indico.core.db.sqlalchemy.protection import ProtectionMode
+from indico.core.db.sqlalchemy.util.queries import glob_matches
+from indico.modules.api import settings as api_settings
 from indico.modules.attachments.api.util import build_folders_api_data, build_material_legacy_api_data
 from indico.modules.categories import LegacyCategoryMapping, Category
 from indico.modules.events import Event
+from indico.modules.events.models.events import EventType
 from indico.modules.events.models.persons import PersonLinkBase
 from indico.modules.events.notes.util import build_note_api_data, build_note_legacy_api_data
 from indico.modules.events.sessions.models.sessions import Session
 from indico.modules.events.timetable.models.entries import TimetableEntry
 from indico.modules.events.timetable.legacy import TimetableSerializer
+from indico.modules.rb.models.locations import Location
+from indico.modules.rb.models.rooms import Room
 from indico.util.date_time import iterdays
 from indico.util.fossilize import fossilize
 from indico.util.fossilize.conversion import Conversion
 from indico.util.string import to_unicode
+from indico.util.struct.iterables import grouper
 from indico.web.flask.util import url_for
 from indico.web.http_api.fossils import IPeriodFossil
 from indico.web.http_api.responses import HTTPAPIError
 from indico.web.http_api.util import get_query_parameter
 from indico.web.http_api.hooks.base import HTTPAPIHook, IteratedDataFetcher
+from MaKaC.common.cache import GenericCache
 
 
 utc = pytz.timezone('UTC')
 MAX_DATETIME = utc.localize(datetime(2099, 12, 31, 23, 59, 0))
 MIN_DATETIME = utc.localize(datetime(2000, 1, 1))
 
+# The serialized data of an event which does not depend on the user,
+# keyed by the event id, its modification stamp and the detail level
+_fragment_cache = GenericCache('api-event-fragments')
+_stamp_cache = GenericCache('api-event-stamps')
+
+
+def _get_event_api_stamps(event_ids):
+    """Get the modification stamps of the API data of some events.
+
+    Events which do not have a stamp yet get a new one; this ensures
+    that fragments cached under a stamp which has been evicted from
+    the cache are never used again.
+    """
+    stamps = _stamp_cache.get_multi(event_ids)
+    missing = {event_id: uuid4().hex for event_id, stamp in stamps.iteritems() if stamp is None}
+    if missing:
+        _stamp_cache.set_multi(missing)
+        stamps.update(missing)
+    return stamps
+
+
+@run_after_commit
+def invalidate_event_api_data(event):
+    """Invalidate the cached API data of an event.
+
+    This changes the modification stamp of the event so the cached
+    fragments are not used anymore.  It is delayed until after the
+    transaction has been committed to avoid caching outdated data
+    during the remaining part of the request.
+    """
+    _stamp_cache.set(event.id, uuid4().hex)
+
 
 class Period(object):
     def __init__(self, startDT, endDT):
@@ -105,6 +146,8 @@ class CategoryEventHook(HTTPAPIHook):
     TYPES = ('event', 'categ')
     RE = r'(?P<idlist>\w+(?:-\w+)*)'
     DEFAULT_DETAIL = 'events'
+    STREAMABLE = True
+    STREAM_EXTRA_KEYS = ('categoryId',)
     MAX_RECORDS = {
         'events': 1000,
         'contributions': 500,
@@ -125,6 +168,10 @@ class CategoryEventHook(HTTPAPIHook):
         self._occurrences = get_query_parameter(self._queryParams, ['occ', 'occurrences'], 'no') == 'yes'
         self._location = get_query_parameter(self._queryParams, ['l', 'location'])
         self._room = get_query_parameter(self._queryParams, ['r', 'room'])
+        try:
+            self._after = get_query_parameter(self._queryParams, ['after'], integer=True)
+        except ValueError:
+            raise HTTPAPIError('Event ID in `after` must be numeric', 400)
 
     def export_categ(self, aw):
         expInt = CategoryEventFetcher(aw, self)
@@ -414,10 +461,12 @@ class CategoryEventFetcher(IteratedDataFetcher, SerializerBase):
         self._occurrences = hook._occurrences
         self._location = hook._location
         self._room = hook._room
+        self._after = hook._after
         self.user = getattr(aw.getUser(), 'user', None)
         self._detail_level = get_query_parameter(request.args.to_dict(), ['d', 'detail'], 'events')
         if self._detail_level not in ('events', 'contributions', 'subcontributions', 'sessions'):
             raise HTTPAPIError('Invalid detail level: {}'.format(self._detail_level), 400)
+        self._fragment_ttl = 0 if hook._noCache else api_settings.get('cache_ttl')
 
     def _calculate_occurrences(self, event, from_dt, to_dt, tz):
         start_dt = max(from_dt, event.start_dt) if from_dt else event.start_dt
@@ -452,13 +501,11 @@ class CategoryEventFetcher(IteratedDataFetcher, SerializerBase):
             idlist = map(int, idlist)
         except ValueError:
             raise HTTPAPIError('Category IDs must be numeric', 400)
-        query = (Event.query
-                 .filter(~Event.is_deleted,
-                         Event.category_chain_overlaps(idlist),
-                         Event.happens_between(self._fromDT, self._toDT))
-                 .options(*self._get_query_options(self._detail_level)))
-        query = self._update_query(query)
-        return self.serialize_events(x for x in query if self._filter_event(x) and x.can_access(self.user))
+        query = Event.query.filter(~Event.is_deleted,
+                                   Event.category_chain_overlaps(idlist),
+                                   Event.happens_between(self._fromDT, self._toDT),
+                                   *self._get_filter_criteria())
+        return self.serialize_events(self._iter_events(query))
 
     def category_extra(self, ids):
         if self._toDT is None:
@@ -472,50 +519,155 @@ class CategoryEventFetcher(IteratedDataFetcher, SerializerBase):
         }
 
     def event(self, idlist):
-        query = (Event.find(Event.id.in_(idlist),
-                            ~Event.is_deleted,
-                            Event.happens_between(self._fromDT, self._toDT))
-                 .options(*self._get_query_options(self._detail_level)))
-        query = self._update_query(query)
-        return self.serialize_events(x for x in query if self._filter_event(x) and x.can_access(self.user))
-
-    def _filter_event(self, event):
-        if self._room or self._location or self._eventType:
-            if self._eventType and event.as_legacy.getType() != self._eventType:
-                return False
-            if self._location:
-                name = event.venue_name
-                if not name or not fnmatch.fnmatch(name.lower(), self._location.lower()):
-                    return False
-            if self._room:
-                name = event.room_name
-                if not name or not fnmatch.fnmatch(name.lower(), self._room.lower()):
-                    return False
-        return True
-
-    def _update_query(self, query):
-        order = get_query_parameter(request.args.to_dict(), ['o', 'order'])
-        desc = get_query_parameter(request.args.to_dict(), ['c', 'descending']) == 'yes'
-        limit = get_query_parameter(request.args.to_dict(), ['n', 'limit'])
-        offset = get_query_parameter(request.args.to_dict(), ['O', 'offset'])
-
-        col = {
+        query = Event.find(Event.id.in_(idlist),
+                           ~Event.is_deleted,
+                           Event.happens_between(self._fromDT, self._toDT),
+                           *self._get_filter_criteria())
+        return self.serialize_events(self._iter_events(query))
+
+    def _get_filter_criteria(self):
+        """Get the SQL criteria for the type, location and room filters"""
+        criteria = []
+        if self._eventType:
+            event_type = EventType.legacy_map.get(self._eventType)
+            criteria.append(Event.type_ == event_type if event_type is not None else db.false())
+        if self._location:
+            venue_name = db.case([(Event.own_venue_id.isnot(None),
+                                   db.select([Location.name]).where(Location.id == Event.own_venue_id).as_scalar())],
+                                 else_=Event.own_venue_name)
+            criteria.append((venue_name != '') & glob_matches(venue_name, to_unicode(self._location)))
+        if self._room:
+            room_name = db.case([(Event.own_room_id.isnot(None),
+                                  db.select([Room.full_name]).where(Room.id == Event.own_room_id).as_scalar())],
+                                else_=Event.own_room_name)
+            criteria.append((room_name != '') & glob_matches(room_name, to_unicode(self._room)))
+        return criteria
+
+    def _iter_events(self, query, batch_size=100):
+        """Iterate over the events of a query the user can access.
+
+        The events are sorted by the requested column and their id and
+        fetched in batches using keyset pagination, i.e. each batch
+        continues right after the last event of the previous one
+        instead of using an OFFSET.  The offset and limit of the request
+        therefore apply to the events the user can access.
+
+        The access checks are performed for a whole batch at once and
+        the events themselves (including all their eager-loaded data)
+        are only loaded if they are actually returned.
+        """
+        sort_col = {
             'start': Event.start_dt,
             'end': Event.end_dt,
             'id': Event.id,
             'title': Event.title
-        }.get(order)
-        if col:
-            query = query.order_by(col.desc() if desc else col)
-        if limit:
-            query = query.limit(limit)
-        if offset:
-            query = query.offset(offset)
-
-        return query
+        }.get(self._orderBy, Event.start_dt)
+        sort_key = db.tuple_(sort_col, Event.id)
+        query = (query.with_entities(Event.id, sort_col, Event.effective_protection_mode)
+                 .order_by(*((sort_col.desc(), Event.id.desc()) if self._descending else (sort_col, Event.id))))
+        cursor = None
+        if self._after is not None:
+            cursor = db.session.query(sort_col, Event.id).filter(Event.id == self._after).first()
+            if cursor is None:
+                raise HTTPAPIError('Event {} does not exist'.format(self._after), 400)
+
+        def _iterate(cursor):
+            skip = self._offset
+            remaining = self._hook._userLimit or None
+            while remaining is None or remaining > 0:
+                batch_query = query
+                if cursor is not None:
+                    batch_query = batch_query.filter(sort_key < db.tuple_(*cursor) if self._descending
+                                                     else sort_key > db.tuple_(*cursor))
+                batch = batch_query.limit(batch_size).all()
+                if not batch:
+                    break
+                cursor = batch[-1][1], batch[-1][0]
+                accessible = self._get_accessible_event_ids(batch)
+                ids = [id_ for id_, _, _ in batch if id_ in accessible]
+                if skip:
+                    ids, skip = ids[skip:], max(0, skip - len(ids))
+                if remaining is not None:
+                    ids = ids[:remaining]
+                    remaining -= len(ids)
+                for event in self._load_events(ids):
+                    yield event
+                if len(batch) < batch_size:
+                    break
+
+        return _iterate(cursor)
+
+    def _get_accessible_event_ids(self, rows):
+        """Determine which events the user can access.
+
+        Events which are public (either by themselves or through their
+        category) are always accessible unless a plugin may override
+        the access checks.  All other events are checked in bulk.
+
+        :param rows: ``(id, ..., effective_protection_mode)`` tuples
+        :return: a set of event ids
+        """
+        check_public = signals.acl.can_access.has_receivers_for(Event)
+        accessible = {row[0] for row in rows if row[-1] == ProtectionMode.public and not check_public}
+        pending = [row[0] for row in rows if row[0] not in accessible]
+        if pending:
+            events = Event.query.filter(Event.id.in_(pending)).options(undefer('effective_protection_mode'))
+            accessible |= Event.get_accessible_ids(events, self.user)
+        return accessible
+
+    def _load_events(self, ids):
+        """Load events with all the data needed to serialize them.
+
+        :param ids: a list of event ids
+        :return: a list of events in the same order as `ids`
+        """
+        if not ids:
+            return []
+        events = {e.id: e for e in (Event.query
+                                    .filter(Event.id.in_(ids))
+                                    .options(*self._get_query_options(self._detail_level)))}
+        return [events[id_] for id_ in ids]
 
     def serialize_events(self, events):
-        return map(self._build_event_api_data, events)
+        if not self._use_fragment_cache:
+            for event in events:
+                yield self._build_event_api_data(event)
+            return
+        for chunk in grouper(events, 100, skip_missing=True):
+            fragments = self._get_event_api_fragments(chunk)
+            for event in chunk:
+                yield self._build_event_api_data(event, fragments[event.id])
+
+    @property
+    def _use_fragment_cache(self):
+        # Contributions and sessions contain data which depends on the
+        # user (management permissions and access to their attachments)
+        # so they are only cached for unauthenticated requests.
+        return self._fragment_ttl > 0 and (self.user is None or self._detail_level == 'events')
+
+    def _get_event_api_fragments(self, events):
+        """Get the user-independent API data for some events.
+
+        The data is taken from the cache if possible and serialized
+        (and cached) otherwise.
+
+        :return: a dict mapping event ids to the event data
+        """
+        stamps = _get_event_api_stamps([event.id for event in events])
+        keys = {event.id: (event.id, stamps[event.id], self._detail_level, self._hook._tz.zone, request.host_url)
+                for event in events}
+        cached = _fragment_cache.get_multi(keys.values())
+        fragments = {}
+        missing = {}
+        for event in events:
+            key = keys[event.id]
+            fragment = cached[key]
+            if fragment is None:
+                fragment = missing[key] = self._build_event_api_fragment(event)
+            fragments[event.id] = fragment
+        if missing:
+            _fragment_cache.set_multi(missing, self._fragment_ttl)
+        return fragments
 
     def _serialize_category_path(self, category):
         visibility = {'id': None, 'name': 'Everywhere'}
@@ -544,8 +696,36 @@ class CategoryEventFetcher(IteratedDataFetcher, SerializerBase):
         return [{'_type': 'CategoryPath', 'categoryId': category.id, 'path': self._serialize_category_path(category)}
                 for category in Category.query.filter(Category.id.in_(ids)).options(undefer('chain'))]
 
-    def _build_event_api_data(self, event):
+    def _build_event_api_data(self, event, fragment=None):
+        """Build the API data of an event.
+
+        :param event: the event to serialize
+        :param fragment: the data which does not depend on the user,
+                         as returned by :meth:`_build_event_api_fragment`.
+                         It is serialized if not specified.
+        """
         can_manage = self.user is not None and event.can_manage(self.user)
+        if fragment is None:
+            data = self._build_event_api_fragment(event, can_manage)
+        else:
+            data = dict(fragment)
+            if can_manage:
+                data['creator'] = self._serialize_person(event.creator, person_type='Avatar', can_manage=True)
+                data['chairs'] = self._serialize_persons(event.person_links, person_type='ConferenceChair',
+                                                         can_manage=True)
+        # attachments are filtered based on the user's access to them
+        data['folders'] = build_folders_api_data(event)
+        data['material'] = (build_material_legacy_api_data(event) +
+                            filter(None, [build_note_legacy_api_data(event.note)]))
+        if can_manage:
+            data['allowed'] = self._serialize_access_list(event)
+        if self._occurrences:
+            data['occurrences'] = fossilize(self._calculate_occurrences(event, self._fromDT, self._toDT,
+                                            pytz.timezone(self._serverTZ)),
+                                            {Period: IPeriodFossil}, tz=self._tz, naiveTZ=self._serverTZ)
+        return data
+
+    def _build_event_api_fragment(self, event, can_manage=False):
         data = self._build_event_api_data_base(event)
         data.update({
             '_fossil': self.fossils_mapping['event'].get(self._detail_level),
@@ -559,9 +739,7 @@ class CategoryEventFetcher(IteratedDataFetcher, SerializerBase):
             'creator': self._serialize_person(event.creator, person_type='Avatar', can_manage=can_manage),
             'hasAnyProtection': event.effective_protection_mode != ProtectionMode.public,
             'roomMapURL': event.room.map_url if event.room else None,
-            'folders': build_folders_api_data(event),
-            'chairs': self._serialize_persons(event.person_links, person_type='ConferenceChair', can_manage=can_manage),
-            'material': build_material_legacy_api_data(event) + filter(None, [build_note_legacy_api_data(event.note)])
+            'chairs': self._serialize_persons(event.person_links, person_type='ConferenceChair', can_manage=can_manage)
         })
 
         event_category_path = event.category.chain
@@ -580,8 +758,6 @@ class CategoryEventFetcher(IteratedDataFetcher, SerializerBase):
                 visibility['name'] = path_segment['title']
         data['visibility'] = visibility
 
-        if can_manage:
-            data['allowed'] = self._serialize_access_list(event)
         if self._detail_level in {'contributions', 'subcontributions'}:
             data['contributions'] = []
             for contribution in event.contributions:
@@ -599,10 +775,6 @@ class CategoryEventFetcher(IteratedDataFetcher, SerializerBase):
             data['sessions'] = []
             for session_ in event.sessions:
                 data['sessions'].extend(self._build_session_api_data(session_))
-        if self._occurrences:
-            data['occurrences'] = fossilize(self._calculate_occurrences(event, self._fromDT, self._toDT,
-                                            pytz.timezone(self._serverTZ)),
-                                            {Period: IPeriodFossil}, tz=self._tz, naiveTZ=self._serverTZ)
         return data
 
 
@@ -708,17 +880,21 @@ class EventSearchFetcher(IteratedDataFetcher):
             elif self._orderBy == 'id':
                 query = query.order_by(Event.id)
 
+            user = self._aw.getUser().user if self._aw.getUser() else None
             counter = 0
             # Query the DB in chunks of 1000 records per query until the limit is satisfied
-            for event in query.yield_per(1000):
-                if event.can_access(self._aw.getUser().user if self._aw.getUser() else None):
+            for events in grouper(query.yield_per(1000), 1000, skip_missing=True):
+                accessible = Event.get_accessible_ids(events, user)
+                for event in events:
+                    if event.id not in accessible:
+                        continue
                     counter += 1
                     # Start yielding only when the counter reaches the given offset
                     if (self._offset is None) or (counter > self._offset):
                         yield event
                         # Stop querying the DB when the limit is satisfied
                         if (self._limit is not None) and (counter == self._offset + self._limit):
-                            break
+                            return
 
         if self._orderBy in ['start', 'id', None]:
             obj_list = _iterate_objs(query)
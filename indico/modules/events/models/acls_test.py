@@ -337,6 +337,31 @@ def test_can_access_signal_override_calls(create_event, dummy_user):
     assert calls == [None, False]
 
 
+@pytest.mark.usefixtures('request_context')
+def test_get_accessible_ids(db, create_event, create_user, dummy_user, dummy_group):
+    other_user = create_user(123)
+    public = create_event(protection_mode=ProtectionMode.public)
+    inheriting = create_event(protection_mode=ProtectionMode.inheriting)
+    protected = create_event(protection_mode=ProtectionMode.protected)
+    protected_user = create_event(protection_mode=ProtectionMode.protected)
+    protected_user.update_principal(dummy_user, read_access=True)
+    protected_group = create_event(protection_mode=ProtectionMode.protected)
+    protected_group.update_principal(dummy_group, read_access=True)
+    protected_manager = create_event(protection_mode=ProtectionMode.protected)
+    protected_manager.update_principal(other_user, full_access=True)
+    dummy_group.group.members.add(other_user)
+    db.session.flush()
+    events = [public, inheriting, protected, protected_user, protected_group, protected_manager]
+    db.session.expire_all()
+    for user in (None, dummy_user, other_user):
+        expected = {e.id for e in events if e.can_access(user)}
+        db.session.expire_all()
+        assert Event.get_accessible_ids(events, user) == expected
+    assert Event.get_accessible_ids(events, dummy_user) == {public.id, inheriting.id, protected_user.id}
+    assert Event.get_accessible_ids(events, other_user) == {public.id, inheriting.id, protected_group.id,
+                                                            protected_manager.id}
+
+
 @pytest.mark.parametrize(('is_admin', 'allow_admin', 'not_explicit', 'expected'), bool_matrix('...', expect=all))
 def test_can_manage_admin(create_event, create_user, is_admin, allow_admin, not_explicit, expected):
     event = create_event()
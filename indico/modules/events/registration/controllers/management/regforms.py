@@ -35,7 +35,8 @@ from indico.modules.events.registration.models.forms import RegistrationForm
 from indico.modules.events.registration.models.items import PersonalDataType
 from indico.modules.events.registration.models.registrations import Registration
 from indico.modules.events.registration.stats import OverviewStats, AccommodationStats
-from indico.modules.events.registration.util import get_event_section_data, create_personal_data_fields
+from indico.modules.events.registration.util import (get_event_section_data, create_personal_data_fields,
+                                                     PreloadedRegistrationData)
 from indico.modules.events.registration.views import (WPManageRegistration, WPManageRegistrationStats,
                                                       WPManageParticipants)
 from indico.modules.events.util import update_object_principals
@@ -281,8 +282,12 @@ class RHRegistrationFormStats(RHManageRegFormBase):
     """Display registration form stats page"""
 
     def _process(self):
+        # load the data of all registrations at once instead of once per
+        # registration (personal data) and accommodation field
+        registration_data = PreloadedRegistrationData(self.regform.active_registrations, regform=self.regform)
         regform_stats = [OverviewStats(self.regform)]
-        regform_stats += [AccommodationStats(x) for x in self.regform.active_fields if x.input_type == 'accommodation']
+        regform_stats += [AccommodationStats(x, registration_data)
+                          for x in self.regform.active_fields if x.input_type == 'accommodation']
         return WPManageRegistrationStats.render_template('management/regform_stats.html', self.event,
                                                          regform=self.regform, regform_stats=regform_stats)
 
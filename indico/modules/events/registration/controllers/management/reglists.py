@@ -18,11 +18,10 @@ from __future__ import unicode_literals
 
 import os
 from io import BytesIO
-from tempfile import NamedTemporaryFile
-from zipfile import ZipFile
 
 from flask import session, request, redirect, jsonify, flash, render_template
 from sqlalchemy.orm import joinedload
+from werkzeug.utils import cached_property
 
 from indico.core.config import Config
 from indico.core.db import db
@@ -50,7 +49,7 @@ from indico.util.fs import secure_filename
 from indico.util.i18n import _, ngettext
 from indico.util.placeholders import replace_placeholders
 from indico.util.spreadsheets import send_csv, send_xlsx
-from indico.util.tasks import delete_file
+from indico.util.zipstream import get_stored_file_entry, send_zip
 from indico.web.flask.templating import get_template_module
 from indico.web.flask.util import url_for, send_file
 from indico.web.util import jsonify_data, jsonify_template
@@ -66,20 +65,10 @@ def _render_registration_details(registration):
 
 
 def _generate_zip_file(attachments, regform):
-    temp_file = NamedTemporaryFile(suffix='indico.tmp', dir=Config.getInstance().getTempDir())
-    with ZipFile(temp_file.name, 'w', allowZip64=True) as zip_handler:
-        for reg_attachments in attachments.itervalues():
-            for reg_attachment in reg_attachments:
-                name = _prepare_folder_structure(reg_attachment)
-                with reg_attachment.storage.get_local_path(reg_attachment.storage_file_id) as filepath:
-                    zip_handler.write(filepath, name)
-
-    # Delete the temporary file after some time.  Even for a large file we don't
-    # need a higher delay since the webserver will keep it open anyway until it's
-    # done sending it to the client.
-    delete_file.apply_async(args=[temp_file.name], countdown=3600)
-    temp_file.delete = False
-    return send_file('attachments-{}.zip'.format(regform.id), temp_file.name, 'application/zip', inline=False)
+    files = [get_stored_file_entry(_prepare_folder_structure(reg_attachment), reg_attachment)
+             for reg_attachments in attachments.itervalues()
+             for reg_attachment in reg_attachments]
+    return send_zip('attachments-{}.zip'.format(regform.id), files)
 
 
 def _prepare_folder_structure(attachment):
@@ -183,11 +172,14 @@ class RHRegistrationsActionBase(RHManageRegFormBase):
     def _checkParams(self, params):
         RHManageRegFormBase._checkParams(self, params)
         ids = set(request.form.getlist('registration_id'))
-        self.registrations = (Registration
-                              .find(Registration.id.in_(ids), ~Registration.is_deleted)
-                              .with_parent(self.regform)
-                              .order_by(*Registration.order_by_name)
-                              .all())
+        self.registrations_query = (Registration
+                                    .find(Registration.id.in_(ids), ~Registration.is_deleted)
+                                    .with_parent(self.regform)
+                                    .order_by(*Registration.order_by_name))
+
+    @cached_property
+    def registrations(self):
+        return self.registrations_query.all()
 
 
 class RHRegistrationEmailRegistrantsPreview(RHRegistrationsActionBase):
@@ -347,7 +339,8 @@ class RHRegistrationsExportCSV(RHRegistrationsExportBase):
     """Export registration list to a CSV file"""
 
     def _process(self):
-        headers, rows = generate_spreadsheet_from_registrations(self.registrations, self.export_config['regform_items'],
+        headers, rows = generate_spreadsheet_from_registrations(self.registrations_query,
+                                                                self.export_config['regform_items'],
                                                                 self.export_config['static_item_ids'])
         return send_csv('registrations.csv', headers, rows)
 
@@ -356,7 +349,8 @@ class RHRegistrationsExportExcel(RHRegistrationsExportBase):
     """Export registration list to an XLSX file"""
 
     def _process(self):
-        headers, rows = generate_spreadsheet_from_registrations(self.registrations, self.export_config['regform_items'],
+        headers, rows = generate_spreadsheet_from_registrations(self.registrations_query,
+                                                                self.export_config['regform_items'],
                                                                 self.export_config['static_item_ids'])
         return send_xlsx('registrations.xlsx', headers, rows)
 
@@ -124,11 +124,19 @@ class DataItem(namedtuple('DataItem', ['regs', 'attendance', 'capacity', 'billab
 class FieldStats(object):
     """Holds stats for a registration form field"""
 
-    def __init__(self, field, **kwargs):
+    def __init__(self, field, registration_data=None, **kwargs):
+        """
+        :param field: The field to show the stats for
+        :param registration_data: A :class:`.PreloadedRegistrationData`
+                                  containing the data of the active
+                                  registrations of the form; if set,
+                                  no separate query is needed for the
+                                  data of this field
+        """
         kwargs.setdefault('type', 'table')
         super(FieldStats, self).__init__(**kwargs)
         self._field = field
-        self._regitems = self._get_registration_data(field)
+        self._regitems = self._get_registration_data(field, registration_data)
         self._choices = self._get_choices(field)
         self._data, self._show_billing_info = self._build_data()
 
@@ -139,7 +147,9 @@ class FieldStats(object):
     def _get_choices(self, field):
         return {choice['id']: choice for choice in field.current_data.versioned_data['choices']}
 
-    def _get_registration_data(self, field):
+    def _get_registration_data(self, field, registration_data=None):
+        if registration_data is not None:
+            return [data for data in registration_data.iter_field_data(field.id) if data.data != {}]
         registration_ids = [r.id for r in field.registration_form.active_registrations]
         field_data_ids = [data.id for data in field.data_versions]
         return RegistrationData.find_all(RegistrationData.registration_id.in_(registration_ids),
@@ -334,8 +344,9 @@ class OverviewStats(StatsBase):
 
 
 class AccommodationStats(FieldStats, StatsBase):
-    def __init__(self, field):
-        super(AccommodationStats, self).__init__(title=_("Accommodation"), subtitle=field.title, field=field)
+    def __init__(self, field, registration_data=None):
+        super(AccommodationStats, self).__init__(title=_("Accommodation"), subtitle=field.title, field=field,
+                                                 registration_data=registration_data)
         self.has_capacity = any(detail.capacity for acco_details in self._data.itervalues()
                                 for detail in acco_details if detail.capacity)
 
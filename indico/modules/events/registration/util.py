@@ -16,10 +16,11 @@
 
 from __future__ import unicode_literals
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 
 from flask import current_app, session, request
 from sqlalchemy.orm import load_only, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.urls import url_parse
 from wtforms import BooleanField, ValidationError
 
@@ -45,6 +46,7 @@ from indico.util.date_time import format_datetime, format_date
 from indico.util.i18n import _
 from indico.util.spreadsheets import unique_col
 from indico.util.string import to_unicode
+from indico.util.struct.iterables import grouper
 from indico.web.flask.templating import get_template_module
 from indico.web.forms.base import IndicoForm
 from indico.web.forms.widgets import SwitchWidget
@@ -286,12 +288,58 @@ def modify_registration(registration, data, management=False, notify_user=True):
     logger.info('Registration %s modified by %s', registration, session.user)
 
 
-def generate_spreadsheet_from_registrations(registrations, regform_items, static_items):
+class PreloadedRegistrationData(object):
+    """The data of many registrations, loaded in a single query.
+
+    The `data` relationship of every registration is populated, so
+    using `data_by_field` and anything relying on it does not query
+    the database anymore.
+
+    :param registrations: The registrations whose data is loaded.
+    :param regform: The registration form of the registrations.  If
+                    set, the data is queried for the whole form instead
+                    of a potentially long list of registration ids.
+    """
+
+    def __init__(self, registrations, regform=None):
+        self.registrations = list(registrations)
+        self._registration_ids = {registration.id for registration in self.registrations}
+        self._fields = defaultdict(list)
+        data = defaultdict(list)
+        if self.registrations:
+            for entry in self._build_query(regform):
+                if entry.registration_id not in self._registration_ids:
+                    continue
+                data[entry.registration_id].append(entry)
+                self._fields[entry.field_data.field_id].append(entry)
+        for registration in self.registrations:
+            set_committed_value(registration, 'data', data[registration.id])
+
+    def _build_query(self, regform):
+        query = RegistrationData.query.options(joinedload('field_data').joinedload('field'))
+        if regform is None:
+            return query.filter(RegistrationData.registration_id.in_(list(self._registration_ids)))
+        return (query
+                .join(RegistrationData.registration)
+                .filter(Registration.registration_form_id == regform.id,
+                        ~Registration.is_deleted))
+
+    def iter_field_data(self, field_id):
+        """Iterate over the data entries of a field"""
+        return iter(self._fields.get(field_id, []))
+
+
+def generate_spreadsheet_from_registrations(registrations, regform_items, static_items, chunk_size=500):
     """Generates a spreadsheet data from a given registration list.
 
-    :param registrations: The list of registrations to include in the file
+    :param registrations: A query returning the registrations to
+                          include in the file.  They are loaded in
+                          chunks while the rows are generated.
     :param regform_items: The registration form items to be used as columns
     :param static_items: Registration form information as extra columns
+    :param chunk_size: The number of registrations loaded at once
+    :return: A tuple containing the headers and a generator yielding
+             the rows as lists in the same order as the headers.
     """
     field_names = ['ID', 'Name']
     special_item_mapping = OrderedDict([
@@ -307,33 +355,34 @@ def generate_spreadsheet_from_registrations(registrations, regform_items, static
         if item.input_type == 'accommodation':
             field_names.append(unique_col('{} ({})'.format(item.title, 'Arrival'), item.id))
             field_names.append(unique_col('{} ({})'.format(item.title, 'Departure'), item.id))
-    field_names.extend(title for name, (title, fn) in special_item_mapping.iteritems() if name in static_items)
-    rows = []
-    for registration in registrations:
+    static_item_funcs = []
+    for name, (title, fn) in special_item_mapping.iteritems():
+        if name in static_items:
+            field_names.append(title)
+            static_item_funcs.append(fn)
+
+    def _get_row(registration):
         data = registration.data_by_field
-        registration_dict = {
-            'ID': registration.friendly_id,
-            'Name': "{} {}".format(registration.first_name, registration.last_name)
-        }
+        row = [registration.friendly_id, "{} {}".format(registration.first_name, registration.last_name)]
         for item in regform_items:
-            key = unique_col(item.title, item.id)
             if item.input_type == 'accommodation':
-                registration_dict[key] = data[item.id].friendly_data.get('choice') if item.id in data else ''
-                key = unique_col('{} ({})'.format(item.title, 'Arrival'), item.id)
-                arrival_date = data[item.id].friendly_data.get('arrival_date') if item.id in data else None
-                registration_dict[key] = format_date(arrival_date) if arrival_date else ''
-                key = unique_col('{} ({})'.format(item.title, 'Departure'), item.id)
-                departure_date = data[item.id].friendly_data.get('departure_date') if item.id in data else None
-                registration_dict[key] = format_date(departure_date) if departure_date else ''
+                friendly_data = data[item.id].friendly_data if item.id in data else {}
+                arrival_date = friendly_data.get('arrival_date')
+                departure_date = friendly_data.get('departure_date')
+                row.append(friendly_data.get('choice', ''))
+                row.append(format_date(arrival_date) if arrival_date else '')
+                row.append(format_date(departure_date) if departure_date else '')
             else:
-                registration_dict[key] = data[item.id].friendly_data if item.id in data else ''
-        for name, (title, fn) in special_item_mapping.iteritems():
-            if name not in static_items:
-                continue
-            value = fn(registration)
-            registration_dict[title] = value
-        rows.append(registration_dict)
-    return field_names, rows
+                row.append(data[item.id].friendly_data if item.id in data else '')
+        row.extend(fn(registration) for fn in static_item_funcs)
+        return row
+
+    def _iter_rows():
+        for chunk in grouper(registrations.yield_per(chunk_size), chunk_size, skip_missing=True):
+            for registration in PreloadedRegistrationData(chunk).registrations:
+                yield _get_row(registration)
+
+    return field_names, _iter_rows()
 
 
 def get_registrations_with_tickets(user, event):
@@ -530,7 +579,6 @@ class RegistrationListGenerator(ListGeneratorBase):
         return (Registration.query
                 .with_parent(self.regform)
                 .filter(~Registration.is_deleted)
-                .options(joinedload('data').joinedload('field_data').joinedload('field'))
                 .order_by(db.func.lower(Registration.last_name), db.func.lower(Registration.first_name)))
 
     def _filter_list_entries(self, query, filters):
@@ -573,6 +621,7 @@ class RegistrationListGenerator(ListGeneratorBase):
         registrations_query = self._build_query()
         total_entries = registrations_query.count()
         registrations = self._filter_list_entries(registrations_query, reg_list_config['filters']).all()
+        PreloadedRegistrationData(registrations, regform=self.regform)
         dynamic_item_ids, static_item_ids = self._split_item_ids(reg_list_config['items'], 'dynamic')
         static_columns = self._get_static_columns(static_item_ids)
         regform_items = self._get_sorted_regform_items(dynamic_item_ids)
@@ -0,0 +1,111 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+
+import pytest
+
+from indico.modules.events.registration.models.form_fields import RegistrationFormField
+from indico.modules.events.registration.models.forms import RegistrationForm
+from indico.modules.events.registration.models.items import RegistrationFormSection
+from indico.modules.events.registration.models.registrations import (Registration, RegistrationData,
+                                                                     RegistrationState)
+from indico.modules.events.registration.stats import AccommodationStats
+from indico.modules.events.registration.util import PreloadedRegistrationData
+
+
+HOTEL_ID = '10000000-0000-0000-0000-000000000000'
+HOSTEL_ID = '20000000-0000-0000-0000-000000000000'
+
+
+@pytest.fixture
+def dummy_regform(db, dummy_event_new):
+    regform = RegistrationForm(event_new=dummy_event_new, title='Registration Form', currency='USD')
+    section = RegistrationFormSection(registration_form=regform, title='Section')
+    field = RegistrationFormField(registration_form=regform, parent=section, input_type='accommodation',
+                                  title='Accommodation')
+    field.data = {'captions': {HOTEL_ID: 'Hotel', HOSTEL_ID: 'Hostel'}}
+    field.versioned_data = {'choices': [
+        {'id': HOTEL_ID, 'places_limit': 10, 'is_billable': False, 'price': 0, 'is_enabled': True},
+        {'id': HOSTEL_ID, 'places_limit': 0, 'is_billable': False, 'price': 0, 'is_enabled': True}
+    ]}
+    db.session.add(regform)
+    db.session.flush()
+    return regform
+
+
+@pytest.fixture
+def accommodation_field(dummy_regform):
+    return dummy_regform.active_fields[0]
+
+
+@pytest.fixture
+def create_registration(db, dummy_regform, accommodation_field):
+    """Returns a callable which lets you create registrations"""
+    def _create_registration(n, choice=None, **kwargs):
+        registration = Registration(registration_form=dummy_regform, email='{}@example.com'.format(n),
+                                    first_name='Guinea', last_name='Pig #{}'.format(n), currency='USD',
+                                    state=RegistrationState.complete, **kwargs)
+        if choice is not None:
+            data = {'choice': choice, 'arrival_date': '2016-06-01', 'departure_date': '2016-06-02'}
+            registration.data.append(RegistrationData(field_data=accommodation_field.current_data, data=data))
+        db.session.flush()
+        return registration
+
+    return _create_registration
+
+
+@pytest.mark.parametrize('by_regform', (True, False))
+def test_preloaded_registration_data(count_queries, dummy_regform, accommodation_field, create_registration,
+                                     by_regform):
+    hotel = create_registration(1, HOTEL_ID)
+    hostel = create_registration(2, HOSTEL_ID)
+    no_data = create_registration(3)
+    create_registration(4, HOTEL_ID, is_deleted=True)
+    registrations = dummy_regform.active_registrations
+    with count_queries() as count:
+        registration_data = PreloadedRegistrationData(registrations, regform=dummy_regform if by_regform else None)
+    assert count() == 1
+    with count_queries() as count:
+        assert hotel.data_by_field[accommodation_field.id].data['choice'] == HOTEL_ID
+        assert hostel.data_by_field[accommodation_field.id].data['choice'] == HOSTEL_ID
+        assert not no_data.data_by_field
+        assert ({data.registration for data in registration_data.iter_field_data(accommodation_field.id)} ==
+                {hotel, hostel})
+    assert count() == 0
+
+
+def test_preloaded_registration_data_empty(count_queries, dummy_regform):
+    with count_queries() as count:
+        registration_data = PreloadedRegistrationData([], regform=dummy_regform)
+    assert count() == 0
+    assert list(registration_data.iter_field_data(123)) == []
+
+
+def test_accommodation_stats_preloaded(count_queries, dummy_regform, accommodation_field, create_registration):
+    for n in xrange(3):
+        create_registration(n, HOTEL_ID)
+    create_registration(3, HOSTEL_ID)
+    create_registration(4)
+    registration_data = PreloadedRegistrationData(dummy_regform.active_registrations, regform=dummy_regform)
+    with count_queries() as count:
+        stats = AccommodationStats(accommodation_field, registration_data)
+    assert count() == 0
+    assert set(stats._regitems) == set(AccommodationStats(accommodation_field)._regitems)
+    assert {key: sum(item.regs for item in items) for key, items in stats._data.iteritems()} == {
+        ('Hotel', HOTEL_ID): 3,
+        ('Hostel', HOSTEL_ID): 1
+    }
@@ -41,6 +41,7 @@ from indico.web.http_api.util import get_query_parameter
 
 class RoomBookingHookBase(HTTPAPIHook):
     GUEST_ALLOWED = False
+    USES_ZODB = False
 
     def _getParams(self):
         super(RoomBookingHookBase, self)._getParams()
@@ -165,6 +166,7 @@ class BookRoomHook(HTTPAPIHook):
     GUEST_ALLOWED = False
     VALID_FORMATS = ('json', 'xml')
     COMMIT = True
+    USES_ZODB = False
     HTTP_POST = True
 
     def _getParams(self):
@@ -26,6 +26,8 @@ from MaKaC.webinterface.rh.base import RHProtected
 
 
 class RHRoomBookingProtected(RHProtected):
+    USES_ZODB = False
+
     def _checkSessionUser(self):
         if not Config.getInstance().getIsRoomBookingActive():
             raise NotFound(_('The room booking module is not enabled.'))
@@ -27,7 +27,7 @@ from indico.modules.rb.models.reservations import Reservation
 from indico.modules.rb.models.rooms import Room
 from indico.modules.rb.models.room_attributes import RoomAttribute
 from indico.modules.rb.models.equipment import EquipmentType
-from indico.modules.rb.statistics import calculate_rooms_occupancy, compose_rooms_stats
+from indico.modules.rb.statistics import calculate_total_occupancy, get_location_stats, sum_rooms_stats
 from indico.modules.rb.views.admin.locations import WPRoomBookingAdmin, WPRoomBookingAdminLocation
 from indico.util.string import natural_sort_key
 
@@ -95,14 +95,15 @@ class RHRoomBookingAdminLocation(RHRoomBookingAdminBase):
         rooms = sorted(self._location.rooms, key=lambda r: natural_sort_key(r.full_name))
         kpi = {}
         if self._with_kpi:
-            kpi['occupancy'] = calculate_rooms_occupancy(self._location.rooms)
+            stats = get_location_stats(self._location)
+            kpi['occupancy'] = calculate_total_occupancy(stats.itervalues())
             kpi['total_rooms'] = len(self._location.rooms)
             kpi['active_rooms'] = sum(1 for room in self._location.rooms if room.is_active)
             kpi['reservable_rooms'] = sum(1 for room in self._location.rooms if room.is_reservable)
             kpi['reservable_capacity'] = sum(room.capacity or 0 for room in self._location.rooms if room.is_reservable)
             kpi['reservable_surface'] = sum(room.surface_area or 0 for room in self._location.rooms
                                             if room.is_reservable)
-            kpi['booking_stats'] = compose_rooms_stats(self._location.rooms)
+            kpi['booking_stats'] = sum_rooms_stats(stats.itervalues())
             kpi['booking_count'] = Reservation.find(Reservation.room.has(Room.location == self._location)).count()
         return WPRoomBookingAdminLocation(self,
                                           location=self._location,
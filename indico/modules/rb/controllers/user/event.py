@@ -74,6 +74,8 @@ def _assign_room(obj, room, flash_message=True):
 
 
 class RHRoomBookingEventBase(RHConferenceModifBase, RHRoomBookingBase):
+    USES_ZODB = True  # events are still stored in the ZODB
+
     def _checkProtection(self):
         RHConferenceModifBase._checkProtection(self)
         RHRoomBookingBase._checkProtection(self)
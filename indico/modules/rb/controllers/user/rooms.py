@@ -32,7 +32,7 @@ from indico.modules.rb.models.reservation_occurrences import ReservationOccurren
 from indico.modules.rb.models.reservations import Reservation
 from indico.modules.rb.models.rooms import Room
 from indico.modules.rb.models.equipment import EquipmentType
-from indico.modules.rb.statistics import calculate_rooms_occupancy, compose_rooms_stats
+from indico.modules.rb.statistics import get_location_stats
 from indico.modules.rb.views.user.rooms import (WPRoomBookingSearchRooms, WPRoomBookingMapOfRooms,
                                                 WPRoomBookingMapOfRoomsWidget, WPRoomBookingRoomDetails,
                                                 WPRoomBookingRoomStats, WPRoomBookingSearchRoomsResults)
@@ -171,10 +171,11 @@ class RHRoomBookingRoomStats(RHRoomBookingBase):
         last_year = str(date.today().year - 1)
         last_month_date = date.today() - relativedelta(months=1, day=1)
         last_month = '{:d}-{:02d}'.format(last_month_date.year, last_month_date.month)
+        stats = get_location_stats(self._room.location, self._start, self._end)[self._room.id]
         return WPRoomBookingRoomStats(self,
                                       room=self._room,
                                       period=self._occupancy_period,
                                       last_year=last_year,
                                       last_month=last_month,
-                                      occupancy=calculate_rooms_occupancy([self._room], self._start, self._end),
-                                      stats=compose_rooms_stats([self._room])).display()
+                                      occupancy=stats['occupancy'],
+                                      stats=stats).display()
@@ -0,0 +1,120 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+
+import textwrap
+
+from sqlalchemy import DDL
+
+from indico.core import signals
+
+
+@signals.db_schema_created.connect_via('roombooking')
+def _create_get_occupancy_slots(sender, connection, **kwargs):
+    sql = textwrap.dedent("""
+        CREATE FUNCTION roombooking.get_occupancy_slots(start_dt timestamp, end_dt timestamp, day date)
+        RETURNS bit(96) AS
+        $BODY$
+        DECLARE
+            first_slot int;
+            last_slot int;
+        BEGIN
+            -- 96 slots of 15 minutes; keep in sync with RoomOccupancy.get_slots
+            first_slot := floor(extract(epoch FROM start_dt - day::timestamp) / 900)::int;
+            first_slot := greatest(0, least(95, first_slot));
+            last_slot := ceil(extract(epoch FROM end_dt - day::timestamp) / 900)::int;
+            last_slot := greatest(first_slot + 1, least(96, last_slot));
+            RETURN (repeat('0', first_slot) ||
+                    repeat('1', last_slot - first_slot) ||
+                    repeat('0', 96 - last_slot))::bit(96);
+        END;
+        $BODY$
+        LANGUAGE plpgsql IMMUTABLE
+    """)
+    DDL(sql).execute(connection)
+
+
+@signals.db_schema_created.connect_via('roombooking')
+def _create_update_room_occupancy(sender, connection, **kwargs):
+    sql = textwrap.dedent("""
+        CREATE FUNCTION roombooking.update_room_occupancy(target_room_id int, day date) RETURNS void AS
+        $BODY$
+        BEGIN
+            -- lock the room so concurrent bookings cannot insert the same row
+            PERFORM 1 FROM roombooking.rooms WHERE id = target_room_id FOR NO KEY UPDATE;
+            DELETE FROM roombooking.room_occupancy WHERE room_id = target_room_id AND date = day;
+            INSERT INTO roombooking.room_occupancy (room_id, date, booked_slots, prebooked_slots)
+            SELECT target_room_id, day,
+                   coalesce(bit_or(slots) FILTER (WHERE is_accepted), repeat('0', 96)::bit(96)),
+                   coalesce(bit_or(slots) FILTER (WHERE NOT is_accepted), repeat('0', 96)::bit(96))
+            FROM (
+                SELECT r.is_accepted, roombooking.get_occupancy_slots(occ.start_dt, occ.end_dt, day) AS slots
+                FROM roombooking.reservation_occurrences occ
+                JOIN roombooking.reservations r ON (r.id = occ.reservation_id)
+                WHERE r.room_id = target_room_id AND
+                      occ.start_dt >= day AND occ.start_dt < day + 1 AND
+                      NOT occ.is_cancelled AND NOT occ.is_rejected
+            ) occupancy
+            HAVING count(*) > 0;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    """)
+    DDL(sql).execute(connection)
+
+
+@signals.db_schema_created.connect_via('roombooking')
+def _create_occurrence_occupancy_changed(sender, connection, **kwargs):
+    sql = textwrap.dedent("""
+        CREATE FUNCTION roombooking.occurrence_occupancy_changed() RETURNS trigger AS
+        $BODY$
+        BEGIN
+            IF TG_OP != 'INSERT' THEN
+                PERFORM roombooking.update_room_occupancy(r.room_id, OLD.start_dt::date)
+                FROM roombooking.reservations r
+                WHERE r.id = OLD.reservation_id;
+            END IF;
+            IF TG_OP != 'DELETE' THEN
+                PERFORM roombooking.update_room_occupancy(r.room_id, NEW.start_dt::date)
+                FROM roombooking.reservations r
+                WHERE r.id = NEW.reservation_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    """)
+    DDL(sql).execute(connection)
+
+
+@signals.db_schema_created.connect_via('roombooking')
+def _create_reservation_occupancy_changed(sender, connection, **kwargs):
+    sql = textwrap.dedent("""
+        CREATE FUNCTION roombooking.reservation_occupancy_changed() RETURNS trigger AS
+        $BODY$
+        BEGIN
+            PERFORM roombooking.update_room_occupancy(rooms.room_id, days.day)
+            FROM (SELECT DISTINCT unnest(ARRAY[OLD.room_id, NEW.room_id]) AS room_id) rooms,
+                 (SELECT DISTINCT start_dt::date AS day
+                  FROM roombooking.reservation_occurrences
+                  WHERE reservation_id = NEW.id) days;
+            RETURN NULL;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    """)
+    DDL(sql).execute(connection)
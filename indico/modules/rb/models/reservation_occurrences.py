@@ -14,11 +14,13 @@
 # You should have received a copy of the GNU General Public License
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 from math import ceil
 
 from dateutil import rrule
-from sqlalchemy import Date, or_, func
+from sqlalchemy import DDL, Date, Time, or_, func
+from sqlalchemy.event import listens_for
+from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
 from sqlalchemy.orm import defaultload
 from sqlalchemy.sql import cast
@@ -29,7 +31,7 @@ from indico.core.errors import IndicoError
 from indico.modules.rb.models.reservation_edit_logs import ReservationEditLog
 from indico.modules.rb.models.util import proxy_to_reservation_if_last_valid_occurrence
 from indico.util import date_time
-from indico.util.date_time import iterdays, format_date
+from indico.util.date_time import format_date
 from indico.util.serializer import Serializer
 from indico.util.string import return_ascii
 from indico.util.user import unify_user_args
@@ -37,9 +39,14 @@ from indico.util.user import unify_user_args
 
 class ReservationOccurrence(db.Model, Serializer):
     __tablename__ = 'reservation_occurrences'
-    __table_args__ = {'schema': 'roombooking'}
     __api_public__ = (('start_dt', 'startDT'), ('end_dt', 'endDT'), 'is_cancelled', 'is_rejected')
 
+    @declared_attr
+    def __table_args__(cls):
+        return (db.Index('ix_reservation_occurrences_start_dt_time', cast(cls.start_dt, Time)),
+                db.Index('ix_reservation_occurrences_end_dt_time', cast(cls.end_dt, Time)),
+                {'schema': 'roombooking'})
+
     #: A relationship loading strategy that will avoid loading the
     #: users linked to a reservation.  You want to use this in pretty
     #: much all cases where you eager-load the `reservation` relationship.
@@ -168,6 +175,24 @@ class ReservationOccurrence(db.Model, Serializer):
         return or_(db_dates_overlap(ReservationOccurrence, 'start_dt', occ.start_dt, 'end_dt', occ.end_dt)
                    for occ in occurrences)
 
+    @classmethod
+    def filter_time_window(cls, start_dt, end_dt):
+        """Get a criterion for occurrences overlapping with a daily time window.
+
+        An occurrence matches if it overlaps with the time between
+        the times of `start_dt` and `end_dt` on any day between their
+        dates.  Since occurrences never span more than one day, this
+        can be checked using the date range and the time of the day
+        instead of one overlap check for each day.
+
+        :param start_dt: The first day and the start of the time window.
+        :param end_dt: The last day and the end of the time window.
+        """
+        return ((cls.start_dt >= datetime.combine(start_dt.date(), time(0))) &
+                (cls.start_dt < datetime.combine(end_dt.date() + timedelta(days=1), time(0))) &
+                (cast(cls.start_dt, Time) < end_dt.time()) &
+                (cast(cls.end_dt, Time) > start_dt.time()))
+
     @classmethod
     def find_overlapping_with(cls, room, occurrences, skip_reservation_id=None):
         from indico.modules.rb.models.reservations import Reservation
@@ -192,15 +217,7 @@ class ReservationOccurrence(db.Model, Serializer):
              .options(cls.NO_RESERVATION_USER_STRATEGY))
 
         if 'start_dt' in filters and 'end_dt' in filters:
-            start_dt = filters['start_dt']
-            end_dt = filters['end_dt']
-            criteria = []
-            # We have to check the time range for EACH DAY
-            for day_start_dt in iterdays(start_dt, end_dt):
-                # Same date, but the end time
-                day_end_dt = datetime.combine(day_start_dt.date(), end_dt.time())
-                criteria.append(db_dates_overlap(ReservationOccurrence, 'start_dt', day_start_dt, 'end_dt', day_end_dt))
-            q = q.filter(or_(*criteria))
+            q = q.filter(cls.filter_time_window(filters['start_dt'], filters['end_dt']))
 
         if filters.get('is_only_mine') and user:
             q = q.filter((Reservation.booked_for_id == user.id) | (Reservation.created_by_id == user.id))
@@ -308,3 +325,15 @@ class ReservationOccurrence(db.Model, Serializer):
             return (days_until_occurrence < notification_window) & ~in_the_past
         else:
             return (days_until_occurrence <= notification_window) & ~in_the_past
+
+
+@listens_for(ReservationOccurrence.__table__, 'after_create')
+def _add_occupancy_trigger(target, conn, **kw):
+    sql = """
+        CREATE TRIGGER update_occupancy
+        AFTER INSERT OR DELETE OR UPDATE OF reservation_id, start_dt, end_dt, is_cancelled, is_rejected
+        ON {table}
+        FOR EACH ROW
+        EXECUTE PROCEDURE roombooking.occurrence_occupancy_changed();
+    """.format(table=target.fullname)
+    DDL(sql).execute(conn)
@@ -14,13 +14,19 @@
 # You should have received a copy of the GNU General Public License
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 
-from datetime import date, time, datetime
+import os
+import random
+import timeit
+from datetime import date, time, datetime, timedelta
 from itertools import izip
 
 import pytest
 from dateutil.relativedelta import relativedelta
+from sqlalchemy import or_
 
+from indico.core.db.sqlalchemy.util.queries import db_dates_overlap
 from indico.core.errors import IndicoError
+from indico.modules.rb import logger
 from indico.modules.rb.models.reservations import RepeatFrequency
 from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
 from indico.testing.util import bool_matrix, extract_emails
@@ -258,9 +264,66 @@ def test_find_overlapping_with_skip_reservation(overlapping_occurrences):
                                                                      skip_reservation_id=db_occ.reservation.id).all()
 
 
-@pytest.mark.xfail
-def test_find_with_filters():
-    raise NotImplementedError
+def _filter_time_window_per_day(start_dt, end_dt):
+    # the straightforward way to check a daily time window, with one overlap check per day
+    days = (start_dt.date() + timedelta(days=n) for n in xrange((end_dt.date() - start_dt.date()).days + 1))
+    return or_(db_dates_overlap(ReservationOccurrence, 'start_dt', datetime.combine(day, start_dt.time()),
+                                'end_dt', datetime.combine(day, end_dt.time()))
+               for day in days)
+
+
+@pytest.mark.parametrize(('start_time', 'end_time'), (
+    (time(0), time(23, 59)),
+    (time(8), time(10)),
+    (time(9, 30), time(9, 45)),
+    (time(10), time(12)),
+    (time(17, 30), time(20)),
+))
+def test_find_with_filters_time_window(create_reservation, create_room, start_time, end_time):
+    start = date.today()
+    end = start + relativedelta(days=6)
+    create_reservation(start_dt=datetime.combine(start, time(8)), end_dt=datetime.combine(end, time(10)),
+                       repeat_frequency=RepeatFrequency.DAY)
+    create_reservation(start_dt=datetime.combine(start, time(9, 45)), end_dt=datetime.combine(end, time(17, 30)),
+                       repeat_frequency=RepeatFrequency.WEEK, room=create_room())
+    create_reservation(start_dt=datetime.combine(start - relativedelta(days=1), time(12)),
+                       end_dt=datetime.combine(start - relativedelta(days=1), time(13)))
+    start_dt = datetime.combine(start, start_time)
+    end_dt = datetime.combine(end, end_time)
+    expected = set(ReservationOccurrence.find_with_filters({}).filter(_filter_time_window_per_day(start_dt, end_dt)))
+    assert set(ReservationOccurrence.find_with_filters({'start_dt': start_dt, 'end_dt': end_dt})) == expected
+
+
+@pytest.mark.skipif(not os.environ.get('INDICO_RB_BENCHMARK'), reason='set INDICO_RB_BENCHMARK=1 to run benchmarks')
+def test_find_with_filters_time_window_benchmark(db, create_reservation):
+    start = date.today()
+    rng = random.Random(42)
+    reservation = create_reservation()
+    rows = []
+    for day in xrange(730):
+        for n in xrange(100):
+            start_dt = datetime.combine(start + timedelta(days=day + 1), time(rng.randint(6, 19), rng.choice((0, 30))))
+            rows.append({'reservation_id': reservation.id,
+                         'start_dt': start_dt + timedelta(seconds=n),
+                         'end_dt': start_dt + timedelta(minutes=rng.choice((30, 60, 90, 120)))})
+    db.session.execute(ReservationOccurrence.__table__.insert(), rows)
+    db.session.execute('ANALYZE roombooking.reservation_occurrences')
+    start_dt = datetime.combine(start + timedelta(days=30), time(9))
+    end_dt = datetime.combine(start + timedelta(days=210), time(11))
+    per_day_query = (ReservationOccurrence.find_with_filters({})
+                     .filter(_filter_time_window_per_day(start_dt, end_dt)))
+    query = ReservationOccurrence.find_with_filters({'start_dt': start_dt, 'end_dt': end_dt})
+    timings = {}
+    results = {}
+    for name, q in (('per-day', per_day_query), ('single-pass', query)):
+        begin = timeit.default_timer()
+        results[name] = {(occ.reservation_id, occ.start_dt) for occ in q}
+        timings[name] = timeit.default_timer() - begin
+        db.session.expunge_all()
+    logger.info('%d occurrences, %d matching; per-day: %.3fs, single-pass: %.3fs', len(rows),
+                len(results['single-pass']), timings['per-day'], timings['single-pass'])
+    assert results['per-day'] == results['single-pass']
+    assert timings['single-pass'] < timings['per-day']
 
 
 # ======================================================================================================================
@@ -17,7 +17,7 @@
 from collections import defaultdict, OrderedDict
 from datetime import datetime, date
 
-from sqlalchemy import Date, Time
+from sqlalchemy import Date, Time, DDL
 from sqlalchemy.event import listens_for
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -761,3 +761,16 @@ class Reservation(Serializer, db.Model):
 @listens_for(Reservation.booked_for_user, 'set')
 def _booked_for_user_set(target, user, *unused):
     target.booked_for_name = user.full_name if user else ''
+
+
+@listens_for(Reservation.__table__, 'after_create')
+def _add_occupancy_trigger(target, conn, **kw):
+    sql = """
+        CREATE TRIGGER update_occupancy
+        AFTER UPDATE OF room_id, is_accepted
+        ON {table}
+        FOR EACH ROW
+        WHEN (OLD.room_id != NEW.room_id OR OLD.is_accepted != NEW.is_accepted)
+        EXECUTE PROCEDURE roombooking.reservation_occupancy_changed();
+    """.format(table=target.fullname)
+    DDL(sql).execute(conn)
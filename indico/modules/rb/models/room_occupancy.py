@@ -0,0 +1,122 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from datetime import datetime
+from math import ceil
+
+from sqlalchemy.dialects.postgresql import BIT
+
+from indico.core.db import db
+from indico.util.string import return_ascii
+
+
+#: The length of a slot in the occupancy bitmaps
+SLOT_MINUTES = 15
+#: The number of slots in a day
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+
+def _slots_type():
+    return BIT(SLOTS_PER_DAY)
+
+
+class RoomOccupancy(db.Model):
+    """The time slots in which a room is occupied on a given day.
+
+    This is an index of the valid reservation occurrences which is
+    kept up to date by database triggers whenever occurrences are
+    created, modified, cancelled or rejected.  Each day is split into
+    slots of `SLOT_MINUTES` minutes and every slot overlapping with an
+    occurrence is set in the bitmap, so checking whether a room is
+    available only needs a bitwise AND per day.
+
+    Since occurrences do not need to be aligned to the slots, the
+    bitmaps may report a conflict where there is none, but they never
+    miss one.
+    """
+
+    __tablename__ = 'room_occupancy'
+    __table_args__ = {'schema': 'roombooking'}
+
+    room_id = db.Column(
+        db.Integer,
+        db.ForeignKey('roombooking.rooms.id', ondelete='CASCADE'),
+        primary_key=True,
+        nullable=False
+    )
+    date = db.Column(
+        db.Date,
+        primary_key=True,
+        nullable=False
+    )
+    #: The slots occupied by accepted bookings
+    booked_slots = db.Column(
+        _slots_type(),
+        nullable=False
+    )
+    #: The slots occupied by pre-bookings
+    prebooked_slots = db.Column(
+        _slots_type(),
+        nullable=False
+    )
+
+    @return_ascii
+    def __repr__(self):
+        return '<RoomOccupancy({}, {}, {}, {})>'.format(self.room_id, self.date, self.booked_slots.count('1'),
+                                                        self.prebooked_slots.count('1'))
+
+    @staticmethod
+    def get_slots(start_dt, end_dt):
+        """Get the bitmap of the slots overlapping with a time range.
+
+        The time range is expected to start and end on the same day;
+        anything after the end of that day is ignored.  This needs to
+        match the ``roombooking.get_occupancy_slots`` SQL function
+        which is used to populate the bitmaps.
+
+        :param start_dt: The start of the time range.
+        :param end_dt: The end of the time range.
+        :return: A string containing one ``0`` or ``1`` per slot.
+        """
+        day_start = datetime.combine(start_dt.date(), datetime.min.time())
+        slot_seconds = SLOT_MINUTES * 60
+        first = max(0, min(SLOTS_PER_DAY - 1, int((start_dt - day_start).total_seconds() // slot_seconds)))
+        last = max(first + 1, min(SLOTS_PER_DAY, int(ceil((end_dt - day_start).total_seconds() / slot_seconds))))
+        return '0' * first + '1' * (last - first) + '0' * (SLOTS_PER_DAY - last)
+
+    @classmethod
+    def filter_overlap(cls, occurrences, include_pre_bookings=True):
+        """Get a criterion matching the occupancy overlapping with occurrences.
+
+        Days which use the same slots are grouped so the criterion
+        does not grow with the number of occurrences when checking
+        a repeating booking.
+
+        :param occurrences: The :class:`.ReservationOccurrence` objects
+                            to check.
+        :param include_pre_bookings: Whether pre-bookings should be
+                                     taken into account.
+        """
+        days_by_slots = defaultdict(set)
+        for occ in occurrences:
+            days_by_slots[cls.get_slots(occ.start_dt, occ.end_dt)].add(occ.start_dt.date())
+        slots_col = cls.booked_slots.op('|')(cls.prebooked_slots) if include_pre_bookings else cls.booked_slots
+        empty = db.cast('0' * SLOTS_PER_DAY, _slots_type())
+        return db.or_(cls.date.in_(days) & (slots_col.op('&')(db.cast(slots, _slots_type())) != empty)
+                      for slots, days in days_by_slots.iteritems())
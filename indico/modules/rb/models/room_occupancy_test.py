@@ -0,0 +1,78 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from datetime import date, datetime, time
+
+import pytest
+
+from indico.modules.rb.models.reservations import RepeatFrequency
+from indico.modules.rb.models.room_occupancy import RoomOccupancy, SLOTS_PER_DAY
+from indico.modules.rb.models.rooms import Room
+
+
+pytest_plugins = 'indico.modules.rb.testing.fixtures'
+
+
+def _slots(first, last):
+    return '0' * first + '1' * (last - first) + '0' * (SLOTS_PER_DAY - last)
+
+
+@pytest.mark.parametrize(('start', 'end', 'expected'), (
+    (time(0), time(23, 59), _slots(0, 96)),
+    (time(8), time(10), _slots(32, 40)),
+    (time(8, 5), time(10, 1), _slots(32, 41)),
+    (time(8, 14, 59), time(8, 15), _slots(32, 33)),
+    (time(8), time(8), _slots(32, 33)),
+    (time(23, 50), time(23, 59, 59), _slots(95, 96)),
+))
+def test_get_slots(start, end, expected):
+    day = date(2016, 8, 22)
+    assert RoomOccupancy.get_slots(datetime.combine(day, start), datetime.combine(day, end)) == expected
+
+
+def test_occupancy_updated(db, dummy_room, create_reservation):
+    today = date.today()
+    reservation = create_reservation(start_dt=datetime.combine(today, time(8)),
+                                     end_dt=datetime.combine(today, time(10)))
+    occupancy = RoomOccupancy.query.filter_by(room_id=dummy_room.id).all()
+    assert [(o.date, o.booked_slots, o.prebooked_slots) for o in occupancy] == [(today, _slots(32, 40),
+                                                                               _slots(0, 0))]
+    reservation.is_accepted = False
+    db.session.flush()
+    db.session.expire_all()
+    occupancy = RoomOccupancy.query.filter_by(room_id=dummy_room.id).one()
+    assert occupancy.booked_slots == _slots(0, 0)
+    assert occupancy.prebooked_slots == _slots(32, 40)
+    reservation.occurrences.one().is_cancelled = True
+    db.session.flush()
+    assert not RoomOccupancy.query.filter_by(room_id=dummy_room.id).count()
+
+
+@pytest.mark.parametrize(('start', 'end', 'available'), (
+    (time(7), time(8), True),
+    (time(7), time(8, 1), False),
+    (time(10, 5), time(10, 10), True),
+    (time(10, 5), time(12), False),
+))
+def test_filter_available_repeating(dummy_room, create_reservation, start, end, available):
+    today = date.today()
+    create_reservation(start_dt=datetime.combine(today, time(8)),
+                       end_dt=datetime.combine(date(today.year + 1, today.month, 1), time(10, 1)),
+                       repeat_frequency=RepeatFrequency.WEEK)
+    availability_filter = Room.filter_available(datetime.combine(today, start),
+                                                datetime.combine(date(today.year + 1, today.month, 1), end),
+                                                (RepeatFrequency.WEEK, 1))
+    assert set(Room.find_all(availability_filter)) == ({dummy_room} if available else set())
@@ -18,7 +18,7 @@ import ast
 import json
 from datetime import date
 
-from sqlalchemy import and_, func, or_, cast, Date
+from sqlalchemy import and_, func, or_, cast, exists, Date
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
 from sqlalchemy.orm import contains_eager
 
@@ -40,6 +40,7 @@ from indico.modules.rb.models.room_attributes import RoomAttribute, RoomAttribut
 from indico.modules.rb.models.room_bookable_hours import BookableHours
 from indico.modules.rb.models.equipment import EquipmentType, RoomEquipmentAssociation
 from indico.modules.rb.models.room_nonbookable_periods import NonBookablePeriod
+from indico.modules.rb.models.room_occupancy import RoomOccupancy
 from indico.util.date_time import round_up_month
 from indico.util.decorators import classproperty
 from indico.util.i18n import _
@@ -307,13 +308,19 @@ class Room(versioned_cache(_cache, 'id'), db.Model, Serializer):
     def has_photo(self):
         return self.photo_id is not None
 
-    @property
+    @hybrid_property
     def full_name(self):
         if self.has_special_name:
             return u'{} - {}'.format(self.generate_name(), self.name)
         else:
             return u'{}'.format(self.generate_name())
 
+    @full_name.expression
+    def full_name(cls):
+        generated_name = cls.building + '-' + cls.floor + '-' + cls.number
+        return db.case([((cls.name != '') & (cls.name != generated_name), generated_name + ' - ' + cls.name)],
+                       else_=generated_name)
+
     @property
     def has_special_name(self):
         return self.name and self.name != self.generate_name()
@@ -531,13 +538,18 @@ class Room(versioned_cache(_cache, 'id'), db.Model, Serializer):
         """Returns a SQLAlchemy filter criterion ensuring that the room is available during the given time."""
         # Check availability against reservation occurrences
         dummy_occurrences = ReservationOccurrence.create_series(start_dt, end_dt, repetition)
+        # The occupancy bitmaps quickly rule out most rooms; only the rooms which may
+        # be occupied need to be checked against the actual occurrences
+        occupancy_filter = exists().where(and_(RoomOccupancy.room_id == Room.id,
+                                               RoomOccupancy.filter_overlap(dummy_occurrences,
+                                                                            include_pre_bookings)))
         overlap_criteria = ReservationOccurrence.filter_overlap(dummy_occurrences)
         reservation_criteria = [Reservation.room_id == Room.id,
                                 ReservationOccurrence.is_valid,
                                 overlap_criteria]
         if not include_pre_bookings:
             reservation_criteria.append(Reservation.is_accepted)
-        occurrences_filter = Reservation.occurrences.any(and_(*reservation_criteria))
+        occurrences_filter = occupancy_filter & Reservation.occurrences.any(and_(*reservation_criteria))
         # Check availability against blockings
         if include_pending_blockings:
             valid_states = (BlockedRoom.State.accepted, BlockedRoom.State.pending)
@@ -98,9 +98,11 @@ def test_has_photo(db, dummy_room):
     (u'1', u'2', u'3', u'Test',   u'1-2-3 - Test'),
     (u'1', u'2', u'3', u'm\xf6p', u'1-2-3 - m\xf6p')
 ))
-def test_full_name(create_room, building, floor, number, name, expected_name):
+def test_full_name(db, create_room, building, floor, number, name, expected_name):
     room = create_room(building=building, floor=floor, number=number, name=name)
     assert room.full_name == expected_name
+    db.session.flush()
+    assert Room.query.filter_by(id=room.id).with_entities(Room.full_name).scalar() == expected_name
 
 
 @pytest.mark.parametrize(('name', 'expected'), (
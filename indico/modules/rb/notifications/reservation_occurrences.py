@@ -73,6 +73,10 @@ def notify_rejection(occurrence):
 
 @email_sender
 def notify_upcoming_occurrence(occurrence):
+    return make_upcoming_occurrence_email(occurrence)
+
+
+def make_upcoming_occurrence_email(occurrence):
     if occurrence.start_dt.date() < date.today():
         raise ValueError("This reservation occurrence started in the past")
 
@@ -99,6 +103,10 @@ def notify_upcoming_occurrence(occurrence):
 
 @email_sender
 def notify_reservation_digest(reservation, occurrences):
+    return make_reservation_digest_email(reservation, occurrences)
+
+
+def make_reservation_digest_email(reservation, occurrences):
     if not occurrences:
         return
     if reservation.end_dt.date() < date.today():
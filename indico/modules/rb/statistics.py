@@ -1,10 +1,13 @@
 from __future__ import division
 
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 
 from dateutil.relativedelta import relativedelta
 from sqlalchemy import func, extract, cast, TIME
 
+from MaKaC.common.cache import GenericCache
+from indico.core.db import db
 from indico.core.db.sqlalchemy.custom import greatest, least
 from indico.util.date_time import iterdays
 from indico.modules.rb.models.locations import Location
@@ -12,35 +15,157 @@ from indico.modules.rb.models.reservations import Reservation
 from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
 
 
-def calculate_rooms_bookable_time(rooms, start_date=None, end_date=None):
+_cache = GenericCache('RoomStats')
+_BOOKING_STATES = {'valid': Reservation.is_valid,
+                   'pending': Reservation.is_pending,
+                   'cancelled': Reservation.is_cancelled,
+                   'rejected': Reservation.is_rejected}
+
+
+def _get_period(start_date, end_date):
     if end_date is None:
         end_date = date.today() - relativedelta(days=1)
     if start_date is None:
         start_date = end_date - relativedelta(days=29)
+    return start_date, end_date
+
+
+def _calculate_room_bookable_time(start_date, end_date):
     working_time_start = datetime.combine(date.today(), Location.working_time_start)
     working_time_end = datetime.combine(date.today(), Location.working_time_end)
     working_time_per_day = (working_time_end - working_time_start).seconds
     working_days = sum(1 for __ in iterdays(start_date, end_date, skip_weekends=True))
-    return working_days * working_time_per_day * len(rooms)
+    return working_days * working_time_per_day
+
+
+def calculate_rooms_bookable_time(rooms, start_date=None, end_date=None):
+    start_date, end_date = _get_period(start_date, end_date)
+    return _calculate_room_bookable_time(start_date, end_date) * len(rooms)
 
 
 def calculate_rooms_booked_time(rooms, start_date=None, end_date=None):
-    if end_date is None:
-        end_date = date.today() - relativedelta(days=1)
-    if start_date is None:
-        start_date = end_date - relativedelta(days=29)
-    # Reservations on working days
-    reservations = Reservation.find(Reservation.room_id.in_(r.id for r in rooms),
-                                    extract('dow', ReservationOccurrence.start_dt).between(1, 5),
-                                    ReservationOccurrence.start_dt >= start_date,
-                                    ReservationOccurrence.end_dt <= end_date,
-                                    ReservationOccurrence.is_valid,
-                                    _join=ReservationOccurrence)
+    return sum(get_rooms_booked_time(rooms, start_date, end_date).itervalues())
+
+
+def get_rooms_booked_time(rooms, start_date=None, end_date=None, breakdown=None):
+    """Calculate the time the rooms are booked during working hours.
+
+    All rooms are handled in a single query.
+
+    :param rooms: The rooms to check.
+    :param start_date: The first day to take into account.  Defaults
+                       to 30 days before `end_date`.
+    :param end_date: The last day to take into account.  Defaults to
+                     yesterday.
+    :param breakdown: ``'day'`` or ``'week'`` to get the booked time
+                      for each day/week instead of the whole period.
+    :return: A dict mapping room ids to the number of seconds the room
+             was booked.  If a breakdown is requested, the values are
+             dicts mapping the first day of each day/week to the number
+             of seconds instead.
+    """
+    if breakdown not in {None, 'day', 'week'}:
+        raise ValueError('Invalid breakdown: {}'.format(breakdown))
+    start_date, end_date = _get_period(start_date, end_date)
+    room_ids = {r.id for r in rooms}
+    if not room_ids:
+        return {}
     # Take into account only working hours
     earliest_time = greatest(cast(ReservationOccurrence.start_dt, TIME), Location.working_time_start)
     latest_time = least(cast(ReservationOccurrence.end_dt, TIME), Location.working_time_end)
-    booked_time = reservations.with_entities(func.sum(latest_time - earliest_time)).scalar()
-    return (booked_time or timedelta()).total_seconds()
+    columns = [Reservation.room_id, func.sum(latest_time - earliest_time)]
+    if breakdown:
+        # inline the unit so postgres knows the grouped column is the selected one
+        columns.insert(1, func.date_trunc(db.literal_column("'{}'".format(breakdown)), ReservationOccurrence.start_dt))
+    # Reservations on working days
+    query = (db.session.query(*columns)
+             .join(ReservationOccurrence)
+             .filter(Reservation.room_id.in_(room_ids),
+                     extract('dow', ReservationOccurrence.start_dt).between(1, 5),
+                     ReservationOccurrence.start_dt >= start_date,
+                     ReservationOccurrence.end_dt <= end_date,
+                     ReservationOccurrence.is_valid)
+             .group_by(*columns[:-1]))
+    if not breakdown:
+        return {room_id: (booked_time or timedelta()).total_seconds() for room_id, booked_time in query}
+    result = defaultdict(dict)
+    for room_id, period_start, booked_time in query:
+        result[room_id][period_start.date()] = (booked_time or timedelta()).total_seconds()
+    return dict(result)
+
+
+def get_rooms_booking_counts(rooms):
+    """Count the bookings of each room by their state.
+
+    All rooms are handled in a single query.
+
+    :param rooms: The rooms to check.
+    :return: A dict mapping room ids to dicts containing the number of
+             ``valid``, ``pending``, ``cancelled`` and ``rejected``
+             bookings, separately for ``active`` and ``archived`` ones.
+    """
+    room_ids = {r.id for r in rooms}
+    if not room_ids:
+        return {}
+    states = sorted(_BOOKING_STATES)
+    query = (db.session.query(Reservation.room_id, Reservation.is_archived,
+                              *(func.count().filter(_BOOKING_STATES[state]) for state in states))
+             .filter(Reservation.room_id.in_(room_ids))
+             .group_by(Reservation.room_id, Reservation.is_archived))
+    result = {room_id: {'active': dict.fromkeys(states, 0), 'archived': dict.fromkeys(states, 0)}
+              for room_id in room_ids}
+    for row in query:
+        room_id, is_archived, counts = row[0], row[1], row[2:]
+        result[room_id]['archived' if is_archived else 'active'] = dict(zip(states, counts))
+    return result
+
+
+def get_rooms_stats(rooms, start_date=None, end_date=None, breakdown=None):
+    """Calculate the occupancy and booking statistics of many rooms.
+
+    :param rooms: The rooms to check.
+    :param start_date: The first day used for the occupancy.  Defaults
+                       to 30 days before `end_date`.
+    :param end_date: The last day used for the occupancy.  Defaults to
+                     yesterday.
+    :param breakdown: ``'day'`` or ``'week'`` to include the booked time
+                      for each day/week of the period.
+    :return: A dict mapping room ids to dicts containing the
+             ``occupancy``, ``booked_time``, ``bookable_time`` and
+             the booking counts from :func:`get_rooms_booking_counts`.
+    """
+    start_date, end_date = _get_period(start_date, end_date)
+    bookable_time = _calculate_room_bookable_time(start_date, end_date)
+    booked_times = get_rooms_booked_time(rooms, start_date, end_date, breakdown=breakdown)
+    counts = get_rooms_booking_counts(rooms)
+    result = {}
+    for room in rooms:
+        booked_time = booked_times.get(room.id, {} if breakdown else 0)
+        total_booked_time = sum(booked_time.itervalues()) if breakdown else booked_time
+        result[room.id] = dict(counts[room.id],
+                               booked_time=total_booked_time,
+                               bookable_time=bookable_time,
+                               occupancy=(total_booked_time / bookable_time if bookable_time else 0))
+        if breakdown:
+            result[room.id]['breakdown'] = booked_time
+    return result
+
+
+def get_location_stats(location, start_date=None, end_date=None):
+    """Get the statistics of all rooms in a location.
+
+    The statistics are cached for each location and period.
+
+    :return: A dict mapping room ids to the statistics as returned
+             by :func:`get_rooms_stats`.
+    """
+    start_date, end_date = _get_period(start_date, end_date)
+    key = '{}-{}-{}'.format(location.id, start_date.isoformat(), end_date.isoformat())
+    stats = _cache.get(key)
+    if stats is None:
+        stats = get_rooms_stats(location.rooms, start_date, end_date)
+        _cache.set(key, stats, 900)
+    return stats
 
 
 def calculate_rooms_occupancy(rooms, start=None, end=None):
@@ -50,18 +175,25 @@ def calculate_rooms_occupancy(rooms, start=None, end=None):
 
 
 def compose_rooms_stats(rooms):
-    reservations = Reservation.find(Reservation.room_id.in_(r.id for r in rooms))
-    return {
-        'active': {
-            'valid': reservations.filter(Reservation.is_valid, ~Reservation.is_archived).count(),
-            'pending': reservations.filter(Reservation.is_pending, ~Reservation.is_archived).count(),
-            'cancelled': reservations.filter(Reservation.is_cancelled, ~Reservation.is_archived).count(),
-            'rejected': reservations.filter(Reservation.is_rejected, ~Reservation.is_archived).count(),
-        },
-        'archived': {
-            'valid': reservations.filter(Reservation.is_valid, Reservation.is_archived).count(),
-            'pending': reservations.filter(Reservation.is_pending, Reservation.is_archived).count(),
-            'cancelled': reservations.filter(Reservation.is_cancelled, Reservation.is_archived).count(),
-            'rejected': reservations.filter(Reservation.is_rejected, Reservation.is_archived).count()
-        }
-    }
+    return sum_rooms_stats(get_rooms_booking_counts(rooms).itervalues())
+
+
+def sum_rooms_stats(stats):
+    """Add up the booking counts of several rooms"""
+    result = {'active': dict.fromkeys(_BOOKING_STATES, 0), 'archived': dict.fromkeys(_BOOKING_STATES, 0)}
+    for room_stats in stats:
+        for group in ('active', 'archived'):
+            for state, count in room_stats[group].iteritems():
+                result[group][state] += count
+    return result
+
+
+def calculate_total_occupancy(stats):
+    """Calculate the combined occupancy of several rooms
+
+    :param stats: Room statistics as returned by :func:`get_rooms_stats`.
+    """
+    stats = list(stats)
+    bookable_time = sum(room_stats['bookable_time'] for room_stats in stats)
+    booked_time = sum(room_stats['booked_time'] for room_stats in stats)
+    return booked_time / bookable_time if bookable_time else 0
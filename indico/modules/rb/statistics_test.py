@@ -0,0 +1,50 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from datetime import date, datetime, time
+
+from dateutil.relativedelta import relativedelta, MO
+
+from indico.modules.rb.models.reservations import RepeatFrequency
+from indico.modules.rb.statistics import (calculate_rooms_occupancy, calculate_total_occupancy, compose_rooms_stats,
+                                          get_rooms_stats, sum_rooms_stats)
+
+
+pytest_plugins = 'indico.modules.rb.testing.fixtures'
+
+
+def test_get_rooms_stats(create_reservation, create_room, dummy_room):
+    other_room = create_room()
+    empty_room = create_room()
+    monday = date.today() + relativedelta(weeks=-2, weekday=MO(-1))
+    # booked from 8:30 (start of the working time) to 11:00 on 5 working days
+    create_reservation(start_dt=datetime.combine(monday, time(7)),
+                       end_dt=datetime.combine(monday + relativedelta(days=6), time(11)),
+                       repeat_frequency=RepeatFrequency.DAY)
+    create_reservation(start_dt=datetime.combine(monday, time(12)), end_dt=datetime.combine(monday, time(13)),
+                       room=other_room, is_accepted=False)
+    rooms = [dummy_room, other_room, empty_room]
+    stats = get_rooms_stats(rooms, breakdown='week')
+    assert stats[dummy_room.id]['booked_time'] == 5 * 2.5 * 3600
+    assert stats[dummy_room.id]['breakdown'] == {monday: 5 * 2.5 * 3600}
+    assert stats[dummy_room.id]['archived'] == {'valid': 1, 'pending': 0, 'cancelled': 0, 'rejected': 0}
+    assert stats[other_room.id]['booked_time'] == 3600
+    assert stats[other_room.id]['archived'] == {'valid': 0, 'pending': 1, 'cancelled': 0, 'rejected': 0}
+    assert stats[empty_room.id]['booked_time'] == 0
+    assert stats[empty_room.id]['archived'] == {'valid': 0, 'pending': 0, 'cancelled': 0, 'rejected': 0}
+    # the combined stats must match the ones calculated for all rooms at once
+    assert calculate_total_occupancy(stats.itervalues()) == calculate_rooms_occupancy(rooms)
+    assert sum_rooms_stats(stats.itervalues()) == compose_rooms_stats(rooms)
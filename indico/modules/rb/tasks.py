@@ -18,18 +18,27 @@ from collections import defaultdict
 from datetime import datetime, date
 
 from celery.schedules import crontab
+from sqlalchemy.orm import contains_eager
 
 from indico.core.celery import celery
 from indico.core.config import Config
 from indico.core.db import db
+from indico.core.notifications import send_emails_in_bulk
 from indico.modules.rb import settings as rb_settings
 from indico.modules.rb import logger
 from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
 from indico.modules.rb.models.reservations import Reservation, RepeatFrequency
 from indico.modules.rb.models.rooms import Room
-from indico.modules.rb.notifications.reservation_occurrences import (notify_upcoming_occurrence,
-                                                                     notify_reservation_digest)
+from indico.modules.rb.notifications.reservation_occurrences import (make_upcoming_occurrence_email,
+                                                                     make_reservation_digest_email)
 from indico.util.date_time import get_month_end, round_up_month
+from indico.util.struct.iterables import grouper
+
+
+#: The number of notifications which are marked as sent with a single query
+_BATCH_SIZE = 500
+#: Load everything needed to render the notifications together with the occurrences
+_NOTIFICATION_STRATEGY = contains_eager('reservation').contains_eager('room').joinedload('owner')
 
 
 def _build_notification_window_filter():
@@ -50,7 +59,16 @@ def _build_digest_window_filter():
         return Room.is_in_digest_window(exclude_first_day=True)
 
 
-@celery.periodic_task(name='roombooking_occurrences_digest', run_every=crontab(minute='15', hour='8'))
+def _mark_notifications_sent(occurrences):
+    keys = [(occ.reservation_id, occ.start_dt) for occ in occurrences]
+    if not keys:
+        return
+    ReservationOccurrence.query.filter(db.tuple_(ReservationOccurrence.reservation_id,
+                                                 ReservationOccurrence.start_dt).in_(keys)) \
+                               .update({'notification_sent': True}, synchronize_session=False)
+
+
+@celery.periodic_task(name='roombooking_occurrences_digest', run_every=crontab(minute='45', hour='8'))
 def roombooking_occurrences_digest():
     if not Config.getInstance().getIsRoomBookingActive():
         logger.info('Digest not sent because room booking is disabled')
@@ -73,19 +91,20 @@ def roombooking_occurrences_digest():
         ~ReservationOccurrence.notification_sent,
         _build_digest_window_filter(),
         _join=[Reservation, Room]
-    )
+    ).options(_NOTIFICATION_STRATEGY)
 
     digests = defaultdict(list)
     for occurrence in occurrences:
         digests[occurrence.reservation].append(occurrence)
 
-    try:
-        for reservation, occurrences in digests.iteritems():
-            notify_reservation_digest(reservation, occurrences)
-            for occurrence in occurrences:
-                occurrence.notification_sent = True
-    finally:
-        db.session.commit()
+    emails = []
+    for batch in grouper(digests.iteritems(), _BATCH_SIZE, skip_missing=True):
+        emails += [make_reservation_digest_email(reservation, occs) for reservation, occs in batch]
+        _mark_notifications_sent(occ for __, occs in batch for occ in occs)
+    # committing expires the loaded objects, so we only do it at the end
+    db.session.commit()
+    # a single call so all emails are throttled together
+    send_emails_in_bulk(filter(None, emails))
 
 
 @celery.periodic_task(name='roombooking_occurrences', run_every=crontab(minute='15', hour='8'))
@@ -107,13 +126,17 @@ def roombooking_occurrences():
         ~ReservationOccurrence.notification_sent,
         _build_notification_window_filter(),
         _join=[Reservation, Room]
-    )
-
-    try:
-        for occ in occurrences:
-            notify_upcoming_occurrence(occ)
-            occ.notification_sent = True
-            if occ.reservation.repeat_frequency == RepeatFrequency.DAY:
-                occ.reservation.occurrences.update({'notification_sent': True})
-    finally:
-        db.session.commit()
+    ).options(_NOTIFICATION_STRATEGY).all()
+
+    emails = []
+    for batch in grouper(occurrences, _BATCH_SIZE, skip_missing=True):
+        emails += [make_upcoming_occurrence_email(occ) for occ in batch]
+        _mark_notifications_sent(batch)
+        daily_reservation_ids = {occ.reservation_id for occ in batch
+                                 if occ.reservation.repeat_frequency == RepeatFrequency.DAY}
+        if daily_reservation_ids:
+            # daily bookings only get a notification for their first occurrence
+            ReservationOccurrence.query.filter(ReservationOccurrence.reservation_id.in_(daily_reservation_ids)) \
+                                       .update({'notification_sent': True}, synchronize_session=False)
+    db.session.commit()
+    send_emails_in_bulk(filter(None, emails))
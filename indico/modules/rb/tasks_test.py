@@ -0,0 +1,67 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from datetime import date
+
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from indico.modules.rb import settings as rb_settings
+from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.models.reservations import RepeatFrequency
+from indico.modules.rb.tasks import roombooking_occurrences
+
+
+@pytest.fixture
+def send_emails_in_bulk(mocker):
+    rb_settings.set('notification_hour', 0)
+    mocker.patch('indico.modules.rb.tasks.make_upcoming_occurrence_email', side_effect=lambda occ: occ)
+    return mocker.patch('indico.modules.rb.tasks.send_emails_in_bulk')
+
+
+@pytest.mark.parametrize('batch_size', (1, 500))
+def test_roombooking_occurrences(db, mocker, create_reservation, send_emails_in_bulk, batch_size):
+    mocker.patch('indico.modules.rb.tasks._BATCH_SIZE', batch_size)
+    tomorrow = date.today() + relativedelta(days=1)
+    single = create_reservation(start_dt=tomorrow + relativedelta(hour=8, minute=30),
+                                end_dt=tomorrow + relativedelta(hour=17, minute=30))
+    daily = create_reservation(start_dt=tomorrow + relativedelta(hour=8, minute=30),
+                               end_dt=tomorrow + relativedelta(days=3, hour=17, minute=30),
+                               repeat_frequency=RepeatFrequency.DAY)
+    later = create_reservation(start_dt=tomorrow + relativedelta(days=5, hour=8, minute=30),
+                               end_dt=tomorrow + relativedelta(days=5, hour=17, minute=30))
+    assert len(daily.occurrences.all()) == 4
+    roombooking_occurrences.run()
+    db.session.expire_all()
+    # all emails are sent together so they are throttled as a whole
+    assert send_emails_in_bulk.call_count == 1
+    sent = set(send_emails_in_bulk.call_args[0][0])
+    assert sent == {single.occurrences.one(), daily.occurrences.order_by(ReservationOccurrence.start_dt).first()}
+    assert single.occurrences.one().notification_sent
+    # daily bookings only get a notification for their first occurrence
+    assert all(occ.notification_sent for occ in daily.occurrences)
+    assert not later.occurrences.one().notification_sent
+
+
+def test_roombooking_occurrences_sent_once(db, create_reservation, send_emails_in_bulk):
+    tomorrow = date.today() + relativedelta(days=1)
+    create_reservation(start_dt=tomorrow + relativedelta(hour=8, minute=30),
+                       end_dt=tomorrow + relativedelta(hour=17, minute=30))
+    roombooking_occurrences.run()
+    assert len(send_emails_in_bulk.call_args[0][0]) == 1
+    db.session.expire_all()
+    roombooking_occurrences.run()
+    assert send_emails_in_bulk.call_args[0][0] == []
@@ -27,6 +27,7 @@ from sqlalchemy.engine import Engine
 from sqlalchemy import event
 
 from indico.core.db import db as db_
+from indico.core.db.sqlalchemy.nplusone import QueryDetector
 from indico.core.db.sqlalchemy.util.management import delete_all_tables
 from indico.core.db.sqlalchemy.util.session import update_session_options
 from indico.util.process import silent_check_call
@@ -157,3 +158,29 @@ def count_queries():
         yield _counter
     finally:
         event.remove(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+@pytest.fixture
+@pytest.mark.usefixtures('db')
+def detect_nplusone():
+    """Provides a detector for N+1 query problems.
+
+    Usage::
+
+        with detect_nplusone(max_queries=10) as detector:
+            do_stuff()
+
+    An :exc:`.NPlusOneError` is raised as soon as the same query is
+    executed `threshold` times from the same line of code, and the
+    test fails if more than `max_queries` queries are executed in
+    total.
+    """
+    @contextmanager
+    def _detector(max_queries=None, threshold=5):
+        detector = QueryDetector(threshold=threshold, raise_error=True)
+        with detector.watch():
+            yield detector
+        if max_queries is not None and detector.count > max_queries:
+            pytest.fail('{} queries executed, expected at most {}'.format(detector.count, max_queries))
+
+    return _detector
@@ -14,11 +14,15 @@
 # You should have received a copy of the GNU General Public License
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 
+import threading
+from collections import OrderedDict
 from functools import wraps
 from inspect import getcallargs
 
 from flask import has_request_context, g, current_app
 
+from indico.core.request_stats import count_request_stat
+
 
 _notset = object()
 
@@ -49,6 +53,48 @@ def memoize(obj):
     return memoizer
 
 
+class LRUCache(object):
+    """A thread-safe in-memory cache keeping only the most recently used items.
+
+    :param max_size: The maximum number of items in the cache.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
 def memoize_request(f):
     """Memoize a function during the current request"""
     @wraps(f)
@@ -64,7 +110,10 @@ def memoize_request(f):
 
         key = (f.__module__, f.__name__, make_hashable(getcallargs(f, *args, **kwargs)))
         if key not in cache:
+            count_request_stat('memoize_misses')
             cache[key] = f(*args, **kwargs)
+        else:
+            count_request_stat('memoize_hits')
         return cache[key]
 
     return memoizer
@@ -14,8 +14,10 @@
 # You should have received a copy of the GNU General Public License
 # along with Indico; if not, see <http://www.gnu.org/licenses/>.
 import pytest
+from flask import g
 
-from indico.util.caching import memoize_request
+from indico.core.request_stats import RequestStats
+from indico.util.caching import LRUCache, memoize_request
 
 
 @pytest.yield_fixture
@@ -82,3 +84,40 @@ def test_memoize_request_legacy_class():
         fn(New)
         fn(new_instance)
     assert calls == [Old, old_instance, New, new_instance]
+
+
+@pytest.mark.usefixtures('request_context', 'not_testing')
+def test_memoize_request_stats():
+    g.request_stats = stats = RequestStats()
+
+    @memoize_request
+    def fn(a):
+        pass
+
+    fn(1)
+    fn(1)
+    fn(2)
+    assert stats.memoize_hits == 1
+    assert stats.memoize_misses == 2
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)  # evicts 'b' since 'a' was used more recently
+    assert 'b' not in cache
+    assert cache.get('b', 'missing') == 'missing'
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    cache.set('a', 4)
+    cache.set('d', 5)  # evicts 'c'
+    assert len(cache) == 2
+    assert cache.get('a') == 4
+    assert 'c' not in cache
+    cache.delete('a')
+    cache.delete('a')
+    assert len(cache) == 1
+    cache.clear()
+    assert not len(cache)
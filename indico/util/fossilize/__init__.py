@@ -32,6 +32,8 @@ import zope.interface
 from types import NoneType
 from itertools import ifilter
 
+from indico.core.request_stats import measure_request_stat
+
 _fossil_cache = threading.local()
 
 def fossilizes(*classList):
@@ -413,5 +415,6 @@ def fossilize(target, interfaceArg=None, useAttrCache=False, **kwargs):
     :param useAttrCache: use the attribute caching
     :type useAttrCache: boolean
     """
-    return Fossilizable.fossilizeIterable(target, interfaceArg, useAttrCache,
-                                           **kwargs)
+    with measure_request_stat('fossilize_time'):
+        return Fossilizable.fossilizeIterable(target, interfaceArg, useAttrCache,
+                                               **kwargs)
@@ -85,6 +85,28 @@ def icon_from_mimetype(mimetype, default_icon='icon-file-filled'):
         return default_icon
 
 
+# MIME types of files whose content is already compressed
+_compressed_regex = re.compile(r"""
+    ^(?:
+        image/(?:jpeg|png|gif|webp)
+        |audio/
+        |video/
+        |application/(?:zip|gzip|x-gzip|x-bzip2?|x-xz|x-7z-compressed|x-rar-compressed|java-archive)$
+        |application/vnd\.openxmlformats-officedocument\.
+        |application/vnd\.oasis\.opendocument\.
+    )
+""", re.VERBOSE)
+
+
+def is_compressed_mimetype(mimetype):
+    """Checks whether files of a MIME type are already compressed.
+
+    Compressing such files again is usually a waste of time since it
+    does not reduce their size significantly.
+    """
+    return bool(_compressed_regex.match(mimetype.lower()))
+
+
 def register_custom_mimetypes():
     """Registers additional extension/mimetype mappings.
 
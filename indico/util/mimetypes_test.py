@@ -16,7 +16,7 @@
 
 import pytest
 
-from indico.util.mimetypes import icon_from_mimetype
+from indico.util.mimetypes import icon_from_mimetype, is_compressed_mimetype
 
 
 @pytest.mark.parametrize(('mimetype', 'expected_icon'), (
@@ -185,3 +185,23 @@ def test_icon_from_mimetype(mimetype, expected_icon):
 
 def test_icon_from_mimetype_case_insensitive():
     assert icon_from_mimetype('IMAGE/gif', default_icon='default_icon') == 'icon-file-image'
+
+
+@pytest.mark.parametrize(('mimetype', 'expected'), (
+    ('application/pdf', False),
+    ('application/vnd.ms-powerpoint', False),
+    ('application/vnd.openxmlformats-officedocument.presentationml.presentation', True),
+    ('application/vnd.oasis.opendocument.text', True),
+    ('application/zip', True),
+    ('application/zipfoo', False),
+    ('application/x-bzip2', True),
+    ('image/JPEG', True),
+    ('image/png', True),
+    ('image/svg+xml', False),
+    ('image/bmp', False),
+    ('video/mp4', True),
+    ('audio/mpeg', True),
+    ('text/plain', False),
+))
+def test_is_compressed_mimetype(mimetype, expected):
+    assert is_compressed_mimetype(mimetype) == expected
@@ -17,6 +17,7 @@
 from collections import defaultdict, OrderedDict
 import MaKaC
 from MaKaC.common.timezoneUtils import datetimeToUnixTimeInt
+from indico.util import json
 from indico.util.redis import scripts
 from indico.util.redis import client as redis_client
 from indico.util.redis import write_client as redis_write_client
@@ -46,6 +47,23 @@ def get_links(user, minDT=None, maxDT=None, client=None):
     return OrderedDict((eid, set(roles)) for eid, roles in res.iteritems())
 
 
+def get_links_multi(user_ids, client=None):
+    """Gets the links of many users with a single redis call.
+
+    :return: A dict mapping user ids to the links of each user, like
+             they are returned by :func:`get_links`.
+    """
+    if client is None:
+        client = redis_client
+    res = scripts.avatar_event_links_get_links_multi(json.dumps(map(str, user_ids)), client=client)
+    if res is None:
+        # Execution failed
+        return {user_id: OrderedDict() for user_id in user_ids}
+    # cjson encodes an empty list as an empty object
+    return {user_id: OrderedDict((eid, set(roles)) for eid, roles in res[str(user_id)] or [])
+            for user_id in user_ids}
+
+
 def merge_avatars(destination, source, client=None):
     if client is None:
         client = redis_write_client
@@ -0,0 +1,17 @@
+-- result=json, args=1
+-- vim: ts=4 sw=4 et
+local avatars = cjson.decode(ARGV[1])
+
+local res = {}
+for _, avatar in ipairs(avatars) do
+    local avatar_events_key = 'avatar-event-links/avatar_events:'..avatar
+    local avatar_event_roles_key_prefix = 'avatar-event-links/avatar_event_roles:'..avatar..':'
+    local avatar_events = redis.call('ZRANGEBYSCORE', avatar_events_key, '-inf', '+inf')
+    local links = {}
+    for _, event in ipairs(avatar_events) do
+        table.insert(links, {event, redis.call('SMEMBERS', avatar_event_roles_key_prefix..event)})
+    end
+    res[avatar] = links
+end
+
+return cjson.encode(res)
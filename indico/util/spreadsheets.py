@@ -19,11 +19,15 @@ from __future__ import unicode_literals
 import csv
 import re
 from io import BytesIO
+from tempfile import NamedTemporaryFile
 
+from flask import stream_with_context
 from markupsafe import Markup
 from speaklater import is_lazy_string
 from xlsxwriter import Workbook
 
+from indico.core.config import Config
+from indico.util.tasks import delete_file
 from indico.web.flask.util import send_file
 
 
@@ -44,6 +48,20 @@ def _prepare_header(header):
     return header[0] if isinstance(header, tuple) else header
 
 
+def _iter_ordered_rows(headers, rows):
+    """Get the values of each row in the order of the headers.
+
+    Rows which are already lists of values are used as they are while
+    dicts are converted to lists.  Headers missing in a dict row (e.g.
+    a survey question added after the row was submitted) are empty.
+    """
+    for row in rows:
+        if isinstance(row, dict):
+            row = [row.get(header, '') for header in headers]
+        assert len(row) == len(headers)
+        yield row
+
+
 def _prepare_csv_data(data, _linebreak_re=re.compile(r'(\r?\n)+')):
     if isinstance(data, (list, tuple)):
         data = ', '.join(data)
@@ -56,26 +74,40 @@ def _prepare_csv_data(data, _linebreak_re=re.compile(r'(\r?\n)+')):
     return _linebreak_re.sub('    ', unicode(data)).encode('utf-8')
 
 
-def generate_csv(headers, rows):
-    """Generates a CSV file from a list of headers and rows.
+def iter_csv(headers, rows, chunk_size=64 * 1024):
+    """Generates CSV data from a list of headers and rows.
 
     While CSV cells may contain multiline data, we replace linebreaks
     with spaces in case someone wants to use it in Excel which does
     *not* handle such cells properly...
 
     :param headers: a list of cell captions
-    :param rows: a list of dicts mapping captions to values
-    :return: an `io.BytesIO` containing the CSV data
+    :param rows: an iterable of rows; each row is either a list of
+                 values in the same order as `headers` or a dict
+                 mapping captions to values
+    :param chunk_size: the approximate size of the chunks yielded
+    :return: an iterator yielding the CSV data in chunks
     """
     buf = BytesIO()
     writer = csv.writer(buf)
     writer.writerow(map(_prepare_header, headers))
-    header_positions = {name: i for i, name in enumerate(headers)}
-    for row in rows:
-        row = sorted(row.items(), key=lambda x: header_positions[x[0]])
-        writer.writerow([_prepare_csv_data(v) for k, v in row])
-    buf.seek(0)
-    return buf
+    for row in _iter_ordered_rows(headers, rows):
+        writer.writerow(map(_prepare_csv_data, row))
+        if buf.tell() >= chunk_size:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def generate_csv(headers, rows):
+    """Generates a CSV file from a list of headers and rows.
+
+    :param headers: a list of cell captions
+    :param rows: a list of rows as expected by :func:`iter_csv`
+    :return: an `io.BytesIO` containing the CSV data
+    """
+    return BytesIO(b''.join(iter_csv(headers, rows)))
 
 
 def _prepare_excel_data(data):
@@ -88,50 +120,91 @@ def _prepare_excel_data(data):
     return data
 
 
+def _write_xlsx(target, headers, rows, options):
+    workbook_options = {'strings_to_formulas': False, 'strings_to_numbers': False, 'strings_to_urls': False}
+    workbook_options.update(options)
+    with Workbook(target, workbook_options) as workbook:
+        bold = workbook.add_format({'bold': True})
+        sheet = workbook.add_worksheet()
+        for col, name in enumerate(map(_prepare_header, headers)):
+            sheet.write(0, col, name, bold)
+        for row, values in enumerate(_iter_ordered_rows(headers, rows), 1):
+            sheet.write_row(row, 0, map(_prepare_excel_data, values))
+
+
 def generate_xlsx(headers, rows):
     """Generates an XLSX file from a list of headers and rows.
 
     :param headers: a list of cell captions
-    :param rows: a list of dicts mapping captions to values
+    :param rows: a list of rows as expected by :func:`iter_csv`
     :return: an `io.BytesIO` containing the XLSX data
     """
-    workbook_options = {'in_memory': True, 'strings_to_formulas': False, 'strings_to_numbers': False,
-                        'strings_to_urls': False}
     buf = BytesIO()
-    header_positions = {name: i for i, name in enumerate(headers)}
-    # convert row dicts to lists
-    rows = [[x[1] for x in sorted(row.items(), key=lambda x: header_positions[x[0]])] for row in rows]
-    assert all(len(row) == len(headers) for row in rows)
-    with Workbook(buf, workbook_options) as workbook:
-        bold = workbook.add_format({'bold': True})
-        sheet = workbook.add_worksheet()
-        for col, name in enumerate(map(_prepare_header, headers)):
-            sheet.write(0, col, name, bold)
-        for row, values in enumerate(rows, 1):
-            sheet.write_row(row, 0, map(_prepare_excel_data, values))
+    _write_xlsx(buf, headers, rows, {'in_memory': True})
     buf.seek(0)
     return buf
 
 
+class _IterStream(object):
+    """A read-only file-like object for the chunks of an iterator.
+
+    This allows passing data which is generated while it is sent to
+    the client to :func:`send_file`.
+    """
+
+    def __init__(self, iterator):
+        self._iterator = iter(iterator)
+        self._buf = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buf) < size:
+            try:
+                self._buf += next(self._iterator)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buf)
+        data, self._buf = self._buf[:size], self._buf[size:]
+        return data
+
+    def close(self):
+        if hasattr(self._iterator, 'close'):
+            self._iterator.close()
+
+
 def send_csv(filename, headers, rows):
     """Sends a CSV file to the client
 
+    The CSV data is generated while it is sent to the client, so
+    `rows` may be a generator which is only consumed at that point.
+
     :param filename: The name of the CSV file
     :param headers: a list of cell captions
-    :param rows: a list of dicts mapping captions to values
+    :param rows: an iterable of rows as expected by :func:`iter_csv`
     :return: a flask response containing the CSV data
     """
-    buf = generate_csv(headers, rows)
-    return send_file(filename, buf, 'text/csv', inline=False)
+    return send_file(filename, _IterStream(stream_with_context(iter_csv(headers, rows))), 'text/csv', inline=False)
 
 
 def send_xlsx(filename, headers, rows):
     """Sends an XLSX file to the client
 
-    :param filename: The name of the CSV file
+    The file is written in constant memory mode, i.e. each row is
+    written to disk immediately instead of keeping the whole sheet in
+    memory.
+
+    :param filename: The name of the XLSX file
     :param headers: a list of cell captions
-    :param rows: a list of dicts mapping captions to values
+    :param rows: an iterable of rows as expected by :func:`iter_csv`
     :return: a flask response containing the XLSX data
     """
-    buf = generate_xlsx(headers, rows)
-    return send_file(filename, buf, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', inline=False)
+    temp_dir = Config.getInstance().getTempDir()
+    temp_file = NamedTemporaryFile(suffix='indico.tmp', dir=temp_dir)
+    _write_xlsx(temp_file.name, headers, rows, {'constant_memory': True, 'tmpdir': temp_dir})
+    # Delete the temporary file after some time.  Even for a large file we don't
+    # need a higher delay since the webserver will keep it open anyway until it's
+    # done sending it to the client.
+    delete_file.apply_async(args=[temp_file.name], countdown=3600)
+    temp_file.delete = False
+    return send_file(filename, temp_file.name, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                     inline=False)
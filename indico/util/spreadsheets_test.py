@@ -0,0 +1,71 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+
+import pytest
+
+from indico.util.spreadsheets import generate_xlsx, iter_csv, send_csv, unique_col
+
+
+@pytest.mark.parametrize('as_dict', (False, True))
+def test_iter_csv(as_dict):
+    headers = ['ID', unique_col('Name', 1), unique_col('Name', 2), 'Flag']
+    rows = [[1, 'foo', {'b', 'A'}, True],
+            [2, 'line\nbreak', None, False]]
+    if as_dict:
+        rows = [dict(zip(headers, row)) for row in rows]
+    assert b''.join(iter_csv(headers, rows)) == (b'ID,Name,Name,Flag\r\n'
+                                                 b'1,foo,"A, b",Yes\r\n'
+                                                 b'2,line    break,,No\r\n')
+
+
+def test_iter_csv_chunks():
+    rows = ([i, 'x' * 100] for i in xrange(100))
+    chunks = list(iter_csv(['ID', 'Data'], rows, chunk_size=1000))
+    assert len(chunks) > 1
+    assert all(len(chunk) < 1200 for chunk in chunks)
+    assert b''.join(chunks).count(b'\r\n') == 101
+
+
+def test_sparse_dict_rows():
+    headers = ['ID', 'Name', unique_col('Question', 1)]
+    rows = [{'ID': 1, 'Name': 'foo'},
+            {'ID': 2, 'Name': 'bar', unique_col('Question', 1): 'answer'}]
+    assert b''.join(iter_csv(headers, rows)) == (b'ID,Name,Question\r\n'
+                                                 b'1,foo,\r\n'
+                                                 b'2,bar,answer\r\n')
+    assert generate_xlsx(headers, rows).getvalue()
+
+
+def test_send_csv(app):
+    consumed = []
+
+    def _iter_rows():
+        for i in xrange(3):
+            consumed.append(i)
+            yield [i, 'x' * 100]
+
+    with app.test_request_context():
+        response = send_csv('export.csv', ['ID', 'Data'], _iter_rows())
+        # the rows are only generated while sending the response
+        assert not consumed
+        assert response.headers['Content-Security-Policy']
+        assert response.headers['Content-Disposition'].startswith('attachment')
+        data = b''.join(response.response)
+        response.close()
+    assert consumed == [0, 1, 2]
+    assert data.count(b'\r\n') == 4
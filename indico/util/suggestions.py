@@ -16,25 +16,33 @@
 
 from __future__ import division, unicode_literals
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from datetime import date, timedelta
 
-from sqlalchemy.orm import joinedload, load_only
+from sqlalchemy.orm import joinedload
 
+from indico.core.db import db
+from indico.core.db.sqlalchemy.principals import PrincipalType
 from indico.modules.events import Event
-from indico.modules.events.contributions.util import get_events_with_linked_contributions
-from indico.modules.events.registration.util import get_events_registered
-from indico.modules.events.surveys.util import get_events_with_submitted_surveys
-from indico.util.date_time import now_utc, utc_to_server
+from indico.modules.events.contributions.models.contributions import Contribution
+from indico.modules.events.contributions.models.principals import ContributionPrincipal
+from indico.modules.events.registration.models.forms import RegistrationForm
+from indico.modules.events.registration.models.registrations import Registration
+from indico.modules.events.surveys.models.submissions import SurveySubmission
+from indico.modules.events.surveys.models.surveys import Survey
+from indico.util.date_time import now_utc, overlaps, utc_to_server
 from indico.util.redis import avatar_links
 from indico.util.struct.iterables import window
 
 
-def _get_blocks(events, attended):
+_EventDates = namedtuple('_EventDates', ('id', 'start_dt', 'end_dt'))
+
+
+def _get_blocks(events, attended_ids):
     blocks = []
     block = []
     for event in events:
-        if event not in attended:
+        if event.id not in attended_ids:
             if block:
                 blocks.append(block)
             block = []
@@ -45,42 +53,68 @@ def _get_blocks(events, attended):
     return blocks
 
 
-def _query_categ_events(categ, start_dt, end_dt):
-    return (Event.query
-            .with_parent(categ)
-            .filter(Event.happens_between(start_dt, end_dt))
-            .options(load_only('id', 'start_dt', 'end_dt')))
+def _get_category_events(category_ids):
+    """Get the dates of all events in some categories.
+
+    :return: A dict mapping category ids to lists of ``(id, start_dt,
+             end_dt)`` tuples sorted by their start date.
+    """
+    query = (db.session
+             .query(Event.category_id, Event.id, Event.start_dt, Event.end_dt)
+             .filter(Event.category_id.in_(category_ids),
+                     ~Event.is_deleted)
+             .order_by(Event.start_dt, Event.id))
+    result = {category_id: [] for category_id in category_ids}
+    for category_id, event_id, start_dt, end_dt in query:
+        result[category_id].append(_EventDates(event_id, start_dt, end_dt))
+    return result
+
 
+def _filter_categ_events(categ_events, start_dt, end_dt):
+    """Get the events that take place between two dates.
 
-def _get_category_score(user, categ, attended_events, debug=False):
+    This matches :meth:`.Event.happens_between`.
+    """
+    if start_dt is not None and end_dt is not None:
+        return [e for e in categ_events if overlaps((e.start_dt, e.end_dt), (start_dt, end_dt), inclusive=True)]
+    elif start_dt is not None:
+        return [e for e in categ_events if e.start_dt >= start_dt]
+    elif end_dt is not None:
+        return [e for e in categ_events if e.end_dt <= end_dt]
+    else:
+        return list(categ_events)
+
+
+def _get_category_score(user, categ, attended_events, categ_events, favorite_category_ids, debug=False):
     if debug:
         print repr(categ)
+    attended_ids = {e.id for e in attended_events}
     # We care about events in the whole timespan where the user attended some events.
     # However, this might result in some missed events e.g. if the user was not working for
     # a year and then returned. So we throw away old blocks (or rather adjust the start time
     # to the start time of the newest block)
     first_event_date = attended_events[0].start_dt.replace(hour=0, minute=0)
     last_event_date = attended_events[-1].start_dt.replace(hour=0, minute=0) + timedelta(days=1)
-    blocks = _get_blocks(_query_categ_events(categ, first_event_date, last_event_date), attended_events)
+    blocks = _get_blocks(_filter_categ_events(categ_events, first_event_date, last_event_date), attended_ids)
     for a, b in window(blocks):
         # More than 3 months between blocks? Ignore the old block!
         if b[0].start_dt - a[-1].start_dt > timedelta(weeks=12):
             first_event_date = b[0].start_dt.replace(hour=0, minute=0)
 
     # Favorite categories get a higher base score
-    score = int(categ in user.favorite_categories)
+    score = int(categ.id in favorite_category_ids)
     if debug:
         print '{0:+.3f} - initial'.format(score)
     # Attendance percentage goes to the score directly. If the attendance is high chances are good that the user
     # is either very interested in whatever goes on in the category or it's something he has to attend regularily.
-    total = _query_categ_events(categ, first_event_date, last_event_date).count()
+    total = len(_filter_categ_events(categ_events, first_event_date, last_event_date))
     if total:
         attended_block_event_count = sum(1 for e in attended_events if e.start_dt >= first_event_date)
         score += attended_block_event_count / total
     if debug:
         print '{0:+.3f} - attendance'.format(score)
     # If there are lots/few unattended events after the last attended one we also update the score with that
-    total_after = _query_categ_events(categ, last_event_date + timedelta(days=1), None).count()
+    total_after = len(_filter_categ_events(categ_events, last_event_date + timedelta(days=1), None))
     if total_after < total * 0.05:
         score += 0.25
     elif total_after > total * 0.25:
@@ -97,9 +131,8 @@ def _get_category_score(user, categ, attended_events, debug=False):
         print '{0:+.3f} - days since last event'.format(score)
     # For events in the future however we raise the score
     now_local = utc_to_server(now_utc())
-    attending_future = (_query_categ_events(categ, now_local, last_event_date)
-                        .filter(Event.id.in_(e.id for e in attended_events))
-                        .all())
+    attending_future = [e for e in _filter_categ_events(categ_events, now_local, last_event_date)
+                        if e.id in attended_ids]
     if attending_future:
         score += 0.25 * len(attending_future)
         if debug:
@@ -111,24 +144,94 @@ def _get_category_score(user, categ, attended_events, debug=False):
     return score
 
 
-def get_category_scores(user, debug=False):
+def _get_attended_event_ids(user_ids):
+    """Get the IDs of the events users are assumed to have attended.
+
+    :return: A dict mapping user IDs to sets of event IDs.
+    """
     # XXX: check if we can add some more roles such as 'contributor' to assume attendance
-    event_ids = set()
-    event_ids.update(int(id_)
-                     for id_, roles in avatar_links.get_links(user).iteritems()
-                     if 'abstract_submitter' in roles)
-    event_ids.update(id_
-                     for id_, roles in get_events_with_linked_contributions(user).iteritems()
-                     if 'contribution_submission' in roles)
-    event_ids |= get_events_registered(user)
-    event_ids |= get_events_with_submitted_surveys(user)
-    attended = (Event.query
-                .filter(Event.id.in_(event_ids), ~Event.is_deleted)
-                .options(joinedload('category'))
-                .order_by(Event.start_dt, Event.id)
-                .all())
-    categ_events = defaultdict(list)
-    for event in attended:
-        categ_events[event.category].append(event)
-    return dict((categ, _get_category_score(user, categ, events, debug))
-                for categ, events in categ_events.iteritems())
+    event_ids = defaultdict(set)
+    for user_id, links in avatar_links.get_links_multi(user_ids).iteritems():
+        event_ids[user_id].update(int(id_) for id_, roles in links.iteritems() if 'abstract_submitter' in roles)
+    contribution_submitters = (db.session
+                               .query(ContributionPrincipal.user_id, Contribution.event_id)
+                               .join(Contribution)
+                               .filter(ContributionPrincipal.type == PrincipalType.user,
+                                       ContributionPrincipal.user_id.in_(user_ids),
+                                       ContributionPrincipal.has_management_role('submit', explicit=True),
+                                       ~Contribution.is_deleted))
+    registrations = (db.session
+                     .query(Registration.user_id, RegistrationForm.event_id)
+                     .join(Registration.registration_form)
+                     .filter(Registration.user_id.in_(user_ids),
+                             Registration.is_active,
+                             ~RegistrationForm.is_deleted))
+    survey_submissions = (db.session
+                          .query(SurveySubmission.user_id, Survey.event_id)
+                          .join(SurveySubmission.survey)
+                          .filter(SurveySubmission.user_id.in_(user_ids),
+                                  ~Survey.is_deleted))
+    for query in (contribution_submitters, registrations, survey_submissions):
+        for user_id, event_id in query:
+            event_ids[user_id].add(event_id)
+    return event_ids
+
+
+def get_attended_events(user_ids):
+    """Get the events users are assumed to have attended.
+
+    Everything is loaded with a few queries regardless of the number
+    of users, so this should be used when getting the category scores
+    of many users.
+
+    :param user_ids: The IDs of the users.
+    :return: A dict mapping user IDs to lists of events (with their
+             categories loaded) sorted by their start date.
+    """
+    event_ids = _get_attended_event_ids(user_ids)
+    all_event_ids = set().union(*event_ids.itervalues())
+    events = []
+    if all_event_ids:
+        events = (Event.query
+                  .filter(Event.id.in_(all_event_ids), ~Event.is_deleted)
+                  .options(joinedload('category'))
+                  .order_by(Event.start_dt, Event.id)
+                  .all())
+    positions = {event.id: i for i, event in enumerate(events)}
+    return {user_id: [events[i] for i in sorted(positions[id_] for id_ in event_ids[user_id] if id_ in positions)]
+            for user_id in user_ids}
+
+
+def get_category_scores(user, debug=False, category_events=None, favorite_category_ids=None, attended_events=None):
+    """Get the suggestion scores of the categories a user attended events in.
+
+    :param user: The user to get the scores for.
+    :param debug: Whether to print how the scores are calculated.
+    :param category_events: A dict used to cache the events of each
+                            category.  Passing the same dict when
+                            getting the scores of many users avoids
+                            loading the events of a category more
+                            than once.
+    :param favorite_category_ids: The IDs of the user's favorite
+                                  categories.  If omitted, they are
+                                  loaded from the user.
+    :param attended_events: The events the user attended, as returned
+                            by :func:`get_attended_events`.  If
+                            omitted, they are loaded for the user.
+    :return: A dict mapping categories to scores.
+    """
+    if attended_events is None:
+        attended_events = get_attended_events([user.id])[user.id]
+    attended_by_categ = defaultdict(list)
+    for event in attended_events:
+        attended_by_categ[event.category].append(event)
+    if category_events is None:
+        category_events = {}
+    missing = {categ.id for categ in attended_by_categ} - category_events.viewkeys()
+    if missing:
+        category_events.update(_get_category_events(missing))
+    if favorite_category_ids is None:
+        favorite_category_ids = {categ.id for categ in user.favorite_categories}
+    return dict((categ, _get_category_score(user, categ, events, category_events[categ.id], favorite_category_ids,
+                                            debug))
+                for categ, events in attended_by_categ.iteritems())
@@ -25,6 +25,9 @@ in here but in your module instead.
 from __future__ import unicode_literals
 
 import os
+from datetime import timedelta
+
+from celery.schedules import crontab
 
 from indico.core.celery import celery
 from indico.core.logger import Logger
@@ -45,3 +48,45 @@ def delete_file(path):
         raise ValueError('Path is not absolute: {}'.format(path))
     Logger.get().info('Deleting {}'.format(path))
     silentremove(path)
+
+
+@celery.task(name='send_emails')
+def send_emails(mails):
+    """Sends emails which have been queued during a request.
+
+    This task is used by :meth:`.GenericMailer.flushQueue` when
+    ``SmtpUseCelery`` is enabled.  All emails are sent over the same
+    SMTP connection.
+
+    :param mails: A list of emails prepared by the mailer.
+    """
+    from MaKaC.common.mail import GenericMailer
+    GenericMailer.sendBatch(mails)
+
+
+@celery.task(name='compile_latex')
+def compile_latex(source_dir, template_name, has_toc, key):
+    """Compiles a LaTeX source into a cached PDF.
+
+    This task is used by :meth:`.LatexRunner.run_async` to generate
+    large PDFs without blocking a web worker.
+
+    :param source_dir: The directory containing the source.
+    :param template_name: The name of the source file (without
+                          extension).
+    :param has_toc: Whether the source contains a table of contents.
+    :param key: The key identifying the source.
+    """
+    from MaKaC.PDFinterface.base import run_latex_job
+    run_latex_job(source_dir, template_name, has_toc, key)
+
+
+@celery.periodic_task(name='latex_cache_cleanup', run_every=crontab(minute='0', hour='4'))
+def latex_cache_cleanup(days=7):
+    """Deletes cached LaTeX PDFs which have not been used recently.
+
+    :param days: number of days after which unused PDFs are deleted
+    """
+    from MaKaC.PDFinterface.base import cleanup_latex_cache
+    deleted = cleanup_latex_cache(timedelta(days=days))
+    Logger.get().info('Deleted {} unused LaTeX PDFs'.format(deleted))
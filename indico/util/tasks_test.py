@@ -0,0 +1,115 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import time
+
+import pytest
+
+from indico.core.config import Config
+from indico.util.tasks import latex_cache_cleanup
+
+from MaKaC.PDFinterface.base import (LatexRunner, _latex_jobs, get_latex_cache_path, get_latex_job_state,
+                                     run_latex_job)
+
+
+@pytest.yield_fixture
+def latex_cache_dir(tmpdir):
+    config = Config.getInstance()
+    old_cache_dir = config.getXMLCacheDir()
+    config.update(XMLCacheDir=tmpdir.strpath)
+    yield tmpdir.join('latex')
+    config.update(XMLCacheDir=old_cache_dir)
+
+
+@pytest.fixture(autouse=True)
+def render_latex(mocker):
+    def _render(tpl, params):
+        return '\n'.join('{}={}'.format(k, v) for k, v in sorted(params.iteritems()))
+    return mocker.patch('MaKaC.PDFinterface.base.tpl_render', side_effect=_render)
+
+
+def test_latex_key(tmpdir):
+    logo = tmpdir.join('logo-1.png')
+    logo.write('logo')
+    other_logo = tmpdir.join('logo-2.png')
+    other_logo.write('logo')
+    key = LatexRunner().prepare('test', title='foo', logo_img=logo.strpath)
+    assert LatexRunner().prepare('test', title='foo', logo_img=logo.strpath) == key
+    # the logo is usually a temporary file, so only its content matters
+    assert LatexRunner().prepare('test', title='foo', logo_img=other_logo.strpath) == key
+    assert LatexRunner(has_toc=True).prepare('test', title='foo', logo_img=logo.strpath) != key
+    assert LatexRunner().prepare('test', title='bar', logo_img=logo.strpath) != key
+    other_logo.write('other logo')
+    assert LatexRunner().prepare('test', title='foo', logo_img=other_logo.strpath) != key
+
+
+def test_latex_images(tmpdir):
+    image = tmpdir.join('indico-latex-1.png')
+    image.write('image')
+    other_image = tmpdir.join('indico-latex-2.png')
+    other_image.write('image')
+    graphics = r'\includegraphics[max width=\linewidth]{%s}'
+    runner = LatexRunner()
+    key = runner.prepare('test', body=graphics % image.strpath)
+    name = 'image-{}.png'.format(hashlib.sha1('image').hexdigest())
+    assert runner._source == 'body=' + graphics % name
+    assert runner._files == {name: image.strpath}
+    # images downloaded from markdown are temporary files as well
+    assert LatexRunner().prepare('test', body=graphics % other_image.strpath) == key
+    other_image.write('other image')
+    assert LatexRunner().prepare('test', body=graphics % other_image.strpath) != key
+
+
+def test_latex_job_state(mocker, latex_cache_dir):
+    key = LatexRunner().prepare('test', title='foo')
+    assert get_latex_job_state(key) == 'failed'
+    mocker.patch.object(_latex_jobs, 'get', return_value='running')
+    assert get_latex_job_state(key) == 'running'
+    latex_cache_dir.ensure(key[:2], key + '.pdf')
+    assert get_latex_job_state(key) == 'ready'
+
+
+def test_latex_job_failed(mocker, tmpdir):
+    mocker.patch.object(LatexRunner, 'compile', side_effect=RuntimeError)
+    set_state = mocker.patch.object(_latex_jobs, 'set')
+    with pytest.raises(RuntimeError):
+        run_latex_job(tmpdir.strpath, 'test', False, 'key')
+    set_state.assert_called_once_with('key', 'failed', 3600)
+
+
+def test_latex_cached(mocker, latex_cache_dir):
+    compile_latex = mocker.patch.object(LatexRunner, 'compile')
+    runner = LatexRunner()
+    key = runner.prepare('test', title='foo')
+    cached = latex_cache_dir.ensure(key[:2], key + '.pdf')
+    cached.setmtime(time.time() - 86400)
+    assert runner.run('test', title='foo') == get_latex_cache_path(key) == cached.strpath
+    assert runner.run_async('test', title='foo') == (key, cached.strpath)
+    assert not compile_latex.called
+    # using the cached pdf protects it from being cleaned up
+    assert cached.mtime() > time.time() - 60
+
+
+@pytest.mark.parametrize(('age', 'deleted'), (
+    (6, False),
+    (8, True),
+))
+def test_latex_cache_cleanup(latex_cache_dir, age, deleted):
+    cached = latex_cache_dir.ensure('aa', 'a' * 40 + '.pdf')
+    cached.setmtime(time.time() - age * 86400)
+    latex_cache_cleanup.run()
+    assert cached.exists() != deleted
@@ -0,0 +1,349 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals, absolute_import
+
+import mimetypes
+import os
+import posixpath
+import struct
+import zlib
+from contextlib import closing
+from datetime import datetime
+from io import BytesIO
+from zipfile import ZipFile
+
+from flask import Response, stream_with_context
+
+from indico.util.date_time import utc_to_server
+from indico.util.fs import secure_filename
+from indico.util.mimetypes import is_compressed_mimetype
+from indico.util.string import to_unicode
+
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+#: The largest size/offset which can be stored without ZIP64 extensions
+ZIP64_LIMIT = 0xffffffff
+#: The largest number of entries which can be stored without ZIP64 extensions
+ZIP_FILECOUNT_LIMIT = 0xffff
+
+_CHUNK_SIZE = 256 * 1024
+# general purpose flags: sizes/crc in data descriptor, utf-8 filenames
+_FLAGS = 0x08 | 0x800
+_UNIX_FILE_ATTRS = (0o100644 & 0xffff) << 16
+
+_local_header = struct.Struct(b'<4s5H3I2H')
+_central_header = struct.Struct(b'<4s6H3I5H2I')
+_data_descriptor = struct.Struct(b'<4s3I')
+_data_descriptor64 = struct.Struct(b'<4sI2Q')
+_zip64_extra = struct.Struct(b'<2H')
+_end_record = struct.Struct(b'<4s4H2IH')
+_end_record64 = struct.Struct(b'<4sQ2H2I4Q')
+_end_locator64 = struct.Struct(b'<4sIQI')
+
+
+class _ZipEntry(object):
+    def __init__(self, name, date_time, method, offset, zip64):
+        self.name = name.encode('utf-8')
+        self.date_time = date_time
+        self.method = method
+        self.offset = offset
+        self.zip64 = zip64
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+
+    @property
+    def dos_date(self):
+        dt = self.date_time
+        return (dt.year - 1980) << 9 | dt.month << 5 | dt.day
+
+    @property
+    def dos_time(self):
+        dt = self.date_time
+        return dt.hour << 11 | dt.minute << 5 | dt.second // 2
+
+    @property
+    def version(self):
+        return 45 if self.zip64 else 20
+
+
+class ZipStreamWriter(object):
+    """Write a ZIP archive incrementally.
+
+    Unlike :class:`zipfile.ZipFile` this does not need a seekable file
+    and never keeps more than a small chunk of a file in memory.  The
+    size and checksum of each file are written in a data descriptor
+    after its content, and ZIP64 extensions are used when a file or the
+    whole archive is too big for the regular ZIP format.
+
+    All methods return iterators yielding the bytes of the archive.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.offset = 0
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _write_local_header(self, entry):
+        extra = b''
+        if entry.zip64:
+            extra = _zip64_extra.pack(1, 16) + struct.pack(b'<2Q', 0, 0)
+        yield self._emit(_local_header.pack(b'PK\x03\x04', entry.version, _FLAGS, entry.method, entry.dos_time,
+                                            entry.dos_date, 0, ZIP64_LIMIT if entry.zip64 else 0,
+                                            ZIP64_LIMIT if entry.zip64 else 0, len(entry.name), len(extra)))
+        yield self._emit(entry.name + extra)
+
+    def _write_data_descriptor(self, entry):
+        entry.crc &= 0xffffffff
+        if entry.zip64:
+            descriptor = _data_descriptor64.pack(b'PK\x07\x08', entry.crc, entry.compressed_size, entry.size)
+        elif entry.compressed_size >= ZIP64_LIMIT:
+            raise ValueError('File too big for a zip archive: {}'.format(entry.name.decode('utf-8')))
+        else:
+            descriptor = _data_descriptor.pack(b'PK\x07\x08', entry.crc, entry.compressed_size, entry.size)
+        yield self._emit(descriptor)
+        self.entries.append(entry)
+
+    def write_file(self, name, fileobj, size=None, date_time=None, compress=True):
+        """Add a file to the archive.
+
+        :param name: The path of the file within the archive.
+        :param fileobj: A file-like object containing the file data.
+        :param size: The size of the file if known; used to decide
+                     whether ZIP64 extensions are needed for it.
+        :param date_time: The modification time of the file as a naive
+                          datetime; defaults to the current time.
+        :param compress: Whether the file should be deflated.  Files
+                         which are already compressed should be stored
+                         as-is to save CPU time.
+        """
+        date_time = date_time or datetime.now()
+        # deflating incompressible data may increase its size slightly
+        zip64 = size is None or size + size // 100 + 1024 >= ZIP64_LIMIT
+        entry = _ZipEntry(name, max(date_time, datetime(1980, 1, 1)), ZIP_DEFLATED if compress else ZIP_STORED,
+                          self.offset, zip64)
+        for chunk in self._write_local_header(entry):
+            yield chunk
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15) if compress else None
+        while True:
+            chunk = fileobj.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            entry.size += len(chunk)
+            entry.crc = zlib.crc32(chunk, entry.crc)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                entry.compressed_size += len(chunk)
+                yield self._emit(chunk)
+        if compressor:
+            chunk = compressor.flush()
+            entry.compressed_size += len(chunk)
+            yield self._emit(chunk)
+        for chunk in self._write_data_descriptor(entry):
+            yield chunk
+
+    def copy_zip(self, fileobj, prefix=''):
+        """Add all files from another ZIP archive.
+
+        The compressed data of the files is copied as-is, so this is
+        much faster than extracting and adding them again.
+
+        :param fileobj: A seekable file-like object containing a ZIP
+                        archive using only stored or deflated files.
+        :param prefix: A path to prepend to the names of the files.
+        """
+        for info in ZipFile(fileobj).infolist():
+            if info.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+                raise ValueError('Unsupported compression method: {}'.format(info.compress_type))
+            name = info.filename if isinstance(info.filename, unicode) else info.filename.decode('cp437')
+            zip64 = info.file_size >= ZIP64_LIMIT or info.compress_size >= ZIP64_LIMIT
+            entry = _ZipEntry(posixpath.join(prefix, name), datetime(*info.date_time), info.compress_type,
+                              self.offset, zip64)
+            for chunk in self._write_local_header(entry):
+                yield chunk
+            # skip the local header of the file; its extra field may differ from the central one
+            fileobj.seek(info.header_offset)
+            header = _local_header.unpack(fileobj.read(_local_header.size))
+            fileobj.seek(header[-2] + header[-1], os.SEEK_CUR)
+            remaining = info.compress_size
+            while remaining:
+                chunk = fileobj.read(min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError('Truncated zip archive')
+                remaining -= len(chunk)
+                yield self._emit(chunk)
+            entry.crc = info.CRC
+            entry.size = info.file_size
+            entry.compressed_size = info.compress_size
+            for chunk in self._write_data_descriptor(entry):
+                yield chunk
+
+    def close(self):
+        """Write the central directory of the archive."""
+        cd_offset = self.offset
+        for entry in self.entries:
+            extra_values = []
+            size = entry.size
+            compressed_size = entry.compressed_size
+            offset = entry.offset
+            if entry.zip64 or size >= ZIP64_LIMIT:
+                extra_values.append(size)
+                size = ZIP64_LIMIT
+            if entry.zip64 or compressed_size >= ZIP64_LIMIT:
+                extra_values.append(compressed_size)
+                compressed_size = ZIP64_LIMIT
+            if offset >= ZIP64_LIMIT:
+                extra_values.append(offset)
+                offset = ZIP64_LIMIT
+            extra = b''
+            if extra_values:
+                extra = (_zip64_extra.pack(1, 8 * len(extra_values)) +
+                         struct.pack(b'<{}Q'.format(len(extra_values)), *extra_values))
+            version = 45 if extra_values else entry.version
+            yield self._emit(_central_header.pack(b'PK\x01\x02', version | (3 << 8), version, _FLAGS,
+                                                  entry.method, entry.dos_time, entry.dos_date, entry.crc,
+                                                  compressed_size, size, len(entry.name), len(extra), 0, 0, 0,
+                                                  _UNIX_FILE_ATTRS, offset))
+            yield self._emit(entry.name + extra)
+        cd_size = self.offset - cd_offset
+        count = len(self.entries)
+        if count > ZIP_FILECOUNT_LIMIT or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            end64_offset = self.offset
+            yield self._emit(_end_record64.pack(b'PK\x06\x06', _end_record64.size - 12, 45, 45, 0, 0,
+                                                count, count, cd_size, cd_offset))
+            yield self._emit(_end_locator64.pack(b'PK\x06\x07', 0, end64_offset, 1))
+        yield self._emit(_end_record.pack(b'PK\x05\x06', 0, 0, min(count, ZIP_FILECOUNT_LIMIT),
+                                          min(count, ZIP_FILECOUNT_LIMIT), min(cd_size, ZIP64_LIMIT),
+                                          min(cd_offset, ZIP64_LIMIT), 0))
+
+
+class ZipFileWriter(object):
+    """Write a ZIP archive to a file as its contents are added.
+
+    Files are compressed unless their type indicates that they are
+    compressed already.  Adding a file with a name which is already
+    present in the archive does nothing.
+
+    :param fileobj: A file-like object opened for writing.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.names = set()
+        self._writer = ZipStreamWriter()
+
+    def __contains__(self, name):
+        return to_unicode(name) in self.names
+
+    def _should_compress(self, name):
+        mimetype = mimetypes.guess_type(name)[0]
+        return not is_compressed_mimetype(mimetype or '')
+
+    def add_file(self, name, fileobj, size=None, date_time=None):
+        """Add a file from a file-like object."""
+        name = to_unicode(name)
+        if name in self.names:
+            return
+        self.names.add(name)
+        for chunk in self._writer.write_file(name, fileobj, size=size, date_time=date_time,
+                                             compress=self._should_compress(name)):
+            self.fileobj.write(chunk)
+
+    def add_path(self, name, path):
+        """Add a file from the file system."""
+        if name not in self:
+            with open(path, 'rb') as f:
+                self.add_file(name, f, size=os.fstat(f.fileno()).st_size)
+
+    def add_bytes(self, name, data):
+        """Add a file from a string.
+
+        Unicode strings are stored encoded as UTF-8.
+        """
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self.add_file(name, BytesIO(data), size=len(data))
+
+    def add_zip(self, fileobj, prefix=''):
+        """Add all files from another ZIP archive.
+
+        Unlike the other methods this does not check for files which
+        are already in the archive, so it should be used before adding
+        any other files.  See :meth:`ZipStreamWriter.copy_zip` for
+        details.
+        """
+        count = len(self._writer.entries)
+        for chunk in self._writer.copy_zip(fileobj, to_unicode(prefix)):
+            self.fileobj.write(chunk)
+        self.names.update(entry.name.decode('utf-8') for entry in self._writer.entries[count:])
+
+    def close(self):
+        """Finish the archive."""
+        for chunk in self._writer.close():
+            self.fileobj.write(chunk)
+
+
+def generate_zip(files):
+    """Generate a ZIP archive on the fly.
+
+    :param files: An iterable of ``(name, open_file, size, date_time,
+                  compress)`` tuples.  `open_file` is a callable
+                  returning a file-like object; it is only called when the file is added to
+                  the archive so no more than one file is open at any
+                  time.  See :meth:`ZipStreamWriter.write_file` for the
+                  other values.
+    :return: An iterator yielding the bytes of the archive.
+    """
+    writer = ZipStreamWriter()
+    for name, open_file, size, date_time, compress in files:
+        with closing(open_file()) as fileobj:
+            for chunk in writer.write_file(name, fileobj, size=size, date_time=date_time, compress=compress):
+                yield chunk
+    for chunk in writer.close():
+        yield chunk
+
+
+def get_stored_file_entry(name, stored_file):
+    """Get the entry for a stored file to be used in :func:`generate_zip`.
+
+    The file is read directly from its storage backend and only
+    compressed if its content is not compressed already.
+
+    :param name: The path of the file within the archive.
+    :param stored_file: An object using :class:`.StoredFileMixin`.
+    """
+    created_dt = stored_file.created_dt
+    date_time = utc_to_server(created_dt).replace(tzinfo=None) if created_dt else None
+    return (name, stored_file.open, stored_file.size, date_time,
+            not is_compressed_mimetype(stored_file.content_type or ''))
+
+
+def send_zip(filename, files):
+    """Send a ZIP archive which is generated while sending it.
+
+    :param filename: The file name of the archive.
+    :param files: The files to include in the archive as expected by
+                  :func:`generate_zip`.
+    """
+    rv = Response(stream_with_context(generate_zip(files)), mimetype='application/zip')
+    rv.headers.add('Content-Disposition', 'attachment', filename=secure_filename(filename, 'archive.zip'))
+    return rv
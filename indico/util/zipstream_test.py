@@ -0,0 +1,85 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+
+from datetime import datetime
+from functools import partial
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+from indico.util.zipstream import ZipFileWriter, generate_zip
+
+
+def _make_zip(files):
+    entries = [(name, partial(BytesIO, data), size, datetime(2016, 8, 1, 12, 30), compress)
+               for name, data, size, compress in files]
+    return ZipFile(BytesIO(b''.join(generate_zip(entries))))
+
+
+@pytest.mark.parametrize(('compress', 'compress_type'), (
+    (True, ZIP_DEFLATED),
+    (False, ZIP_STORED)
+))
+@pytest.mark.parametrize('known_size', (True, False))
+def test_generate_zip(compress, compress_type, known_size):
+    data = b'hello world ' * 10000
+    files = [('foo/bar.txt', data, len(data) if known_size else None, compress),
+             ('empty.txt', b'', 0 if known_size else None, compress),
+             ('m\xf6p.txt', b'moep', 4 if known_size else None, compress)]
+    with _make_zip(files) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['foo/bar.txt', 'empty.txt', 'm\xf6p.txt']
+        assert zf.read('foo/bar.txt') == data
+        assert zf.read('empty.txt') == b''
+        assert zf.read('m\xf6p.txt') == b'moep'
+        info = zf.getinfo('foo/bar.txt')
+        assert info.compress_type == compress_type
+        assert info.date_time == (2016, 8, 1, 12, 30, 0)
+
+
+def test_generate_zip_empty():
+    with _make_zip([]) as zf:
+        assert zf.namelist() == []
+
+
+def test_zip_file_writer():
+    bundle = BytesIO()
+    writer = ZipFileWriter(bundle)
+    writer.add_bytes('a.txt', b'a' * 1000)
+    writer.add_bytes('img/b.png', b'png')
+    writer.close()
+    bundle.seek(0)
+
+    output = BytesIO()
+    writer = ZipFileWriter(output)
+    writer.add_zip(bundle, 'static')
+    writer.add_bytes('static/a.txt', b'duplicate')
+    writer.add_bytes('index.html', b'<html>')
+    writer.add_bytes('style.css', '/* m\xf6p */')
+    assert 'static/img/b.png' in writer
+    assert 'foo.txt' not in writer
+    writer.close()
+    with ZipFile(BytesIO(output.getvalue())) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['static/a.txt', 'static/img/b.png', 'index.html', 'style.css']
+        assert zf.read('static/a.txt') == b'a' * 1000
+        assert zf.getinfo('static/a.txt').compress_type == ZIP_DEFLATED
+        assert zf.getinfo('static/img/b.png').compress_type == ZIP_STORED
+        assert zf.read('index.html') == b'<html>'
+        assert zf.read('style.css') == '/* m\xf6p */'.encode('utf-8')
@@ -39,9 +39,11 @@ from indico.core.config import Config
 from indico.core.db.sqlalchemy import db
 from indico.core.db.sqlalchemy.core import on_models_committed
 from indico.core.db.sqlalchemy.logging import apply_db_loggers
+from indico.core.db.sqlalchemy.nplusone import apply_query_detection
 from indico.core.db.sqlalchemy.util.models import import_all_models
 from indico.core.logger import Logger
 from indico.core.plugins import plugin_engine, include_plugin_css_assets, include_plugin_js_assets, url_for_plugin
+from indico.core.request_stats import apply_request_stats
 from indico.modules.auth.providers import IndicoAuthProvider, IndicoIdentityProvider
 from indico.modules.auth.util import url_for_login, url_for_logout
 from indico.modules.oauth import oauth
@@ -112,6 +114,7 @@ def configure_app(app, set_path=False):
         elif method in ('xaccelredirect', 'nginx'):  # nginx
             if not args or not hasattr(args, 'items'):
                 raise ValueError('StaticFileMethod args must be a dict containing at least one mapping')
+            app.config['X_ACCEL_MAPPING'] = args
             app.wsgi_app = XAccelMiddleware(app.wsgi_app, args)
         else:
             raise ValueError('Invalid static file method: %s' % method)
@@ -253,6 +256,7 @@ def configure_db(app):
     db.init_app(app)
     if not app.config['TESTING']:
         apply_db_loggers(app)
+        apply_query_detection(app)
 
     plugins_loaded.connect(lambda sender: configure_mappers(), app, weak=False)
     models_committed.connect(on_models_committed, app)
@@ -266,6 +270,8 @@ def add_handlers(app):
     app.after_request(inject_current_url)
     app.register_error_handler(404, handle_404)
     app.register_error_handler(Exception, handle_exception)
+    if not app.config['TESTING']:
+        apply_request_stats(app)
 
 
 def add_blueprints(app):
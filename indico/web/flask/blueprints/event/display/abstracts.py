@@ -47,5 +47,6 @@ event.add_url_rule('/call-for-abstracts/<abstractId>/Abstract.pdf', 'abstractDis
 # Abstract book
 event.add_url_rule('/abstract-book.pdf', 'confAbstractBook', conferenceDisplay.RHAbstractBook)
 event.add_url_rule('/abstract-book.pdf', 'conferenceDisplay-abstractBook', conferenceDisplay.RHAbstractBook)
+event.add_url_rule('/abstract-book/<key>.pdf', 'conferenceDisplay-abstractBookJob', conferenceDisplay.RHAbstractBookJob)
 event.add_url_rule('/abstract-book-latex.zip', 'conferenceDisplay-abstractBookLatex',
                    conferenceDisplay.RHConferenceLatexPackage)
@@ -17,6 +17,7 @@
 from __future__ import absolute_import
 
 import cPickle
+import time
 import uuid
 from datetime import datetime, timedelta
 
@@ -28,6 +29,7 @@ from werkzeug.utils import cached_property
 
 from indico.core.config import Config
 from indico.modules.users import User
+from indico.util.caching import LRUCache
 from indico.util.decorators import cached_writable_property
 from indico.util.i18n import _, set_best_lang
 from MaKaC.common.cache import GenericCache
@@ -42,6 +44,10 @@ class BaseSession(CallbackDict, SessionMixin):
         self.sid = sid
         self.new = new
         self.modified = False
+        # the serialized items of the session as they are in the storage
+        # and when they were written there (see IndicoSessionInterface)
+        self.stored_items = {}
+        self.stored_at = {}
         defaults = self._get_defaults()
         if defaults:
             self.update(defaults)
@@ -137,13 +143,26 @@ class IndicoSession(BaseSession):
 
 
 class IndicoSessionInterface(SessionInterface):
+    """Stores sessions in the cache, with an in-process LRU in front.
+
+    Each item of a session is pickled and stored separately, along with
+    a small entry containing the version of the session and when each
+    of its items has been written.  Only this entry needs to be fetched
+    on each request as long as the session is still in the local LRU
+    with the same version, and saving a session only writes the items
+    which actually changed.
+    """
+
     pickle_based = True
     serializer = cPickle
     session_class = IndicoSession
     temporary_session_lifetime = timedelta(days=7)
+    #: The number of sessions each process keeps in memory
+    local_cache_size = 1000
 
     def __init__(self):
         self.storage = GenericCache('flask-session')
+        self.local_cache = LRUCache(self.local_cache_size)
 
     def generate_sid(self):
         return str(uuid.uuid4())
@@ -173,22 +192,70 @@ class IndicoSessionInterface(SessionInterface):
             return True
         return False
 
+    def _load_items(self, sid, version, stored_at):
+        cached = self.local_cache.get(sid)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        data = self.storage.get_multi([(sid, key) for key in stored_at])
+        # An item may be missing if a concurrent request deleted the session while
+        # another one was still using it.  Losing that item is better than losing
+        # the whole session.
+        items = {key: data[(sid, key)] for key in stored_at if data[(sid, key)] is not None}
+        self.local_cache.set(sid, (version, items))
+        return items
+
     def open_session(self, app, request):
         sid = request.cookies.get(app.session_cookie_name)
         if not sid:
             return self.session_class(sid=self.generate_sid(), new=True)
         data = self.storage.get(sid)
-        if data is not None:
+        if isinstance(data, str):
+            # session stored as a whole before its items were stored separately
             return self.session_class(self.serializer.loads(data), sid=sid)
+        elif data is not None:
+            version, stored_at = data
+            items = self._load_items(sid, version, stored_at)
+            session = self.session_class({key: self.serializer.loads(value) for key, value in items.iteritems()},
+                                         sid=sid)
+            session.stored_items = items
+            session.stored_at = {key: stored_at[key] for key in items}
+            return session
         return self.session_class(sid=self.generate_sid(), new=True)
 
+    def _delete_session(self, session):
+        self.storage.delete(session.sid)
+        if session.stored_at:
+            self.storage.delete_multi([(session.sid, key) for key in session.stored_at])
+        self.local_cache.delete(session.sid)
+        session.stored_items = {}
+        session.stored_at = {}
+
+    def _store_session(self, session, ttl):
+        ttl = int(ttl.total_seconds())
+        now = int(time.time())
+        items = {key: self.serializer.dumps(value, cPickle.HIGHEST_PROTOCOL) for key, value in session.iteritems()}
+        # Items are stored twice as long as the session itself and rewritten when they are
+        # older than its lifetime so unchanged items never expire before the session.
+        # Removed items are not deleted but left to expire: a concurrent request which
+        # loaded the session before may still save a version referencing them.
+        changed = {key for key, value in items.iteritems()
+                   if session.stored_items.get(key) != value or session.stored_at[key] < now - ttl}
+        stored_at = {key: now if key in changed else session.stored_at[key] for key in items}
+        version = uuid.uuid4().hex
+        if changed:
+            self.storage.set_multi({(session.sid, key): items[key] for key in changed}, ttl * 2)
+        self.storage.set(session.sid, (version, stored_at), ttl)
+        self.local_cache.set(session.sid, (version, items))
+        session.stored_items = items
+        session.stored_at = stored_at
+
     def save_session(self, app, session, response):
         domain = self.get_cookie_domain(app)
         secure = self.get_cookie_secure(app)
         refresh_sid = self.should_refresh_sid(app, session)
         if not session and not session.new:
             # empty session, delete it from storage and cookie
-            self.storage.delete(session.sid)
+            self._delete_session(session)
             response.delete_cookie(app.session_cookie_name, domain=domain)
             return
 
@@ -206,10 +273,10 @@ class IndicoSessionInterface(SessionInterface):
         session['_expires'] = datetime.now() + storage_ttl
 
         if refresh_sid:
-            self.storage.delete(session.sid)
+            self._delete_session(session)
             session.sid = self.generate_sid()
 
         session['_secure'] = request.is_secure
-        self.storage.set(session.sid, self.serializer.dumps(dict(session)), storage_ttl)
+        self._store_session(session, storage_ttl)
         response.set_cookie(app.session_cookie_name, session.sid, expires=cookie_lifetime, httponly=True,
                             secure=secure)
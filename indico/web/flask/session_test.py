@@ -0,0 +1,163 @@
+# This file is part of Indico.
+# Copyright (C) 2002 - 2016 European Organization for Nuclear Research (CERN).
+#
+# Indico is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# Indico is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+import cPickle
+
+import pytest
+from flask import request
+
+from indico.web.flask.session import IndicoSessionInterface
+
+
+class MockStorage(object):
+    def __init__(self):
+        self.data = {}
+        self.writes = []
+        self.multi_gets = 0
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def get_multi(self, keys, default=None):
+        self.multi_gets += 1
+        return {key: self.data.get(key, default) for key in keys}
+
+    def set(self, key, val, time=0):
+        self.writes.append(key)
+        self.data[key] = val
+
+    def set_multi(self, mapping, time=0):
+        self.writes += mapping
+        self.data.update(mapping)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.delete(key)
+
+
+@pytest.fixture
+def session_interface():
+    interface = IndicoSessionInterface()
+    interface.storage = MockStorage()
+    return interface
+
+
+def _open(app, interface, sid):
+    with app.test_request_context():
+        request.cookies = {app.session_cookie_name: sid}
+        return interface.open_session(app, request)
+
+
+def _save(app, interface, session):
+    with app.test_request_context():
+        interface.save_session(app, session, app.response_class())
+
+
+def test_session_roundtrip(app, session_interface):
+    session = _open(app, session_interface, None)
+    assert session.new
+    session['foo'] = 'bar'
+    session['num'] = 123
+    _save(app, session_interface, session)
+    # a different process with an empty local cache
+    other_interface = IndicoSessionInterface()
+    other_interface.storage = session_interface.storage
+    session = _open(app, other_interface, session.sid)
+    assert not session.new
+    assert session['foo'] == 'bar'
+    assert session['num'] == 123
+
+
+def test_session_only_changed_items_stored(app, session_interface):
+    storage = session_interface.storage
+    session = _open(app, session_interface, None)
+    session['foo'] = 'bar'
+    session['num'] = 123
+    _save(app, session_interface, session)
+    assert {(session.sid, 'foo'), (session.sid, 'num')} <= set(storage.writes)
+    del storage.writes[:]
+    session = _open(app, session_interface, session.sid)
+    session['num'] = 456
+    del session['foo']
+    _save(app, session_interface, session)
+    assert (session.sid, 'num') in storage.writes
+    assert (session.sid, 'foo') not in storage.writes
+    session = _open(app, session_interface, session.sid)
+    assert 'foo' not in session
+    assert session['num'] == 456
+
+
+def test_session_local_cache(app, session_interface):
+    storage = session_interface.storage
+    session = _open(app, session_interface, None)
+    session['foo'] = 'bar'
+    _save(app, session_interface, session)
+    sid = session.sid
+    assert _open(app, session_interface, sid)['foo'] == 'bar'
+    assert storage.multi_gets == 0
+    # the session is updated by another process
+    other_interface = IndicoSessionInterface()
+    other_interface.storage = storage
+    session = _open(app, other_interface, sid)
+    assert storage.multi_gets == 1
+    session['foo'] = 'baz'
+    _save(app, other_interface, session)
+    assert _open(app, session_interface, sid)['foo'] == 'baz'
+    assert storage.multi_gets == 2
+    # ... or deleted
+    storage.delete(sid)
+    assert _open(app, session_interface, sid).new
+
+
+def test_session_concurrent_removal(app, session_interface):
+    session = _open(app, session_interface, None)
+    session['foo'] = 'bar'
+    session['num'] = 123
+    _save(app, session_interface, session)
+    sid = session.sid
+    other_interface = IndicoSessionInterface()
+    other_interface.storage = session_interface.storage
+    session_a = _open(app, session_interface, sid)
+    session_b = _open(app, other_interface, sid)
+    # request A removes an item, then request B (which loaded the session
+    # before) saves its own changes
+    del session_a['foo']
+    _save(app, session_interface, session_a)
+    session_b['num'] = 456
+    _save(app, other_interface, session_b)
+    fresh_interface = IndicoSessionInterface()
+    fresh_interface.storage = session_interface.storage
+    session = _open(app, fresh_interface, sid)
+    assert not session.new
+    assert session['num'] == 456
+    assert session['foo'] == 'bar'  # last writer wins
+    # an item that is gone does not invalidate the whole session
+    session_interface.storage.delete((sid, 'foo'))
+    fresh_interface.local_cache.clear()
+    session = _open(app, fresh_interface, sid)
+    assert not session.new
+    assert session['num'] == 456
+    assert 'foo' not in session
+
+
+def test_session_legacy(app, session_interface):
+    session_interface.storage.set('legacy', cPickle.dumps({'foo': 'bar'}))
+    session = _open(app, session_interface, 'legacy')
+    assert not session.new
+    assert session['foo'] == 'bar'
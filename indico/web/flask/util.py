@@ -16,10 +16,12 @@
 
 from __future__ import absolute_import
 
+import calendar
 import inspect
 import os
 import re
 import time
+from datetime import datetime
 from importlib import import_module
 
 from flask import Blueprint, g, redirect, request
@@ -29,6 +31,7 @@ from flask import send_file as _send_file
 from werkzeug.wrappers import Response as WerkzeugResponse
 from werkzeug.datastructures import Headers, FileStorage
 from werkzeug.exceptions import NotFound, HTTPException
+from werkzeug.http import is_resource_modified
 from werkzeug.routing import BaseConverter, UnicodeConverter, RequestRedirect, BuildError
 from werkzeug.urls import url_parse
 
@@ -342,7 +345,75 @@ def _is_office_mimetype(mimetype):
     return False
 
 
-def send_file(name, path_or_fd, mimetype, last_modified=None, no_cache=True, inline=None, conditional=False, safe=True):
+def _get_timestamp(dt):
+    if dt.tzinfo is not None:
+        return calendar.timegm(dt.utctimetuple())
+    return int(time.mktime(dt.timetuple()))
+
+
+def _get_file_size(path_or_fd):
+    """Get the size of a file or `None` if it cannot be determined without reading it"""
+    if isinstance(path_or_fd, basestring):
+        return os.path.getsize(path_or_fd)
+    try:
+        pos = path_or_fd.tell()
+        path_or_fd.seek(0, os.SEEK_END)
+        size = path_or_fd.tell() - pos
+        path_or_fd.seek(pos)
+        return size
+    except (AttributeError, IOError):
+        return None
+
+
+def _iter_file_range(fd, length, chunk_size=64 * 1024):
+    while length > 0:
+        chunk = fd.read(min(chunk_size, length))
+        if not chunk:
+            break
+        length -= len(chunk)
+        yield chunk
+
+
+def _is_range_valid(etag, last_modified):
+    """Check whether the If-Range header (if any) allows a partial response"""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return etag is not None and if_range.etag == etag
+    elif if_range.date is not None:
+        return last_modified is not None and datetime.utcfromtimestamp(last_modified) <= if_range.date
+    return True
+
+
+def _make_range_response(path_or_fd, mimetype, size):
+    """Create a response for the byte range requested by the client.
+
+    Returns `None` if the whole file should be sent instead.
+    """
+    range_header = request.range
+    if range_header is None or len(range_header.ranges) != 1:
+        return None
+    rng = range_header.range_for_length(size)
+    if rng is None:
+        if not isinstance(path_or_fd, basestring):
+            # nothing is sent, but the caller expects us to take care of the file
+            path_or_fd.close()
+        rv = app.response_class(status=416)
+        rv.headers['Content-Range'] = 'bytes */{}'.format(size)
+        return rv
+    start, stop = rng
+    fd = open(path_or_fd, 'rb') if isinstance(path_or_fd, basestring) else path_or_fd
+    fd.seek(start, os.SEEK_CUR)
+    rv = app.response_class(_iter_file_range(fd, stop - start), status=206, mimetype=mimetype,
+                            direct_passthrough=True)
+    # closing the generator does not run its cleanup code if it never started
+    rv.call_on_close(fd.close)
+    rv.content_length = stop - start
+    rv.headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, stop - 1, size)
+    return rv
+
+
+def send_file(name, path_or_fd, mimetype, last_modified=None, no_cache=True, inline=None, conditional=False, safe=True,
+              etag=None):
     """Sends a file to the user.
 
     `name` is required and should be the filename visible to the user.
@@ -357,6 +428,12 @@ def send_file(name, path_or_fd, mimetype, last_modified=None, no_cache=True, inl
     the file only if it has been modified (based on mtime and size).
     `safe` adds some basic security features such a adding a content-security-policy and forcing inline=False for
     text/html mimetypes
+    `etag` may contain a strong ETag which changes whenever the content of the file changes. When set, conditional
+    requests are answered based on it and `last_modified` instead of the mtime and size used by `conditional`, and
+    it is used to check whether a partial download can be resumed.
+
+    Unless the file is sent using X-Sendfile (in which case the web server takes care of it), requests for a single
+    byte range of the file are answered with only that part of the file.
     """
 
     name = secure_filename(name, 'file')
@@ -373,10 +450,29 @@ def send_file(name, path_or_fd, mimetype, last_modified=None, no_cache=True, inl
         inline = False
     if safe and mimetype == 'text/html':
         inline = False
+    if last_modified and not isinstance(last_modified, int):
+        last_modified = _get_timestamp(last_modified)
+    rv = None
+    accept_ranges = False
+    if etag is not None:
+        conditional = False
+        if not is_resource_modified(request.environ, etag,
+                                    last_modified=datetime.utcfromtimestamp(last_modified) if last_modified else None):
+            rv = app.response_class(status=304)
+            if not isinstance(path_or_fd, basestring):
+                path_or_fd.close()
     try:
-        rv = _send_file(path_or_fd, mimetype=mimetype, as_attachment=not inline, attachment_filename=name,
-                        conditional=conditional)
-    except IOError:
+        if rv is None and not (app.use_x_sendfile and isinstance(path_or_fd, basestring)):
+            size = _get_file_size(path_or_fd)
+            accept_ranges = size is not None
+            if accept_ranges and _is_range_valid(etag, last_modified):
+                rv = _make_range_response(path_or_fd, mimetype, size)
+        if rv is None:
+            rv = _send_file(path_or_fd, mimetype=mimetype, as_attachment=not inline, attachment_filename=name,
+                            conditional=conditional)
+        elif not inline:
+            rv.headers.add('Content-Disposition', 'attachment', filename=name)
+    except (IOError, OSError):
         from MaKaC.common.info import HelperMaKaCInfo
         if not app.debug:
             raise
@@ -386,9 +482,11 @@ def send_file(name, path_or_fd, mimetype, last_modified=None, no_cache=True, inl
     if inline:
         # send_file does not add this header if as_attachment is False
         rv.headers.add('Content-Disposition', 'inline', filename=name)
+    if accept_ranges:
+        rv.headers['Accept-Ranges'] = 'bytes'
+    if etag is not None:
+        rv.set_etag(etag)
     if last_modified:
-        if not isinstance(last_modified, int):
-            last_modified = int(time.mktime(last_modified.timetuple()))
         rv.last_modified = last_modified
     if no_cache:
         del rv.expires
@@ -503,7 +601,7 @@ class XAccelMiddleware(object):
 
     def __init__(self, app, mapping):
         self.app = app
-        self.mapping = mapping.items()
+        self.mapping = [(base.rstrip('/'), uri.rstrip('/')) for base, uri in mapping.iteritems()]
 
     def __call__(self, environ, start_response):
         def _start_response(status, headers, exc_info=None):
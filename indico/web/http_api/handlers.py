@@ -27,7 +27,7 @@ import urllib
 from uuid import UUID
 
 import transaction
-from flask import request, session, g
+from flask import request, session, g, current_app, stream_with_context
 from urlparse import parse_qs
 from werkzeug.exceptions import NotFound, BadRequest
 
@@ -42,7 +42,7 @@ from indico.modules.oauth.provider import load_token
 from indico.util.contextManager import ContextManager
 from indico.util.string import to_unicode
 from indico.web.http_api import HTTPAPIHook
-from indico.web.http_api.responses import HTTPAPIResult, HTTPAPIError
+from indico.web.http_api.responses import HTTPAPIResult, HTTPAPIError, HTTPAPIStreamedResult
 from indico.web.http_api.util import get_query_parameter
 from indico.web.http_api.fossils import IHTTPAPIExportResultFossil
 from indico.web.http_api.metadata.serializer import Serializer
@@ -143,9 +143,6 @@ def handler(prefix, path):
         queryParams = dict((key, value.encode('utf-8')) for key, value in request.args.iteritems())
         query = request.query_string
 
-    dbi = DBMgr.getInstance()
-    dbi.startRequest()
-
     apiKey = get_query_parameter(queryParams, ['ak', 'apikey'], None)
     cookieAuth = get_query_parameter(queryParams, ['ca', 'cookieauth'], 'no') == 'yes'
     signature = get_query_parameter(queryParams, ['signature'])
@@ -154,6 +151,7 @@ def handler(prefix, path):
     pretty = get_query_parameter(queryParams, ['p', 'pretty'], 'no') == 'yes'
     onlyPublic = get_query_parameter(queryParams, ['op', 'onlypublic'], 'no') == 'yes'
     onlyAuthed = get_query_parameter(queryParams, ['oa', 'onlyauthed'], 'no') == 'yes'
+    stream = get_query_parameter(queryParams, ['stream'], 'no') == 'yes'
     scope = 'read:legacy_api' if request.method == 'GET' else 'write:legacy_api'
     try:
         oauth_valid, oauth_request = oauth.verify_request([scope])
@@ -172,11 +170,18 @@ def handler(prefix, path):
     if hook is None or dformat is None:
         raise NotFound
 
+    DBMgr.getInstance().startRequest(lazy=not hook.USES_ZODB)
+
     # Disable caching if we are not just retrieving data (or the hook requires it)
     if request.method == 'POST' or hook.NO_CACHE:
         noCache = True
+    hook._noCache = noCache
+
+    # Only stream if both the hook and the serializer support it
+    if not hook.STREAMABLE or not getattr(Serializer.registry.get(dformat), 'streamable', False):
+        stream = False
 
-    ak = error = result = None
+    ak = error = result = streamed_result = None
     ts = int(time.time())
     typeMap = {}
     responseUtil = ResponseUtil()
@@ -202,10 +207,11 @@ def handler(prefix, path):
             if ak and aw.getUser() is None:
                 cacheKey = normalizeQuery(path, query,
                                           remove=('_', 'ak', 'apiKey', 'signature', 'timestamp', 'nc', 'nocache',
-                                                  'oa', 'onlyauthed'))
+                                                  'oa', 'onlyauthed', 'stream'))
             else:
                 cacheKey = normalizeQuery(path, query,
-                                          remove=('_', 'signature', 'timestamp', 'nc', 'nocache', 'oa', 'onlyauthed'))
+                                          remove=('_', 'signature', 'timestamp', 'nc', 'nocache', 'oa', 'onlyauthed',
+                                                  'stream'))
                 if signature:
                     # in case the request was signed, store the result under a different key
                     cacheKey = 'signed_' + cacheKey
@@ -221,7 +227,7 @@ def handler(prefix, path):
             userPrefix = 'user-{}_'.format(used_session.user.id)
             cacheKey = userPrefix + normalizeQuery(path, query,
                                                    remove=('_', 'nc', 'nocache', 'ca', 'cookieauth', 'oa', 'onlyauthed',
-                                                           'csrftoken'))
+                                                           'csrftoken', 'stream'))
 
         # Bail out if the user requires authentication but is not authenticated
         if onlyAuthed and not aw.getUser():
@@ -235,7 +241,13 @@ def handler(prefix, path):
             if obj is not None:
                 result, extra, ts, complete, typeMap = obj
                 addToCache = False
-        if result is None:
+        if result is None and stream:
+            ContextManager.set("currentAW", aw)
+            # Prepare the exporting; it is performed while sending the response
+            results, get_extra = hook.stream(aw)
+            streamed_result = HTTPAPIStreamedResult(results, path, query, ts, get_extra)
+            addToCache = False
+        elif result is None:
             ContextManager.set("currentAW", aw)
             # Perform the actual exporting
             res = hook(aw)
@@ -254,7 +266,7 @@ def handler(prefix, path):
             if responseUtil.status == 405:
                 responseUtil.headers['Allow'] = 'GET' if request.method == 'POST' else 'POST'
 
-    if result is None and error is None:
+    if result is None and streamed_result is None and error is None:
         # TODO: usage page
         raise NotFound
     else:
@@ -282,6 +294,8 @@ def handler(prefix, path):
                 serializer = Serializer.create('json')
 
             result = fossilize(error)
+        elif streamed_result is not None:
+            return _make_streamed_response(serializer, streamed_result, responseUtil, logger, path, query)
         else:
             if serializer.encapsulate:
                 result = fossilize(HTTPAPIResult(result, path, query, ts, complete, extra), IHTTPAPIExportResultFossil)
@@ -294,3 +308,18 @@ def handler(prefix, path):
         except:
             logger.exception('Serialization error in request %s?%s', path, query)
             raise
+
+
+def _make_streamed_response(serializer, streamed_result, responseUtil, logger, path, query):
+    def _generate():
+        try:
+            for chunk in serializer.stream(streamed_result):
+                yield chunk
+        except:
+            # the response has already been started so all we can do is to log the error
+            logger.exception('Serialization error in streamed request %s?%s', path, query)
+            raise
+
+    serializer.set_headers(responseUtil)
+    return current_app.response_class(stream_with_context(_generate()), status=responseUtil.status,
+                                      headers=responseUtil.headers, content_type=responseUtil.content_type)
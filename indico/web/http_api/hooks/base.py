@@ -69,6 +69,9 @@ class HTTPAPIHook(object):
     COMMIT = False  # commit database changes
     HTTP_POST = False  # require (and allow) HTTP POST
     NO_CACHE = False
+    STREAMABLE = False  # results are a sequence which can be serialized while it is generated
+    STREAM_EXTRA_KEYS = ()  # result keys needed by the `_extra` function when streaming the results
+    USES_ZODB = True  # set to False for hooks using only SQL; the ZODB connection is then opened only when needed
 
     @classmethod
     def parseRequest(cls, path, queryParams):
@@ -110,6 +113,7 @@ class HTTPAPIHook(object):
         self._queryParams = queryParams
         self._type = type
         self._pathParams = pathParams
+        self._noCache = False
 
     def _getParams(self):
         self._offset = get_query_parameter(self._queryParams, ['O', 'offset'], 0, integer=True)
@@ -181,8 +185,7 @@ class HTTPAPIHook(object):
         extra = extra_func(aw, resultList) if extra_func else None
         return resultList, complete, extra
 
-    def __call__(self, aw):
-        """Perform the actual exporting"""
+    def _getExportFunctions(self, aw):
         if self.HTTP_POST != (request.method == 'POST'):
             raise HTTPAPIError('This action requires %s' % ('POST' if self.HTTP_POST else 'GET'), 405)
         if not self.GUEST_ALLOWED and not aw.getUser():
@@ -193,6 +196,44 @@ class HTTPAPIHook(object):
         extra_func = getattr(self, method_name + '_extra', None)
         if not func:
             raise NotImplementedError(method_name)
+        return func, extra_func
+
+    def stream(self, aw):
+        """Perform the exporting lazily.
+
+        Unlike a normal call, the results are not collected in memory
+        but generated while they are being consumed.
+
+        :return: a tuple containing an iterator over the results and
+                 a callable returning the extra data; the latter may
+                 only be called once the iterator has been exhausted.
+        """
+        assert self.STREAMABLE and not self.COMMIT
+        func, extra_func = self._getExportFunctions(aw)
+        self._getParams()
+        if not self._hasAccess(aw):
+            raise HTTPAPIError('Access to this resource is restricted.', 403)
+        res = func(aw)
+        # only keep what the extra function needs instead of the full results
+        consumed = []
+
+        def _iter_results():
+            try:
+                for obj in res:
+                    if extra_func:
+                        consumed.append({key: obj[key] for key in self.STREAM_EXTRA_KEYS})
+                    yield obj
+            except LimitExceededException:
+                pass
+
+        def _get_extra():
+            return extra_func(aw, consumed) if extra_func else None
+
+        return _iter_results(), _get_extra
+
+    def __call__(self, aw):
+        """Perform the actual exporting"""
+        func, extra_func = self._getExportFunctions(aw)
 
         if not self.COMMIT:
             resultList, complete, extra = self._perform(aw, func, extra_func)
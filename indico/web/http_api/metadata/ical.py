@@ -122,6 +122,7 @@ def serialize_session(cal, fossil, now, fid=None):
 class ICalSerializer(Serializer):
 
     schemaless = False
+    streamable = True
     _mime = 'text/calendar'
 
     _mappers = {
@@ -137,21 +138,41 @@ class ICalSerializer(Serializer):
     def register_mapper(cls, fossil, func):
         cls._mappers[fossil] = func
 
+    def _create_calendar(self):
+        cal = ical.Calendar()
+        cal.add('version', '2.0')
+        cal.add('prodid', '-//CERN//INDICO//EN')
+        return cal
+
+    def _serialize_fossil(self, cal, fossil, now):
+        if '_fossil' in fossil:
+            mapper = ICalSerializer._mappers.get(fossil['_fossil'])
+        else:
+            mapper = self._extra_args.get('ical_serializer')
+        if mapper:
+            mapper(cal, fossil, now)
+
     def _execute(self, fossils):
         results = fossils['results']
         if type(results) != list:
             results = [results]
 
-        cal = ical.Calendar()
-        cal.add('version', '2.0')
-        cal.add('prodid', '-//CERN//INDICO//EN')
+        cal = self._create_calendar()
         now = nowutc()
         for fossil in results:
-            if '_fossil' in fossil:
-                mapper = ICalSerializer._mappers.get(fossil['_fossil'])
-            else:
-                mapper = self._extra_args.get('ical_serializer')
-            if mapper:
-                mapper(cal, fossil, now)
+            self._serialize_fossil(cal, fossil, now)
 
         return cal.to_ical()
+
+    def _stream(self, result):
+        # The calendar is written without its closing line first, followed
+        # by the components of each result, each one serialized on its own
+        footer = b'END:VCALENDAR\r\n'
+        header = self._create_calendar().to_ical()
+        yield header[:-len(footer)]
+        now = nowutc()
+        for fossil in result.iter_results():
+            cal = ical.Calendar()
+            self._serialize_fossil(cal, fossil, now)
+            yield b''.join(component.to_ical() for component in cal.subcomponents)
+        yield footer
@@ -31,9 +31,21 @@ class JSONSerializer(Serializer):
     """
 
     _mime = 'application/json'
+    streamable = True
+
+    def _dumps(self, obj):
+        return json.dumps(obj, pretty=self.pretty)
 
     def _execute(self, fossil):
-        return json.dumps(fossil, pretty=self.pretty)
+        return self._dumps(fossil)
+
+    def _stream(self, result):
+        # the envelope is written around the results, i.e. without its
+        # closing brace before them and without its opening brace after them
+        yield self._dumps(result.header)[:-1] + ',"results":['
+        for i, fossil in enumerate(result.iter_results()):
+            yield (',' if i else '') + self._dumps(fossil)
+        yield '],' + self._dumps(result.footer)[1:]
 
 
 Serializer.register('json', JSONSerializer)
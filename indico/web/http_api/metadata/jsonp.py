@@ -28,3 +28,9 @@ class JSONPSerializer(JSONSerializer):
         return "// fetched from Indico\n%s(%s);" % \
                (self._query_params.get('jsonp', 'read'),
                 super(JSONPSerializer, self)._execute(results))
+
+    def _stream(self, result):
+        yield "// fetched from Indico\n%s(" % self._query_params.get('jsonp', 'read')
+        for chunk in super(JSONPSerializer, self)._stream(result):
+            yield chunk
+        yield ");"
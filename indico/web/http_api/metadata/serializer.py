@@ -20,6 +20,9 @@ class Serializer(object):
 
     schemaless = True
     encapsulate = True
+    #: whether the serializer can write its output while the results
+    #: are being generated (see :meth:`stream`)
+    streamable = False
 
     registry = {}
 
@@ -64,6 +67,19 @@ class Serializer(object):
         self._data = self._execute(obj, *args, **kwargs)
         return self._data
 
+    def stream(self, result):
+        """Serialize a result incrementally.
+
+        :param result: a :class:`.HTTPAPIStreamedResult`
+        :return: an iterator yielding chunks of the serialized data
+        """
+        if not self.streamable:
+            raise NotImplementedError('{} does not support streaming'.format(type(self).__name__))
+        return self._stream(result)
+
+    def _stream(self, result):
+        raise NotImplementedError
+
 
 from indico.web.http_api.metadata.json import JSONSerializer
 from indico.web.http_api.metadata.xml import XMLSerializer
@@ -31,6 +31,7 @@ class XMLSerializer(Serializer):
     """
 
     _mime = 'text/xml'
+    streamable = True
 
     def __init__(self, query_params, pretty=False, **kwargs):
         self._typeMap = kwargs.pop('typeMap', {})
@@ -48,6 +49,31 @@ class XMLSerializer(Serializer):
                 value = value.replace('\x0b', '')
             return value
 
+    def _xmlForField(self, k, v, id=None):
+        elem = etree.Element(k)
+        if isinstance(v, (list, tuple)):
+            onlyDicts = all(type(subv) == dict for subv in v)
+            if onlyDicts:
+                for subv in v:
+                    elem.append(self._xmlForFossil(subv))
+            else:
+                for subv in v:
+                    if type(subv) == dict:
+                        elem.append(self._xmlForFossil(subv))
+                    else:
+                        subelem = etree.SubElement(elem, 'item')
+                        subelem.text = self._convert(subv)
+        elif isinstance(v, dict):
+            elem.append(self._xmlForFossil(v))
+        else:
+            txt = self._convert(v)
+            try:
+                elem.text = txt
+            except Exception:
+                Logger.get('xmlSerializer').exception('Setting XML text value failed (id: {}, value {!r})'
+                                                      .format(id, txt))
+        return elem
+
     def _xmlForFossil(self, fossil, doc=None):
         attribs = {}
         id = None
@@ -67,29 +93,7 @@ class XMLSerializer(Serializer):
 
         for k, v in fossil.iteritems():
             if k not in ['_fossil', '_type', 'id']:
-                elem = etree.SubElement(felement, k)
-                if isinstance(v, (list, tuple)):
-                    onlyDicts = all(type(subv) == dict for subv in v)
-                    if onlyDicts:
-                        for subv in v:
-                            elem.append(self._xmlForFossil(subv))
-                    else:
-                        for subv in v:
-                            if type(subv) == dict:
-                                elem.append(self._xmlForFossil(subv))
-                            else:
-                                subelem = etree.SubElement(elem, 'item')
-                                subelem.text = self._convert(subv)
-                elif isinstance(v, dict):
-                    elem.append(self._xmlForFossil(v))
-                else:
-                    txt = self._convert(v)
-                    try:
-                        elem.text = txt
-                    except Exception:
-                        Logger.get('xmlSerializer').exception('Setting XML text value failed (id: {}, value {!r})'
-                                                              .format(id, txt))
-
+                felement.append(self._xmlForField(k, v, id))
 
         return felement
 
@@ -106,5 +110,23 @@ class XMLSerializer(Serializer):
         return etree.tostring(result, pretty_print=self.pretty,
                               xml_declaration=xml_declaration, encoding='utf-8')
 
+    def _tostring(self, elem):
+        return etree.tostring(elem, pretty_print=self.pretty, encoding='utf-8')
+
+    def _stream(self, result):
+        header = result.header
+        typeName = self._typeMap.get(header['_type'], header['_type']).lower()
+        yield "<?xml version='1.0' encoding='utf-8'?>\n<{}>".format(typeName)
+        for k, v in header.iteritems():
+            if k != '_type':
+                yield self._tostring(self._xmlForField(k, v))
+        yield '<results>'
+        for fossil in result.iter_results():
+            yield self._tostring(self._xmlForFossil(fossil))
+        yield '</results>'
+        for k, v in result.footer.iteritems():
+            yield self._tostring(self._xmlForField(k, v))
+        yield '</{}>'.format(typeName)
+
 
 Serializer.register('xml', XMLSerializer)
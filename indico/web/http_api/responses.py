@@ -26,7 +26,7 @@ from indico.web.http_api.fossils import IHTTPAPIErrorFossil, IHTTPAPIResultFossi
 
 # indico legacy imports
 from indico.core.config import Config
-from MaKaC.common.fossilize import fossilizes, Fossilizable
+from MaKaC.common.fossilize import fossilize, fossilizes, Fossilizable
 
 class HTTPAPIError(Exception, Fossilizable):
     fossilizes(IHTTPAPIErrorFossil)
@@ -75,3 +75,39 @@ class HTTPAPIResult(Fossilizable):
 
     def getAdditionalInfo(self):
         return self._extra
+
+
+class HTTPAPIStreamedResult(HTTPAPIResult):
+    """The result of an export which is serialized while it is generated.
+
+    The results are consumed exactly once through :meth:`iter_results`;
+    the count and the additional information are only available once
+    the iterator has been exhausted.
+    """
+
+    def __init__(self, results, path='', query='', ts=None, get_extra=None):
+        super(HTTPAPIStreamedResult, self).__init__(results, path, query, ts)
+        self._get_extra = get_extra
+        self._count = 0
+
+    def iter_results(self):
+        for result in self._results:
+            self._count += 1
+            yield fossilize(result)
+
+    def getCount(self):
+        return self._count
+
+    def getAdditionalInfo(self):
+        extra = self._get_extra() if self._get_extra else None
+        return fossilize(extra or {})
+
+    @property
+    def header(self):
+        """The part of the result which is known before exporting"""
+        return {'_type': 'HTTPAPIResult', 'ts': self.getTS(), 'url': self.getURL()}
+
+    @property
+    def footer(self):
+        """The part of the result which is known after exporting"""
+        return {'count': self.getCount(), 'additionalInfo': self.getAdditionalInfo()}
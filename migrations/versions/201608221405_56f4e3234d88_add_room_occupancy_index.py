@@ -0,0 +1,146 @@
+"""Add room occupancy index
+
+Revision ID: 56f4e3234d88
+Revises: 15661b6cd066
+Create Date: 2016-08-22 14:05:31.418266
+"""
+
+import textwrap
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '56f4e3234d88'
+down_revision = '15661b6cd066'
+
+
+def upgrade():
+    op.create_table(
+        'room_occupancy',
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('booked_slots', postgresql.BIT(96), nullable=False),
+        sa.Column('prebooked_slots', postgresql.BIT(96), nullable=False),
+        sa.ForeignKeyConstraint(['room_id'], ['roombooking.rooms.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('room_id', 'date'),
+        schema='roombooking'
+    )
+    op.execute(textwrap.dedent('''
+        CREATE FUNCTION roombooking.get_occupancy_slots(start_dt timestamp, end_dt timestamp, day date)
+        RETURNS bit(96) AS
+        $BODY$
+        DECLARE
+            first_slot int;
+            last_slot int;
+        BEGIN
+            -- 96 slots of 15 minutes; keep in sync with RoomOccupancy.get_slots
+            first_slot := floor(extract(epoch FROM start_dt - day::timestamp) / 900)::int;
+            first_slot := greatest(0, least(95, first_slot));
+            last_slot := ceil(extract(epoch FROM end_dt - day::timestamp) / 900)::int;
+            last_slot := greatest(first_slot + 1, least(96, last_slot));
+            RETURN (repeat('0', first_slot) ||
+                    repeat('1', last_slot - first_slot) ||
+                    repeat('0', 96 - last_slot))::bit(96);
+        END;
+        $BODY$
+        LANGUAGE plpgsql IMMUTABLE
+    '''))
+    op.execute(textwrap.dedent('''
+        CREATE FUNCTION roombooking.update_room_occupancy(target_room_id int, day date) RETURNS void AS
+        $BODY$
+        BEGIN
+            -- lock the room so concurrent bookings cannot insert the same row
+            PERFORM 1 FROM roombooking.rooms WHERE id = target_room_id FOR NO KEY UPDATE;
+            DELETE FROM roombooking.room_occupancy WHERE room_id = target_room_id AND date = day;
+            INSERT INTO roombooking.room_occupancy (room_id, date, booked_slots, prebooked_slots)
+            SELECT target_room_id, day,
+                   coalesce(bit_or(slots) FILTER (WHERE is_accepted), repeat('0', 96)::bit(96)),
+                   coalesce(bit_or(slots) FILTER (WHERE NOT is_accepted), repeat('0', 96)::bit(96))
+            FROM (
+                SELECT r.is_accepted, roombooking.get_occupancy_slots(occ.start_dt, occ.end_dt, day) AS slots
+                FROM roombooking.reservation_occurrences occ
+                JOIN roombooking.reservations r ON (r.id = occ.reservation_id)
+                WHERE r.room_id = target_room_id AND
+                      occ.start_dt >= day AND occ.start_dt < day + 1 AND
+                      NOT occ.is_cancelled AND NOT occ.is_rejected
+            ) occupancy
+            HAVING count(*) > 0;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    '''))
+    op.execute(textwrap.dedent('''
+        CREATE FUNCTION roombooking.occurrence_occupancy_changed() RETURNS trigger AS
+        $BODY$
+        BEGIN
+            IF TG_OP != 'INSERT' THEN
+                PERFORM roombooking.update_room_occupancy(r.room_id, OLD.start_dt::date)
+                FROM roombooking.reservations r
+                WHERE r.id = OLD.reservation_id;
+            END IF;
+            IF TG_OP != 'DELETE' THEN
+                PERFORM roombooking.update_room_occupancy(r.room_id, NEW.start_dt::date)
+                FROM roombooking.reservations r
+                WHERE r.id = NEW.reservation_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    '''))
+    op.execute(textwrap.dedent('''
+        CREATE FUNCTION roombooking.reservation_occupancy_changed() RETURNS trigger AS
+        $BODY$
+        BEGIN
+            PERFORM roombooking.update_room_occupancy(rooms.room_id, days.day)
+            FROM (SELECT DISTINCT unnest(ARRAY[OLD.room_id, NEW.room_id]) AS room_id) rooms,
+                 (SELECT DISTINCT start_dt::date AS day
+                  FROM roombooking.reservation_occurrences
+                  WHERE reservation_id = NEW.id) days;
+            RETURN NULL;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    '''))
+    op.execute('''
+        CREATE TRIGGER update_occupancy
+        AFTER INSERT OR DELETE OR UPDATE OF reservation_id, start_dt, end_dt, is_cancelled, is_rejected
+        ON roombooking.reservation_occurrences
+        FOR EACH ROW
+        EXECUTE PROCEDURE roombooking.occurrence_occupancy_changed()
+    ''')
+    op.execute('''
+        CREATE TRIGGER update_occupancy
+        AFTER UPDATE OF room_id, is_accepted
+        ON roombooking.reservations
+        FOR EACH ROW
+        WHEN (OLD.room_id != NEW.room_id OR OLD.is_accepted != NEW.is_accepted)
+        EXECUTE PROCEDURE roombooking.reservation_occupancy_changed()
+    ''')
+    op.execute('''
+        INSERT INTO roombooking.room_occupancy (room_id, date, booked_slots, prebooked_slots)
+        SELECT room_id, day,
+               coalesce(bit_or(slots) FILTER (WHERE is_accepted), repeat('0', 96)::bit(96)),
+               coalesce(bit_or(slots) FILTER (WHERE NOT is_accepted), repeat('0', 96)::bit(96))
+        FROM (
+            SELECT r.room_id, r.is_accepted, occ.start_dt::date AS day,
+                   roombooking.get_occupancy_slots(occ.start_dt, occ.end_dt, occ.start_dt::date) AS slots
+            FROM roombooking.reservation_occurrences occ
+            JOIN roombooking.reservations r ON (r.id = occ.reservation_id)
+            WHERE NOT occ.is_cancelled AND NOT occ.is_rejected
+        ) occupancy
+        GROUP BY room_id, day
+    ''')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER update_occupancy ON roombooking.reservations')
+    op.execute('DROP TRIGGER update_occupancy ON roombooking.reservation_occurrences')
+    op.execute('DROP FUNCTION roombooking.reservation_occupancy_changed()')
+    op.execute('DROP FUNCTION roombooking.occurrence_occupancy_changed()')
+    op.execute('DROP FUNCTION roombooking.update_room_occupancy(int, date)')
+    op.execute('DROP FUNCTION roombooking.get_occupancy_slots(timestamp, timestamp, date)')
+    op.drop_table('room_occupancy', schema='roombooking')
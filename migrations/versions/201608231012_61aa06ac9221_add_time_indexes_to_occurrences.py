@@ -0,0 +1,27 @@
+"""Add time indexes to reservation occurrences
+
+Revision ID: 61aa06ac9221
+Revises: 56f4e3234d88
+Create Date: 2016-08-23 10:12:47.230914
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '61aa06ac9221'
+down_revision = '56f4e3234d88'
+
+
+def upgrade():
+    op.create_index('ix_reservation_occurrences_start_dt_time', 'reservation_occurrences',
+                    [sa.text('cast(start_dt AS time)')], schema='roombooking')
+    op.create_index('ix_reservation_occurrences_end_dt_time', 'reservation_occurrences',
+                    [sa.text('cast(end_dt AS time)')], schema='roombooking')
+
+
+def downgrade():
+    op.drop_index('ix_reservation_occurrences_end_dt_time', table_name='reservation_occurrences', schema='roombooking')
+    op.drop_index('ix_reservation_occurrences_start_dt_time', table_name='reservation_occurrences',
+                  schema='roombooking')
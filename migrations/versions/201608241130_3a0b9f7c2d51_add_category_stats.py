@@ -0,0 +1,57 @@
+"""Add category stats
+
+Revision ID: 3a0b9f7c2d51
+Revises: 61aa06ac9221
+Create Date: 2016-08-24 11:30:12.584106
+"""
+
+import textwrap
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from indico.core.db.sqlalchemy import UTCDateTime
+
+
+# revision identifiers, used by Alembic.
+revision = '3a0b9f7c2d51'
+down_revision = '61aa06ac9221'
+
+
+def upgrade():
+    op.create_table(
+        'category_stats',
+        sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('own_stats', postgresql.JSON(), nullable=True),
+        sa.Column('stats', postgresql.JSON(), nullable=True),
+        sa.Column('updated_dt', UTCDateTime, nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.categories.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('category_id'),
+        schema='categories'
+    )
+    op.execute(textwrap.dedent('''
+        CREATE FUNCTION categories.create_category_stats() RETURNS trigger AS
+        $BODY$
+        BEGIN
+            INSERT INTO categories.category_stats (category_id, version) VALUES (NEW.id, 0);
+            RETURN NULL;
+        END;
+        $BODY$
+        LANGUAGE plpgsql
+    '''))
+    op.execute('''
+        CREATE TRIGGER create_stats
+        AFTER INSERT
+        ON categories.categories
+        FOR EACH ROW
+        EXECUTE PROCEDURE categories.create_category_stats();
+    ''')
+    op.execute('INSERT INTO categories.category_stats (category_id, version) SELECT id, 0 FROM categories.categories')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER create_stats ON categories.categories')
+    op.execute('DROP FUNCTION categories.create_category_stats()')
+    op.drop_table('category_stats', schema='categories')